@@ -0,0 +1,104 @@
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+from scraping.scrape import FetchHTML, ExtractLinks
+from scraping.discover import ExtractFeed
+from scraping.parsers import parse_html
+from config.settings import sections, feeds
+from benchmarks.bench_parse import pages_dir, load_pages, save
+
+# Benchmark comparing the two link discovery backends, section pages scraped
+# with the link selectors ("html") and RSS/Atom feeds or news sitemaps 
+# ("feed"). Section pages are the "links" pages saved by 'bench_parse.py', 
+# feeds are saved next to them as "feeds". Run from the program folder:
+#   python -m benchmarks.bench_discover --download   (saves a fresh set)
+#   python -m benchmarks.bench_discover
+# For every source and backend it reports the bytes transferred, the parse and
+# extraction time and the number of links found, the cheaper backend can then 
+# be set in 'discovery_backends' in 'config/settings.py'.
+
+
+def discover(text, src, backend):
+    """
+    Parses a saved page and extracts its links with the given backend.
+
+    Returns:
+        links (list): list of 2-tuples (link, published)
+    """
+    if backend == "html":
+        soup = parse_html(text, src, "links")
+        links = ExtractLinks().extract(soup, src, "") or []
+        soup.decompose()
+        return links
+    extracted = ExtractFeed().extract(text, "")
+    return extracted[1] if extracted else []
+
+
+def measure(saved, src, backend, repeat=3):
+    """
+    Runs the discovery over all saved pages of a source `repeat` times, 
+    keeping the fastest.
+
+    Returns:
+        _ (tuple): (bytes, seconds, links, dated links)
+    """
+    # Timing
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        links = [link for _, text in saved for link in discover(text, src, 
+            backend)]
+        timings.append(time.perf_counter() - start)
+
+    # Counting
+    size = sum(len(text.encode()) for _, text in saved)
+    unique = {link for link, _ in links}
+    dated = {link for link, published in links if published}
+
+    return size, min(timings), len(unique), len(dated)
+
+
+def run(pages):
+    """ Runs the benchmark and prints one row per source and backend. """
+    print(f"{'source':<10} {'backend':<8} {'pages':>5} {'KiB':>8} "
+        f"{'ms total':>9} {'links':>6} {'dated':>6}")
+
+    for src in sorted({src for src, _ in pages}):
+        for backend, kind in (("html", "links"), ("feed", "feeds")):
+            saved = pages.get((src, kind))
+            if not saved:
+                continue
+            size, elapsed, links, dated = measure(saved, src, backend)
+            print(f"{src:<10} {backend:<8} {len(saved):>5} "
+                f"{size / 1024:>8.0f} {elapsed * 1000:>9.2f} {links:>6} "
+                f"{dated:>6}")
+
+
+async def download(directory=pages_dir):
+    """ Saves the section pages and feeds from 'config/settings.py'. """
+    fetch = FetchHTML()
+    for i, (url, src, cat, html) in enumerate(await fetch.fetch(sections)):
+        save(directory, src, "links", f"section{i}", html)
+    for i, (url, src, cat, xml) in enumerate(await fetch.fetch(feeds)):
+        save(directory, src, "feeds", f"feed{i}", xml)
+    print(f"Saved {len(sections)} sections and {len(feeds)} feeds to "
+        f"{directory}")
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser()
+    arguments.add_argument("--download", action="store_true",
+        help="save a fresh set of sections and feeds before benchmarking")
+    arguments.add_argument("--pages", type=Path, default=pages_dir,
+        help="directory with saved pages")
+    args = arguments.parse_args()
+
+    if args.download:
+        asyncio.run(download(args.pages))
+    pages = load_pages(args.pages)
+    if not pages:
+        sys.exit(f"No saved pages in {args.pages}, run with --download")
+    run(pages)
@@ -0,0 +1,168 @@
+import sys
+import time
+import asyncio
+import argparse
+import tracemalloc
+from pathlib import Path
+from statistics import mean
+
+from bs4.builder import builder_registry
+
+from scraping.scrape import FetchHTML, ExtractLinks, ExtractContents
+from scraping.parsers import parse_html
+from config.settings import sections
+
+# Benchmark comparing the parser backends and partial parsing on saved pages.
+# Pages are read from 'data/pages/<source>/<kind>/*.html' where kind is "links"
+# for section pages and "contents" for article pages. Run from the program
+# folder:
+#   python -m benchmarks.bench_parse --download   (saves a fresh set of pages)
+#   python -m benchmarks.bench_parse
+# For every source, backend and mode (full or partial parsing) it reports the
+# mean parse time and the peak memory of a single page, and checks that partial
+# parsing extracts exactly what full parsing extracts.
+
+
+pages_dir = Path(__file__).resolve().parent.parent / "data" / "pages"
+
+
+def load_pages(directory=pages_dir):
+    """
+    Loads the saved pages.
+
+    Params:
+        directory (Path): directory with saved pages
+    Returns:
+        pages (dict): {(src, kind): [(name, html),...]}
+    """
+    pages = {}
+    for path in sorted(directory.glob("*/*/*.html")):
+        src, kind = path.parent.parent.name, path.parent.name
+        pages.setdefault((src, kind), []).append((path.stem, path.read_text()))
+    return pages
+
+
+def extract(soup, src, kind):
+    """
+    Runs the extraction on a parsed page so results of full and partial parsing
+    can be compared.
+    """
+    if kind == "links":
+        return ExtractLinks().extract(soup, src, "")
+    extractor = ExtractContents()
+    return (
+        extractor._getheader(soup, src, ""), 
+        extractor._getbody(soup, src, "")
+        )
+
+
+def measure(html, src, kind, backend, partial, repeat=3):
+    """
+    Parses a page `repeat` times for timing, keeping the fastest, and once 
+    under tracemalloc for memory.
+
+    Returns:
+        _ (tuple): (seconds, peak bytes, extraction result)
+    """
+    # Timing
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        soup = parse_html(html, src, kind, backend=backend, partial=partial)
+        timings.append(time.perf_counter() - start)
+        result = extract(soup, src, kind)
+        soup.decompose()
+    elapsed = min(timings)
+
+    # Measuring peak memory
+    tracemalloc.start()
+    soup = parse_html(html, src, kind, backend=backend, partial=partial)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    soup.decompose()
+
+    return elapsed, peak, result
+
+
+def run(pages):
+    """
+    Runs the benchmark and prints one row per source, kind, backend and mode.
+    """
+    backends = [b for b in ("lxml", "html.parser") if builder_registry.lookup(b)]
+    print(f"{'source':<10} {'kind':<9} {'backend':<12} {'mode':<8} "
+        f"{'pages':>5} {'ms/page':>8} {'peak KiB':>9} {'match':>6}")
+
+    for (src, kind), saved in sorted(pages.items()):
+        # Skipping pages of other benchmarks, eg.: feeds
+        if kind not in ("links", "contents"):
+            continue
+        # Reference results from full parsing with the standard parser
+        reference = [
+            extract(parse_html(html, backend="html.parser", partial=False), 
+                src, kind) 
+            for _, html in saved
+            ]
+        for backend in backends:
+            for partial in (False, True):
+                rows = [measure(html, src, kind, backend, partial) 
+                    for _, html in saved]
+                matches = all(
+                    row[2] == ref for row, ref in zip(rows, reference)
+                    )
+                print(f"{src:<10} {kind:<9} {backend:<12} "
+                    f"{'partial' if partial else 'full':<8} {len(rows):>5} "
+                    f"{mean(r[0] for r in rows) * 1000:>8.2f} "
+                    f"{max(r[1] for r in rows) / 1024:>9.0f} "
+                    f"{'yes' if matches else 'NO':>6}")
+
+
+async def download(directory=pages_dir, per_source=5):
+    """
+    Saves the section pages from 'config/settings.py' and the first few 
+    article pages linked from each source.
+    """
+    fetch = FetchHTML()
+
+    # Saving section pages
+    section_htmls = await fetch.fetch(sections)
+    article_requests = {}
+    for i, (url, src, cat, html) in enumerate(section_htmls):
+        save(directory, src, "links", f"section{i}", html)
+        soup = parse_html(html, partial=False)
+        links = ExtractLinks().extract(soup, src, url) or []
+        article_requests.setdefault(src, set()).update(
+            link for link, _ in links
+            )
+
+    # Saving article pages
+    requests = [
+        (link, src, None) for src, links in article_requests.items() 
+        for link in sorted(links)[:per_source]
+        ]
+    for i, (url, src, cat, html) in enumerate(await fetch.fetch(requests)):
+        save(directory, src, "contents", f"article{i}", html)
+    print(f"Saved {len(section_htmls)} section and {len(requests)} article "
+        f"pages to {directory}")
+
+
+def save(directory, src, kind, name, html):
+    """ Writes a page to disc. """
+    path = directory / src / kind / f"{name}.html"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(html)
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser()
+    arguments.add_argument("--download", action="store_true",
+        help="save a fresh set of pages before benchmarking")
+    arguments.add_argument("--pages", type=Path, default=pages_dir,
+        help="directory with saved pages")
+    args = arguments.parse_args()
+
+    if args.download:
+        asyncio.run(download(args.pages))
+    pages = load_pages(args.pages)
+    if not pages:
+        sys.exit(f"No saved pages in {args.pages}, run with --download")
+    run(pages)
@@ -0,0 +1,159 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+from datetime import datetime
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+
+from dateutil import tz
+
+from scraping.scrape import FetchHTML, ScrapeLinks, ScrapeContents
+from scraping.archive import HTTPArchive, ReplayServer
+from scraping.discover import split_requests
+from utils.http_requests import get_runtime
+from utils.throttle import HostScheduler
+from utils.helpers import freeze_time
+
+# Record/replay driver for the scraping path; sections -> links -> articles.
+# Run from the program folder:
+#   python -m benchmarks.bench_pipeline --record data/archives/run.jsonl.gz
+#   python -m benchmarks.bench_pipeline --replay data/archives/run.jsonl.gz
+# Recording runs the scrape against the live sites and saves every response.
+# Replaying serves the archive from localhost, freezes the clock at the time of
+# the recording so the same articles pass the date checks, and reports the
+# time of each stage. '--latency' injects a fixed delay or "recorded" to replay
+# the original response times, '--no-limits' lifts the per source rate limits
+# so the parsing and extraction dominate. Both modes swap the URL index for
+# an in-memory one, so runs don't add to the local data and every run sees the
+# same links.
+
+# Limits that never hold a replayed request back
+no_limits = {"default": {
+    "concurrency": 1000, "max_concurrency": 1000, "rate": 1e6, "min_rate": 1e6,
+    "max_rate": 1e6, "burst": 1e6
+    }}
+
+
+class MemoryIndex(set):
+    """ In-memory stand-in for `URLIndex`, nothing is written to disc. """
+    def flush(self):
+        pass
+
+
+def isolate(scraper):
+    """ Swaps the persistent index of a scraper for an in-memory one. """
+    scraper.index = MemoryIndex()
+    return scraper
+
+
+async def pipeline(fetch, executor=None):
+    """
+    Runs the scraping path once and times each stage.
+
+    Returns:
+        stats (dict): seconds and counts per stage
+    """
+    stats = {}
+
+    # Fetching sections
+    start = time.perf_counter()
+    section_htmls = await fetch.fetch(split_requests()[0])
+    stats["sections"] = (time.perf_counter() - start, len(section_htmls))
+
+    # Scraping links
+    start = time.perf_counter()
+    scrapelinks = isolate(ScrapeLinks())
+    links = scrapelinks.scrape(fetch.parse(section_htmls, "links"))
+    stats["links"] = (time.perf_counter() - start, len(links))
+
+    # Fetching and scraping articles
+    start = time.perf_counter()
+    scrapecontents = isolate(ScrapeContents())
+    articles = await scrapecontents.scrape_stream(fetch, links, executor)
+    stats["articles"] = (time.perf_counter() - start, len(articles))
+
+    return stats
+
+
+async def record(path, executor=None):
+    """ Runs the pipeline against the live sites and saves the responses. """
+    archive = HTTPArchive(path)
+    archive.entries = {}
+    stats = await pipeline(FetchHTML(archive=archive), executor)
+    archive.save()
+    return stats
+
+
+async def replay(path, latency=None, jitter=0.0, limits=True, workers=0):
+    """
+    Runs the pipeline against a replay server serving the archive. The worker
+    processes are started here, their clock is frozen when they start.
+    """
+    # Loading archive and freezing the clock at the time of the recording
+    archive = HTTPArchive(path)
+    moment = datetime.fromtimestamp(archive.recorded, tz.tzutc())
+    freeze_time(moment)
+    pool = ProcessPoolExecutor(
+        workers, initializer=freeze_time, initargs=(moment,)
+        ) if workers else nullcontext()
+
+    # Serving the archive
+    server = ReplayServer(archive, latency, jitter)
+    await server.start()
+    fetch = FetchHTML(rewrite=server.rewrite)
+    if not limits:
+        fetch.scheduler = HostScheduler(no_limits)
+
+    try:
+        with pool as executor:
+            return await pipeline(fetch, executor)
+    finally:
+        await server.stop()
+        freeze_time(None)
+
+
+def report(stats):
+    """ Prints one row per stage. """
+    print(f"{'stage':<10} {'seconds':>8} {'items':>6}")
+    for stage, (seconds, items) in stats.items():
+        print(f"{stage:<10} {seconds:>8.2f} {items:>6}")
+    print(f"{'total':<10} {sum(s for s, _ in stats.values()):>8.2f}")
+
+
+def latency_type(value):
+    """ Parses '--latency', a number of seconds or "recorded". """
+    return value if value == "recorded" else float(value)
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser()
+    mode = arguments.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--record", type=Path, help="archive to record to")
+    mode.add_argument("--replay", type=Path, help="archive to replay")
+    arguments.add_argument("--latency", type=latency_type, default=None,
+        help="seconds of delay per response or 'recorded'")
+    arguments.add_argument("--jitter", type=float, default=0.0,
+        help="random fraction of the latency, eg.: 0.2")
+    arguments.add_argument("--no-limits", action="store_true",
+        help="lift the per source rate limits when replaying")
+    arguments.add_argument("--workers", type=int, default=0,
+        help="worker processes for parsing")
+    args = arguments.parse_args()
+
+    if args.replay and not args.replay.exists():
+        sys.exit(f"No archive at {args.replay}, record one with --record")
+
+    runtime = get_runtime()
+    if args.record:
+        pool = ProcessPoolExecutor(args.workers) if args.workers else (
+            nullcontext()
+            )
+        with pool as executor:
+            stats = runtime.run(record(args.record, executor))
+    else:
+        stats = runtime.run(replay(
+            args.replay, args.latency, args.jitter, not args.no_limits,
+            args.workers
+            ))
+    report(stats)
@@ -0,0 +1,202 @@
+import sys
+import json
+import timeit
+import argparse
+import platform
+import tracemalloc
+from pathlib import Path
+from datetime import datetime
+
+import bs4
+
+from scraping.scrape import FetchHTML, ExtractLinks, ScrapeLinks
+from scraping.scrape import ExtractContents
+from scraping.parsers import backend
+from benchmarks import fixtures
+from benchmarks.bench_pipeline import MemoryIndex
+
+# Benchmark suite for the scraping subsystem on the fixture corpus, read more
+# in 'benchmarks/fixtures.py'. Run from the program folder:
+#   python -m benchmarks.bench_scrape --output results.json
+#   python -m benchmarks.bench_scrape --compare results.json --threshold 0.1
+# For every source, page size and step of the scrape it reports the time per
+# page, pages per second, the memory blocks still allocated after the step and
+# the peak memory during it. Results are written as JSON, comparing against a
+# previous results file flags every step that got slower or hungrier by more
+# than the threshold and exits with 1, so parser and selector changes can be
+# judged on numbers.
+
+
+def steps(src, pages):
+    """
+    Builds the benchmarked steps for one source and page size. Each step is a
+    function doing the work for one page, its inputs are prepared here so
+    only the step itself is measured.
+
+    Params:
+        src (str): the source
+        pages (dict): {"section": html, "article": html}
+    Returns:
+        _ (dict): dict of name: function pairs
+    """
+    # Initialising the scrapers, `ScrapeLinks` gets an in-memory index
+    fetch = FetchHTML()
+    extractlinks = ExtractLinks()
+    scrapelinks = ScrapeLinks.__new__(ScrapeLinks)
+    ExtractLinks.__init__(scrapelinks)
+    extractcontents = ExtractContents()
+
+    # Preparing the inputs of each step
+    section = [("", src, "", pages["section"])]
+    article = [("", src, "", pages["article"])]
+    section_soup = fetch.parse(section, "links")[0][3]
+    article_soup = fetch.parse(article, "contents")[0][3]
+    elements = extractlinks._getelements(section_soup, src, "")
+    hrefs = extractlinks._gethrefs(elements, src)
+    links = extractlinks.extract(section_soup, src, "")
+    scrapelinks.index = MemoryIndex(link for link, _ in links[::2])
+    header = extractcontents._getheader(article_soup, src, "")
+
+    return {
+        "FetchHTML.parse[links]": lambda: fetch.parse(section, "links"),
+        "FetchHTML.parse[contents]": lambda: fetch.parse(article, "contents"),
+        "ScrapeLinks._getelements":
+            lambda: extractlinks._getelements(section_soup, src, ""),
+        "ScrapeLinks._gethrefs": lambda: extractlinks._gethrefs(elements, src),
+        "ScrapeLinks._construct_links":
+            lambda: extractlinks._construct_links(hrefs, src),
+        "ScrapeLinks._check_processed":
+            lambda: scrapelinks._check_processed(links),
+        "ScrapeContents._getheader":
+            lambda: extractcontents._getheader(article_soup, src, ""),
+        "ScrapeContents._getbody":
+            lambda: extractcontents._getbody(article_soup, src, ""),
+        "ScrapeContents._parse_datetime":
+            lambda: extractcontents._parse_datetime(header["datePublished"]),
+    }
+
+
+def measure(step, repeat=3):
+    """
+    Times a step, keeping the fastest of `repeat` runs of enough calls to
+    last 0.2 seconds, then runs it once under tracemalloc.
+
+    Returns:
+        _ (dict): ms per page, pages per second, allocations, peak KiB
+    """
+    # Timing
+    timer = timeit.Timer(step)
+    number, _ = timer.autorange()
+    number = max(1, number)
+    seconds = min(timer.repeat(repeat, number)) / number
+
+    # Measuring memory, the peak is relative to the memory traced before
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    start = tracemalloc.get_traced_memory()[0]
+    result = step()
+    peak = tracemalloc.get_traced_memory()[1] - start
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocations = sum(
+        max(0, stat.count_diff) for stat in after.compare_to(before, "filename")
+        )
+    del result
+
+    return {
+        "ms": round(seconds * 1000, 4),
+        "pages_per_sec": round(1 / seconds, 1),
+        "allocations": allocations,
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def run(corpus, sizes=None):
+    """
+    Runs every step on every source and size.
+
+    Params:
+        corpus (dict): loaded by `fixtures.load`
+        sizes (list, optional): only these sizes
+    Returns:
+        results (dict): the results file contents
+    """
+    results = {}
+    for (src, size), pages in sorted(corpus.items()):
+        if sizes and size not in sizes:
+            continue
+        for name, step in steps(src, pages).items():
+            results[f"{src}/{size}/{name}"] = measure(step)
+            print(f"{src:<10} {size:<7} {name:<32} "
+                f"{results[f'{src}/{size}/{name}']['ms']:>9.3f} ms")
+
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "bs4": bs4.__version__,
+            "backend": backend,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """
+    Prints the change of each step against a baseline and flags the ones
+    slower, or with a higher peak, by more than `threshold`.
+
+    Params:
+        current (dict): results of this run
+        baseline (dict): results of a previous run
+        threshold (float): eg.: 0.1 for 10%
+    Returns:
+        regressions (list): names of the regressed steps
+    """
+    regressions = []
+    print(f"\n{'step':<60} {'ms':>9} {'change':>8} {'peak':>8}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            continue
+        time_change = result["ms"] / base["ms"] - 1 if base["ms"] else 0
+        peak_change = (result["peak_kib"] / base["peak_kib"] - 1
+            if base["peak_kib"] else 0)
+        flag = ""
+        if time_change > threshold or peak_change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<60} {result['ms']:>9.3f} {time_change:>+8.1%} "
+            f"{peak_change:>+8.1%}{flag}")
+    print(f"\n{len(regressions)} regressions beyond {threshold:.0%}")
+    return regressions
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser()
+    arguments.add_argument("--output", type=Path,
+        help="write the results to this JSON file")
+    arguments.add_argument("--compare", type=Path,
+        help="compare against a previous results file")
+    arguments.add_argument("--threshold", type=float, default=0.1,
+        help="relative change flagged as a regression, default is 0.1")
+    arguments.add_argument("--sizes", nargs="+", choices=list(fixtures.sizes),
+        help="only benchmark these page sizes")
+    arguments.add_argument("--fixtures", type=Path,
+        default=fixtures.fixtures_dir, help="directory of the corpus")
+    arguments.add_argument("--generate", action="store_true",
+        help="regenerate the corpus before benchmarking")
+    args = arguments.parse_args()
+
+    if args.generate:
+        fixtures.generate(args.fixtures)
+    current = run(fixtures.load(args.fixtures), args.sizes)
+
+    if args.output:
+        args.output.write_text(json.dumps(current, indent=4))
+        print(f"Saved results to {args.output}")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if compare(current, baseline, args.threshold):
+            sys.exit(1)
@@ -0,0 +1,149 @@
+import json
+import random
+from pathlib import Path
+from datetime import datetime, timedelta
+
+from dateutil import tz
+
+# Synthetic fixture corpus for the scraping benchmarks. For each source it
+# builds a section page and an article page at several sizes, shaped like the
+# real pages so the selectors in 'config/settings.py' match them: the same
+# containers, classes and JSON-LD header, surrounded by the usual menus,
+# scripts and footers. Pages are generated from a fixed seed, so the corpus is
+# the same on every machine, and saved to 'data/fixtures/<source>/<size>/'.
+# Real pages saved by 'bench_parse.py --download' can be benchmarked too.
+
+fixtures_dir = Path(__file__).resolve().parent.parent / "data" / "fixtures"
+
+# Number of links per section page and paragraphs per article page
+sizes = {
+    "small": {"links": 20, "paragraphs": 8},
+    "medium": {"links": 100, "paragraphs": 40},
+    "large": {"links": 400, "paragraphs": 160},
+}
+
+# Fixed time the fixtures are published relative to, keeps them identical
+epoch = datetime(2024, 3, 25, 12, tzinfo=tz.tzutc())
+
+vocabulary = (
+    "government minister election protest agreement talks border president "
+    "officials said the of and in to a on for with after during war economy "
+    "city report week people country health climate trade court police"
+    ).split()
+
+
+def words(rng, n):
+    """ Returns `n` random words. """
+    return " ".join(rng.choice(vocabulary) for _ in range(n))
+
+
+def boilerplate(rng, n):
+    """ Menus, scripts and footers around the content, `n` items each. """
+    menu = "".join(f"<li><a href='/menu/{i}'>{words(rng, 2)}</a></li>"
+        for i in range(n))
+    script = f"<script>var config = {json.dumps({'ids': list(range(n))})};"
+    script += "</script>"
+    footer = "".join(f"<div class='footer-item'><p>{words(rng, 8)}</p></div>"
+        for _ in range(n))
+    return (f"<header><nav><ul>{menu}</ul></nav></header>{script}",
+        f"<footer>{footer}</footer>")
+
+
+def section_page(src, n, rng):
+    """ Section page of `src` with `n` article links. """
+    def href(i):
+        date = epoch - timedelta(hours=i)
+        if src == "NYTimes":
+            return f"/{date:%Y/%m/%d}/world/article-{i}.html"
+        if src == "AlJazeera":
+            return f"/news/{date.year}/{date.month}/{date.day}/article-{i}"
+        return f"https://apnews.com/article/article-{i}"
+
+    if src == "NYTimes":
+        items = "".join(
+            f"<li><article><a class='css-8hzhxf' href='{href(i)}'>"
+            f"<h3>{words(rng, 8)}</h3></a><p>{words(rng, 20)}</p>"
+            f"</article></li>" for i in range(n))
+        content = f"<section id='stream-panel'><ol>{items}</ol></section>"
+    elif src == "AlJazeera":
+        items = "".join(
+            f"<article class='gc gc--type-post'><h3><a href='{href(i)}'>"
+            f"{words(rng, 8)}</a></h3><p>{words(rng, 20)}</p></article>"
+            for i in range(n))
+        content = f"<div class='container__inner'>{items}</div>"
+    else:
+        items = "".join(
+            f"<div class='PageList-items-item'><h3><a href='{href(i)}'>"
+            f"{words(rng, 8)}</a></h3><bsp-timestamp data-timestamp="
+            f"'{int((epoch - timedelta(hours=i)).timestamp() * 1000)}'>"
+            f"</bsp-timestamp></div>" for i in range(n))
+        content = f"<div class='Page-content'>{items}</div>"
+
+    head, foot = boilerplate(rng, n // 2)
+    return f"<html><head></head><body>{head}{content}{foot}</body></html>"
+
+
+def article_page(src, n, rng):
+    """ Article page of `src` with `n` paragraphs. """
+    published = epoch.isoformat()
+    header = json.dumps({
+        "@type": "NewsArticle", "datePublished": published,
+        "dateModified": published, "headline": words(rng, 8),
+        "description": words(rng, 20)
+        })
+    paragraphs = [words(rng, 60) for _ in range(n)]
+
+    if src == "NYTimes":
+        body = "".join(f"<p class='css-at9mc1'>{p}</p>" for p in paragraphs)
+        content = (f"<article id='story'><section name='articleBody'>{body}"
+            f"</section></article>")
+    elif src == "AlJazeera":
+        body = "".join(f"<p>{p}</p>" for p in paragraphs)
+        content = (f"<main id='main-content-area'><div class='wysiwyg'>{body}"
+            f"</div></main>")
+    else:
+        body = "".join(f"<p>{p}</p>" for p in paragraphs)
+        content = f"<main><div class='RichTextBody'>{body}</div></main>"
+
+    head, foot = boilerplate(rng, n)
+    return (f"<html><head><script type='application/ld+json'>{header}"
+        f"</script></head><body>{head}{content}{foot}</body></html>")
+
+
+def generate(directory=fixtures_dir, sources=("NYTimes", "AlJazeera",
+    "APNews")):
+    """
+    Writes the corpus, one section and one article page per source and size.
+
+    Params:
+        directory (Path): where to write the corpus
+        sources (tuple): the sources
+    """
+    for src in sources:
+        for size, counts in sizes.items():
+            rng = random.Random(f"{src}-{size}")
+            path = directory / src / size
+            path.mkdir(parents=True, exist_ok=True)
+            (path / "section.html").write_text(
+                section_page(src, counts["links"], rng)
+                )
+            (path / "article.html").write_text(
+                article_page(src, counts["paragraphs"], rng)
+                )
+
+
+def load(directory=fixtures_dir):
+    """
+    Loads the corpus, generating it first if missing.
+
+    Returns:
+        corpus (dict): {(src, size): {"section": html, "article": html}}
+    """
+    if not directory.exists():
+        generate(directory)
+    corpus = {}
+    for path in sorted(directory.glob("*/*/")):
+        corpus[(path.parent.name, path.name)] = {
+            page.stem: page.read_text() for page in path.glob("*.html")
+            }
+    return corpus
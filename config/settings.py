@@ -74,6 +74,40 @@ sections =[
         ("https://apnews.com/hub/australia", "APNews", "Asia")
 ]
 
+# RSS/Atom feeds and news sitemaps grouped by source and category like the 
+# sections above, read more in 'scraping/discover.py'. Feeds without regional
+# editions map the category labels of their entries to the categories above,
+# entries without a mapped label are skipped.
+feeds = [
+        ("https://rss.nytimes.com/services/xml/rss/nyt/Africa.xml", "NYTimes",
+            "Africa"),
+        ("https://rss.nytimes.com/services/xml/rss/nyt/AsiaPacific.xml", 
+            "NYTimes", "Asia"),
+        ("https://rss.nytimes.com/services/xml/rss/nyt/Americas.xml", 
+            "NYTimes", "Americas"),
+        ("https://rss.nytimes.com/services/xml/rss/nyt/Europe.xml", "NYTimes",
+            "Europe"),
+        ("https://rss.nytimes.com/services/xml/rss/nyt/MiddleEast.xml", 
+            "NYTimes", "Middle-East"),
+        ("https://rss.nytimes.com/services/xml/rss/nyt/US.xml", "NYTimes", 
+            "North-America"),
+        ("https://www.aljazeera.com/xml/rss/all.xml", "AlJazeera", {
+            "Africa": "Africa",
+            "Asia": "Asia",
+            "Asia Pacific": "Asia",
+            "Europe": "Europe",
+            "Latin America": "Americas",
+            "Middle East": "Middle-East",
+            "US & Canada": "North-America",
+        }),
+]
+
+# Link discovery backend per source. "html" scrapes the sections with the link
+# selectors, "feed" reads the feeds above, which are smaller and don't break 
+# when the markup changes. Sources without an entry use "html". Compare them 
+# with 'benchmarks/bench_discover.py'.
+discovery_backends = {"NYTimes": "html", "AlJazeera": "html", "APNews": "html"}
+
 # Selectors for links, link prefixes, article text and header element
 selectors = {
     "link_selector": {
@@ -102,6 +136,119 @@ selectors = {
     }
 }
 
+# Cheap publish date estimates for links, read more in 'scraping/scrape.py'. 
+# 'url_pattern' matches the year, month and day in the URL. 'container' and 
+# 'timestamp_selector' find the timestamp shown next to the link in the section
+# listing, its 'timestamp_attr' holds milliseconds since the epoch. Links are
+# discarded without being fetched when the estimate plus 'slack_hours' is 
+# older than 24 hours. URL dates only tell the day, in the source's timezone, 
+# so their slack covers a full day plus the offset from UTC.
+link_dates = {
+    "NYTimes": {"url_pattern": r"/(\d{4})/(\d{2})/(\d{2})/", "slack_hours": 36},
+    "AlJazeera": {"url_pattern": r"/(\d{4})/(\d{1,2})/(\d{1,2})/", 
+        "slack_hours": 36},
+    "APNews": {"container": "div.PageList-items-item", 
+        "timestamp_selector": "bsp-timestamp[data-timestamp]",
+        "timestamp_attr": "data-timestamp", "slack_hours": 1},
+}
+
+# Number of worker processes used to parse HTML and extract links and article
+# contents. 0 keeps the parsing serial in the backend thread, which is easier 
+# to debug. Read more in 'scraping/scrape.py'.
+scrape_workers = 0
+
+# Per source limits for fetching HTML, read more in 'utils/throttle.py'. 
+# 'concurrency' is the initial cap on concurrent requests and 'rate' the 
+# initial number of requests per second with bursts of up to 'burst' requests.
+# Both adapt to the responses between their 'min_' and 'max_' values. Sources
+# without their own entry use "default". 
+host_limits = {
+    "NYTimes": {"concurrency": 6, "max_concurrency": 12, "rate": 4.0, 
+        "min_rate": 0.5, "max_rate": 10.0, "burst": 6},
+    "AlJazeera": {"concurrency": 6, "max_concurrency": 12, "rate": 4.0, 
+        "min_rate": 0.5, "max_rate": 10.0, "burst": 6},
+    "APNews": {"concurrency": 6, "max_concurrency": 12, "rate": 4.0, 
+        "min_rate": 0.5, "max_rate": 10.0, "burst": 6},
+    "default": {"concurrency": 4, "max_concurrency": 8, "rate": 2.0, 
+        "min_rate": 0.5, "max_rate": 5.0, "burst": 4},
+}
+
+# Adaptation of the limits above. Each successful response faster than 'fast'
+# seconds adds 'increase' / current value to the concurrency and rate, each 
+# '429' or '503' multiplies both by 'decrease'.
+aimd = {"increase": 1.0, "decrease": 0.5, "fast": 1.0}
+
+# Limits of the OpenAI account, read more in 'utils/throttle.py'. 'rpm' and 
+# 'tpm' are the requests and tokens per minute to start with, they are
+# corrected by the 'x-ratelimit-*' headers of the first response. Buckets hold
+# 'burst_seconds' worth of requests and tokens. 'concurrency' is the initial
+# cap on requests in flight, it adapts like the host limits above up to
+# 'max_concurrency'. Without 'tiktoken' prompt tokens are estimated at 
+# 'chars_per_token', read more in 'utils/tokens.py'.
+openai_limits = {"rpm": 500, "tpm": 60000, "burst_seconds": 10, 
+    "concurrency": 5, "max_concurrency": 50, "chars_per_token": 4}
+
+# Retrying failed requests, read more in 'utils/retry.py'. 'attempts' per
+# request, exponential backoff starting at 'base' seconds up to 'cap' seconds 
+# and a 'budget' of retries per run.
+retry_policy = {"attempts": 4, "base": 1.0, "cap": 30.0, "budget": 100}
+
+# Session shared by all network stages, read more in 'utils/http_requests.py'.
+# 'limit' caps the open connections, resolved hosts are cached for 'dns_ttl'
+# seconds and idle connections are kept alive for 'keepalive_timeout' seconds.
+http_client = {"limit": 100, "dns_ttl": 300, "keepalive_timeout": 60}
+
+# Index of processed URLs, read more in 'data_manager/index.py'. Above 
+# 'bloom_threshold' URLs the index switches to a Bloom filter with 
+# 'error_rate' chance of looking a new URL up in the partitions.
+url_index = {"bloom_threshold": 200000, "error_rate": 0.0001}
+
+# Cache of OpenAI responses keyed by the request, read more in 
+# 'summarising/cache.py'. Above 'max_bytes' the least recently used responses
+# are evicted.
+summary_cache = {"max_bytes": 50_000_000}
+
+# Days discarded and processed URLs are remembered. Section pages stop listing
+# an article long before this, older URLs can't resurface. Read more in
+# 'data_manager/discarded.py'
+discarded_ttl_days = 14
+
+# BS4 parser backends in order of preference, the first one installed is 
+# used. 'lxml' is C-backed and much faster, 'html.parser' is always available.
+parser_backends = ["lxml", "html.parser"]
+
+# Parse only the parts of a page the selectors above can match, read more in
+# 'scraping/parsers.py'
+partial_parsing = True
+
+# Read article headers straight from the raw HTML and drop outdated pages and 
+# non-articles before parsing them, read more in 'scraping/scrape.py'
+header_prefilter = True
+
+# Seconds the validators of a cached section page are used for conditional
+# requests, after that the section is downloaded in full again. Read more in
+# 'scraping/cache.py'.
+section_cache_max_age = 3600
+
+# Incremental crawling of section pages, read more in 'scraping/watermarks.py'.
+# The newest 'depth' links of each section are remembered and extraction stops
+# after 'stop_after' of them in a row. Each section is polled every 'interval'
+# seconds, initially 'min_interval'. The interval is multiplied by 'decrease'
+# when the section had new links and by 'increase' when it didn't, staying
+# between 'min_interval' and 'max_interval'.
+section_refresh = {"depth": 10, "stop_after": 3, "min_interval": 300,
+    "max_interval": 3600, "increase": 1.5, "decrease": 0.5}
+
+# Seconds between runs of the daemon, read more in 'newsai_daemon.py'. The GUI
+# skips the pipeline and opens with the prepared articles when the last run
+# finished less than this ago.
+daemon_interval = 900
+
+# Seconds an unreadable lock file is treated as held before it's removed, the
+# lock of a running process is never taken over, read more in 
+# 'pipeline/lock.py'
+lock_grace = 10
+
 # List of user agents used for rotating user agents when fetching HTML of 
 # news sites
 user_agents = [
@@ -130,6 +277,27 @@ user_agents = [
     "like Gecko) Chrome/62.0.3202.94 Safari/537.36 OPR/49.0.2725.64"
 ]
 
+# Base URL of the OpenAI API, point it at a compatible server or the local stub
+# in 'summarising/stub.py' to run without the real API
+openai_base_url = "https://api.openai.com/v1"
+
+# Summaries and merges can be sent as one asynchronous batch job instead of
+# individual requests, cheaper but answered within hours, used by the daemon
+# with '--batch'. Read more in 'summarising/batch.py'. The job is polled every
+# 'poll_interval' seconds and given up after 'timeout' seconds. A run sends one
+# job for the summaries, one for combining the chunks of long articles and one
+# per level of the merge tree, so it can take several times 'timeout'.
+batch_mode = {"poll_interval": 30, "timeout": 86400, 
+    "completion_window": "24h"}
+
+# Token budget of the summary requests, read more in 'summarising/summarise.py'.
+# Bodies longer than 'max_prompt_tokens' are split into chunks of 
+# 'chunk_tokens', summarised separately and the chunk summaries combined. Only
+# the first 'max_chunks' chunks of a body are summarised. Completions get twice
+# the tokens of the asked number of words, 'min_completion_tokens' at least.
+prompt_budget = {"max_prompt_tokens": 6000, "chunk_tokens": 3000, 
+    "max_chunks": 8, "min_completion_tokens": 200}
+
 # Keyring constats for storing and retrieving the OpenAI API key
 kr_system = "NewsAI"
 kr_username = "openai_api_key"
@@ -140,4 +308,25 @@ parameter_grid = {
     "n_components": [70, 90, 110, 130, 150]
 }
 
+# Near-duplicate detection before summarising, read more in 
+# 'grouping/dedupe.py'. Bodies are compared by MinHash signatures of 'shingle'
+# word shingles with 'permutations' values split into 'bands', articles with
+# an estimated similarity of 'threshold' or more share one summary. Signatures
+# of summarised articles are kept for 'ttl_days', at most 'max_history' of
+# them are compared, so copies of articles from earlier runs are found too
+near_duplicates = {"shingle": 5, "permutations": 64, "bands": 16, 
+    "threshold": 0.8, "ttl_days": 3, "max_history": 20000}
+
+# Stable group IDs across runs, read more in 'grouping/identity.py'. A new
+# cluster keeps the ID of the previous group it shares at least 'min_overlap'
+# of its members with (Jaccard), groups not seen for 'max_age' seconds are
+# forgotten
+group_identity = {"min_overlap": 0.5, "max_age": 604800}
+
+# Tree merging of large groups, read more in 'summarising/summarise.py'. The
+# summaries of a group are merged in batches of at most 'fan_in' summaries and
+# 'max_prompt_tokens' tokens, the batch merges are merged the same way until
+# one summary is left
+merge_tree = {"fan_in": 5, "max_prompt_tokens": 3000}
+
 # System prompt for merging.
\ No newline at end of file
@@ -0,0 +1,42 @@
+import os
+import json
+import logging
+import tempfile
+from pathlib import Path
+
+# Atomic writes of the JSON files. The daemon rewrites its files while the GUI
+# may read them, 'data_manager/manager.py' and 'pipeline/process.py'. Writing
+# in place truncates the file first, a reader can then catch it empty or half
+# written. The data is written to a temporary file in the same directory and
+# moved over the old file with `os.replace`, readers see either the old or the
+# new file.
+
+logger = logging.getLogger(__name__)
+
+
+def dump_json(data, path, **kwargs):
+    """
+    Writes data as JSON to a file atomically.
+
+    Params:
+        data (obj): JSON serialisable data
+        path (Path): the file to write
+        kwargs: passed to `json.dump`, eg.: indent=4
+    """
+    path = Path(path)
+    descriptor, temporary = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+        )
+    try:
+        with os.fdopen(descriptor, "w") as file:
+            json.dump(data, file, **kwargs)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        # Leaving the old file and no temporary file behind
+        try:
+            os.unlink(temporary)
+        except FileNotFoundError:
+            pass
+        raise
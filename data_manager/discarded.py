@@ -0,0 +1,128 @@
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta
+
+from dateutil import tz
+
+from config.settings import discarded_ttl_days
+
+# Append-only URL logs partitioned by day. Each day's URLs go to their own
+# text file, eg.: 'data/url_index/2024-03-25.txt', one URL per line. Adding
+# URLs only appends to today's file and expiring old URLs only deletes whole
+# files, so neither rewrites anything. URLs are remembered for 'ttl_days',
+# which should be longer than section pages keep listing an article; after
+# that they can't resurface and there is no need to remember them. This keeps
+# both the size on disc and the cost of loading bounded.
+
+logger = logging.getLogger(__name__)
+
+# Location of the logs
+data_dir = Path(__file__).resolve().parent.parent / "data"
+
+
+class DayPartitionedLog:
+    """
+    Append-only log of URLs partitioned by day with a retention TTL. Expired
+    partitions are deleted automatically when the log is opened.
+
+    Attributes:
+        directory (Path): location of the partitions
+        ttl_days (int): number of days partitions are kept
+        pending (list): URLs added since the last flush
+    """
+    def __init__(self, name, ttl_days=discarded_ttl_days, directory=None):
+        """
+        Initialise the location of the log and compact it.
+
+        Params:
+            name (str): name of the directory in 'data'
+            ttl_days (int): default is loaded from 'config/settings.py'
+            directory (Path, optional): default is the directory `name` in 
+                'data'
+        """
+        self.directory = directory or data_dir / name
+        self.ttl_days = ttl_days
+        self.pending = []
+        self.compact()
+
+
+    def add(self, url):
+        """
+        Adds a URL, it's written to disc on `flush`.
+
+        Params:
+            url (str): the url
+        """
+        self.pending.append(url)
+
+
+    def flush(self):
+        """ Appends the URLs added since the last flush to today's partition. """
+        if not self.pending:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self.today().open("a") as file:
+            file.writelines(url + "\n" for url in self.pending)
+        logger.debug(f"Added {len(self.pending)} URLs to {self.today()}")
+        self.pending = []
+
+
+    def urls(self):
+        """
+        Reads the URLs of every partition, oldest first.
+
+        Returns:
+            urls (list): list of URLs
+        """
+        urls = []
+        for path in self.partitions():
+            with path.open("r") as file:
+                urls.extend(line.rstrip("\n") for line in file if line.strip())
+        return urls + self.pending
+
+
+    def partitions(self):
+        """
+        Returns the partitions, oldest first.
+
+        Returns:
+            _ (list): list of Paths
+        """
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob("????-??-??.txt"))
+
+
+    def today(self):
+        """ Returns the path of today's partition. """
+        return self.directory / f"{self._today().isoformat()}.txt"
+
+
+    def compact(self):
+        """
+        Deletes the partitions older than the TTL.
+
+        Returns:
+            removed (int): number of deleted partitions
+        """
+        # Computing the oldest day to keep
+        cutoff = self._today() - timedelta(days=self.ttl_days)
+
+        # Deleting older partitions, names sort like dates
+        removed = 0
+        for path in self.partitions():
+            if path.stem < cutoff.isoformat():
+                path.unlink()
+                removed += 1
+
+        # Logging results
+        if removed:
+            logger.info(f"Removed {removed} expired partitions from "
+                f"{self.directory}")
+
+        return removed
+
+
+    def _today(self):
+        """ Returns today's date in UTC, partitions follow UTC days. """
+        return datetime.now(tz.tzutc()).date()
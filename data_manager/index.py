@@ -0,0 +1,355 @@
+import json
+import math
+import hashlib
+import shutil
+import logging
+
+from data_manager.discarded import DayPartitionedLog
+from config.settings import url_index, discarded_ttl_days
+
+# Index of URLs that were processed before, either scraped or discarded. It is
+# used by `ScrapeLinks` to skip known links and is the only store of discarded
+# URLs, the discarded store it replaces is moved into it once. On disc it's an append-only log
+# partitioned by day, 'data/url_index/YYYY-MM-DD.txt', so loading it doesn't
+# require parsing the article JSON, adding URLs doesn't rewrite anything and
+# URLs older than 'discarded_ttl_days' expire with their partition, read more
+# in 'data_manager/discarded.py'. In memory it's a set. For very large
+# histories, above 'bloom_threshold' URLs, the set is replaced by a Bloom
+# filter that is saved next to the partitions; loading then only reads the
+# filter and the lines appended since it was saved. A Bloom filter never
+# misses a known URL but has a small, configurable, chance of treating a new
+# URL as known, which would skip a new article for good. It only answers the
+# unknown URLs, the known ones are confirmed in the partitions, newest first,
+# where recently listed links are found early. It can't forget URLs either,
+# so it's rebuilt from the remaining partitions after old ones expired.
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Bloom filter over strings, backed by a bytearray. Positions are derived
+    from one blake2b digest by double hashing.
+
+    Attributes:
+        error_rate (float): probability of false positives
+        size (int): number of bits
+        hashes (int): number of positions per item
+        bits (bytearray): the filter
+    """
+    def __init__(self, capacity, error_rate, bits=None):
+        """
+        Initialise an empty filter sized for `capacity` items at `error_rate`.
+
+        Params:
+            capacity (int): expected number of items
+            error_rate (float): probability of false positives
+            bits (bytes, optional): contents of a saved filter
+        """
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) /
+            math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(bits) if bits else bytearray(self.size // 8 + 1)
+
+
+    def add(self, item):
+        """ Adds an item. """
+        for position in self._positions(item):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+
+    def __contains__(self, item):
+        """ False if the item was never added, True if it probably was. """
+        return all(
+            self.bits[position // 8] & (1 << (position % 8))
+            for position in self._positions(item)
+        )
+
+
+    def _positions(self, item):
+        """ Yields the bit positions of an item. """
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+
+class URLIndex:
+    """
+    Persistent index of processed URLs. Supports `in`, `add` and `update`,
+    new URLs are appended to the log on `flush`.
+
+    Attributes:
+        log (obj): `DayPartitionedLog` object holding the URLs on disc
+        bloom_path (Path): location of the saved Bloom filter
+        urls (set): the known URLs, None in Bloom filter mode
+        bloom (obj): `BloomFilter` object, None in set mode
+        capacity (int): number of URLs the Bloom filter is sized for
+        count (int): number of URLs in the log
+        pending (list): URLs added since the last flush
+        confirmed (set): URLs known in Bloom filter mode, confirmed in the
+            partitions or added since loading
+    """
+    def __init__(self, name="url_index", settings=url_index,
+        ttl_days=discarded_ttl_days):
+        """
+        Initialise the location of the index and load it.
+
+        Params:
+            name (str): name of the directory in 'data'
+            settings (dict): default is loaded from 'config/settings.py'
+            ttl_days (int): default is loaded from 'config/settings.py'
+        """
+        self.log = DayPartitionedLog(name, ttl_days)
+        self.bloom_path = self.log.directory / "index.bloom"
+        self.settings = settings
+        self.urls = set()
+        self.bloom = None
+        self.capacity = 0
+        self.count = 0
+        self.pending = []
+        self.confirmed = set()
+        self.load()
+        self._migrate_discarded()
+
+
+    def __contains__(self, url):
+        """
+        Checks if a URL was processed before. In Bloom filter mode a URL the
+        filter knows is confirmed in the partitions.
+        """
+        if self.bloom is None:
+            return url in self.urls
+        if url not in self.bloom:
+            return False
+        if url in self.confirmed:
+            return True
+        if self._lookup(url):
+            self.confirmed.add(url)
+            return True
+        logger.debug(f"Bloom filter false positive: {url}")
+        return False
+
+
+    def __len__(self):
+        """ Number of URLs in the index. """
+        return self.count + len(self.pending)
+
+
+    def add(self, url):
+        """
+        Adds a URL to the index, it's written to disc on `flush`.
+
+        Params:
+            url (str): the url
+        """
+        if url in self:
+            return
+        if self.bloom is not None:
+            self.bloom.add(url)
+            self.confirmed.add(url)
+        else:
+            self.urls.add(url)
+        self.pending.append(url)
+
+
+    def update(self, urls):
+        """
+        Adds several URLs to the index.
+
+        Params:
+            urls (iterable): the urls
+        """
+        for url in urls:
+            self.add(url)
+
+
+    def flush(self):
+        """
+        Appends the URLs added since the last flush to today's partition and
+        switches to a Bloom filter once the index outgrows 'bloom_threshold'.
+        """
+        # Appending new URLs
+        if self.pending:
+            self.log.pending = self.pending
+            self.log.flush()
+            self.count += len(self.pending)
+            self.pending = []
+
+        # Switching to a Bloom filter for very large histories
+        if self.bloom is None:
+            if self.count > self.settings["bloom_threshold"]:
+                self._build_bloom()
+        # Rebuilding a full filter, saving it otherwise
+        elif self.count > self.capacity:
+            self._build_bloom()
+        else:
+            self._save_bloom()
+
+
+    def load(self):
+        """
+        Loads the index. Builds it from the older data files when there is no
+        log yet, usually on the first run after upgrading.
+        """
+        # Building the log from the data files
+        if not self.log.directory.exists():
+            self._migrate()
+            return
+
+        # Loading the saved Bloom filter and the lines appended since
+        if self.bloom_path.exists():
+            self._load_bloom()
+            return
+
+        # Loading the set
+        self.urls = set(self.log.urls())
+        self.count = len(self.urls)
+        logger.debug(f"Loaded {self.count} URLs from {self.log.directory}")
+
+        # Switching to a Bloom filter for very large histories
+        if self.count > self.settings["bloom_threshold"]:
+            self._build_bloom()
+
+
+    def _migrate(self):
+        """
+        Builds the log from the URLs in 'articles.json' and the single-file
+        log used before partitioning.
+        """
+        from data_manager.manager import DataManager
+        manager = DataManager()
+        articles = manager.load() or []
+        self.update(article["url"] for article in articles)
+
+        # Moving the single-file log
+        old_path = self.log.directory.parent / "url_index.txt"
+        if old_path.exists():
+            with old_path.open("r") as file:
+                self.update(line.rstrip("\n") for line in file if line.strip())
+            old_path.unlink()
+            old_path.with_suffix(".bloom").unlink(missing_ok=True)
+
+        self.flush()
+        self.log.directory.mkdir(parents=True, exist_ok=True)
+        logger.info(f"Built URL index with {len(self)} URLs")
+
+
+    def _migrate_discarded(self):
+        """
+        Moves the URLs of the discarded store, 'data/discarded' and the older
+        'discarded.json', into the index and deletes them.
+        """
+        # Reading the old files
+        directory = self.log.directory.parent / "discarded"
+        path = self.log.directory.parent / "discarded.json"
+        if not directory.exists() and not path.exists():
+            return
+        urls = DayPartitionedLog("discarded", directory=directory).urls()
+        if path.exists():
+            try:
+                with path.open("r") as file:
+                    urls.extend(json.load(file))
+            except json.JSONDecodeError as error:
+                logger.error(f"Decoder error while loading {path}: {error}")
+
+        # Moving their URLs
+        self.update(urls)
+        self.flush()
+        shutil.rmtree(directory, ignore_errors=True)
+        path.unlink(missing_ok=True)
+        logger.info(f"Moved {len(urls)} discarded URLs into the URL index")
+
+
+    def _lookup(self, url):
+        """
+        Searches the partitions for a URL, newest first.
+
+        Params:
+            url (str): the url
+        Returns:
+            _ (bool): True if a partition holds the URL
+        """
+        line = url + "\n"
+        for path in reversed(self.log.partitions()):
+            with path.open("r") as file:
+                if line in file:
+                    return True
+        return False
+
+
+    def _build_bloom(self):
+        """
+        Builds the Bloom filter from the log and saves it. The filter is sized
+        for twice the current number of URLs so it can keep growing.
+        """
+        # Sizing the filter
+        self.capacity = max(2 * self.count, self.settings["bloom_threshold"])
+        self.bloom = BloomFilter(self.capacity, self.settings["error_rate"])
+
+        # Filling the filter
+        for url in self.log.urls():
+            self.bloom.add(url)
+        self.urls = None
+        self._save_bloom()
+        logger.info(f"Built Bloom filter for {self.count} URLs")
+
+
+    def _save_bloom(self):
+        """
+        Saves the filter with a header holding its capacity and the size of
+        each partition it covers.
+        """
+        header = {
+            "capacity": self.capacity,
+            "error_rate": self.bloom.error_rate,
+            "count": self.count,
+            "sizes": {
+                path.name: path.stat().st_size
+                for path in self.log.partitions()
+                },
+            }
+        self.log.directory.mkdir(parents=True, exist_ok=True)
+        with self.bloom_path.open("wb") as file:
+            file.write(json.dumps(header).encode() + b"\n")
+            file.write(self.bloom.bits)
+
+
+    def _load_bloom(self):
+        """
+        Loads the saved filter and adds the lines appended to the log since
+        it was saved. The filter is rebuilt when it's full or when partitions
+        it covers expired.
+        """
+        # Reading the filter
+        with self.bloom_path.open("rb") as file:
+            header = json.loads(file.readline())
+            bits = file.read()
+        self.capacity = header["capacity"]
+        self.bloom = BloomFilter(self.capacity, header["error_rate"], bits)
+        self.urls = None
+        self.count = header["count"]
+
+        # Rebuilding when partitions expired, their URLs are still in it
+        partitions = self.log.partitions()
+        names = {path.name for path in partitions}
+        if not set(header["sizes"]) <= names:
+            self.count = len(self.log.urls())
+            self._build_bloom()
+            return
+
+        # Adding the lines appended since
+        for path in partitions:
+            with path.open("r") as file:
+                file.seek(header["sizes"].get(path.name, 0))
+                for line in file:
+                    if line.strip():
+                        self.bloom.add(line.rstrip("\n"))
+                        self.count += 1
+        logger.debug(f"Loaded Bloom filter for {self.count} URLs")
+
+        # Rebuilding a full filter
+        if self.count > self.capacity:
+            self._build_bloom()
@@ -3,6 +3,8 @@ from pathlib import Path
 from datetime import datetime
 import logging
 
+from data_manager.atomic import dump_json
+
 # DataManager module responsible for operations on locally stored data
 # ToDo:
 # 1) streamline 'DataManager', review how and where it's used, reduce the number
@@ -38,9 +40,12 @@ class DataManager:
     - 'tokens_received' (int, the coken cost of the summary)
     - 'summarycount' (int, word count of the summary)
     - 'relativesize' (int, size of summary relative to body in %)
+    - 'duplicate_of' (str, optional, URL of the article it's a near-duplicate
+        of, read more in 'grouping/dedupe.py')
 
-    'discarded.json' - a list of URLs that were procesed and discraded before,
-    could be outdated or failed some check during scraping. 
+    Discarded URLs, that were procesed and discraded before, could be outdated
+    or failed some check during scraping, are kept in the `URLIndex` with the
+    scraped ones, read more in 'data_manager/index.py'.
 
     'archive.json' - a list of scraped articles that I archived. I'm planning to
     use these + 'articles.json' to train clustering models that group articles.
@@ -89,11 +94,11 @@ class DataManager:
 
         Params:
             data (list): data to be saved
-            filename (str): name of the file, conventionally; "articles" or
-                            "discarded" (potentially "archived")
+            filename (str): name of the file, conventionally; "articles" 
+                            (potentially "archived")
         """
         # Checking for filename
-        if filename not in ["articles", "discarded", "archived"]:
+        if filename not in ["articles", "archived"]:
             logger.error(f"No filename, or incorrect filename.")
             return
 
@@ -104,26 +109,25 @@ class DataManager:
         self.datetime_converter(data)
 
         # Saving data
-        with data_path.open("w") as file:
-            json.dump(data, file, indent=4)
-            logger.debug(f"Saved {data_path}")
+        dump_json(data, data_path, indent=4)
+        logger.debug(f"Saved {data_path}")
                 
 
     def update_current(self):
         """ 
-        Moves outdated articles from 'articles.json' to 'discarded.json'
+        Moves outdated articles from 'articles.json' to 'archived.json', their
+        URLs stay in the `URLIndex`.
 
         """
         # Loading data
         from utils.helpers import isoutdated
         articles = self.load("articles")
-        discarded = self.load("discarded")
         archived = self.load("archived")
 
         # Validating data by checking if 
         if all(
             not isinstance(data, json.JSONDecodeError) 
-            for data in [articles, discarded, archived]
+            for data in [articles, archived]
             ):
 
             # Initialising counter
@@ -131,7 +135,6 @@ class DataManager:
             # Updating data
             for article in articles[:]:
                 if isoutdated(article["published"]):
-                    discarded.append(article["url"])
                     archived.append(article)
                     articles.remove(article)
                     counter += 1
@@ -141,7 +144,6 @@ class DataManager:
 
             # Saving data files
             self.save(articles, "articles")
-            self.save(discarded, "discarded")
             self.save(archived, "archived")
 
         # Logging c
@@ -0,0 +1,316 @@
+import json
+import zlib
+import logging
+
+import numpy as np
+
+from data_manager.discarded import DayPartitionedLog
+from config.settings import near_duplicates
+
+# Near-duplicate detection of scraped articles before they are summarised. Wire
+# copy is published almost verbatim by several outlets and the same story is
+# scraped from several sections, every copy would cost its own summary. Each
+# body is reduced to a MinHash signature of its word shingles, signatures are
+# split into bands and articles sharing a band are compared, the share of equal
+# signature values estimates the Jaccard similarity of their shingles. Copies
+# above the threshold are linked to one canonical article with the longest
+# body; only the canonical article is summarised and its summary is shared with
+# its copies, which are then grouped with it by `Group`. The signatures and
+# summaries of summarised articles are kept in a log partitioned by day,
+# 'data/signatures', and expire like the URL index, read more in 
+# 'data_manager/discarded.py'. Copies of articles summarised in earlier runs
+# reuse their summary without a request. Read more in 'pipeline/process.py'
+# and 'grouping/group.py'.
+
+logger = logging.getLogger(__name__)
+
+# Mersenne prime modulus of the MinHash permutations
+prime = (1 << 61) - 1
+
+
+class NearDuplicates:
+	"""
+		Finds near-duplicate articles with MinHash and banded locality
+		sensitive hashing.
+
+		Attributes:
+			shingle (int): number of words in a shingle
+			bands (int): number of bands a signature is split into
+			rows (int): signature values per band
+			threshold (float): estimated Jaccard similarity above which
+			articles are duplicates
+			max_history (int): most signatures of earlier runs compared
+			a, b (array): coefficients of the permutations (a * x + b) % prime
+			history (obj): `DayPartitionedLog` object of JSON lines with the
+			URL, signature and summary of summarised articles
+			duplicates (dict): dict of canonical URL: list of duplicate
+			articles pairs of the last `find`
+			reused (list): articles of the last `find` that are copies of
+			articles summarised in earlier runs, with their summary
+			signatures (dict): dict of URL: signature pairs of the last `find`
+	"""
+	def __init__(self, settings=near_duplicates, seed=42, history=None):
+		"""
+			Initialise the settings and draw the permutations. The seed must
+			stay the same for signatures of earlier runs to compare.
+
+			Params:
+				settings (dict): default is loaded from 'config/settings.py'.
+				Dict is {"shingle", "permutations", "bands", "threshold",
+				"ttl_days", "max_history"}
+				seed (int): seed of the permutations
+				history (obj, optional): default is the log in 
+				'data/signatures'
+		"""
+		self.shingle = settings["shingle"]
+		self.bands = settings["bands"]
+		self.rows = settings["permutations"] // self.bands
+		self.threshold = settings["threshold"]
+		self.max_history = settings["max_history"]
+		generator = np.random.default_rng(seed)
+		size = self.bands * self.rows
+		self.a = generator.integers(1, 1 << 32, size, dtype=np.uint64)
+		self.b = generator.integers(0, 1 << 32, size, dtype=np.uint64)
+		self.history = history or DayPartitionedLog(
+			"signatures", settings["ttl_days"]
+			)
+		self.duplicates = {}
+		self.reused = []
+		self.signatures = {}
+
+
+	def find(self, articles):
+		"""
+			Main method, links near-duplicates to their canonical article.
+			Duplicates get a 'duplicate_of' key with the canonical URL. Copies
+			of articles summarised in earlier runs get their summary and are
+			stored in 'reused'.
+
+			Params:
+				articles (list): list of article dicts with 'body'
+			Returns:
+				originals (list): the articles without their duplicates
+		"""
+		# Computing signatures of bodies long enough for a shingle
+		signatures = {}
+		for position, article in enumerate(articles):
+			signature = self.signature(article.get("body") or "")
+			if signature is not None:
+				signatures[position] = signature
+		self.signatures = {
+			articles[position]["url"]: signature 
+			for position, signature in signatures.items()
+			}
+
+		# Reusing summaries of copies of earlier articles
+		self.reused = self._match_history(articles, signatures)
+		reused = {id(article) for article in self.reused}
+
+		# Collecting candidates sharing a band
+		buckets = {}
+		for position, signature in signatures.items():
+			for key in self._band_keys(signature):
+				buckets.setdefault(key, []).append(position)
+
+		# Verifying candidates and joining duplicates
+		parents = list(range(len(articles)))
+		checked = set()
+		for members in buckets.values():
+			for i, first in enumerate(members):
+				for second in members[i + 1:]:
+					if (first, second) in checked:
+						continue
+					checked.add((first, second))
+					similarity = np.mean(
+						signatures[first] == signatures[second]
+						)
+					if similarity >= self.threshold:
+						self._union(parents, first, second)
+
+		# Choosing the article with the longest body of each cluster
+		clusters = {}
+		for position in range(len(articles)):
+			if id(articles[position]) in reused:
+				continue
+			clusters.setdefault(self._root(parents, position), []).append(
+				articles[position]
+				)
+		originals = []
+		self.duplicates = {}
+		for cluster in clusters.values():
+			canonical = max(cluster, key=lambda article: (
+				len(article.get("body") or ""), article["url"]
+				))
+			originals.append(canonical)
+			copies = [article for article in cluster if article is not canonical]
+			for article in copies:
+				article["duplicate_of"] = canonical["url"]
+			if copies:
+				self.duplicates[canonical["url"]] = copies
+
+		# Logging results
+		linked = len(articles) - len(originals) - len(self.reused)
+		logger.info(f"Linked {linked} near-duplicates to "
+			f"{len(self.duplicates)} of {len(articles)} articles, "
+			f"{len(self.reused)} are copies of earlier articles")
+
+		return originals
+
+
+	def share(self, summarised_articles):
+		"""
+			Copies the summaries of canonical articles to their duplicates.
+			The cost was paid by the canonical article, so the duplicates
+			record no tokens. The signatures of the summarised articles are
+			added to the history, it's written with `save`.
+
+			Params:
+				summarised_articles (list): list of summarised article dicts
+			Returns:
+				summarised_articles (list): the same list with the duplicates
+				and the copies of earlier articles
+		"""
+		shared = []
+		for article in summarised_articles:
+			for duplicate in self.duplicates.get(article["url"], []):
+				self._copy_summary(article, duplicate)
+				shared.append(duplicate)
+
+			# Remembering the signature and summary for later runs
+			signature = self.signatures.get(article["url"])
+			if signature is not None:
+				self.history.add(json.dumps({
+					"url": article["url"],
+					"signature": signature.tobytes().hex(),
+					"summary": article["summary"],
+					"summarycount": article["summarycount"],
+				}))
+
+		logger.info(f"Shared summaries with {len(shared)} near-duplicates")
+		return summarised_articles + shared + self.reused
+
+
+	def save(self):
+		""" Writes the signatures added by `share`. """
+		self.history.flush()
+
+
+	def signature(self, body):
+		"""
+			Computes the MinHash signature of a body's word shingles.
+
+			Params:
+				body (str): the article body
+			Returns:
+				signature (array): the minimum of each permutation over the
+				shingle hashes, None for bodies shorter than a shingle
+		"""
+		words = body.lower().split()
+		if len(words) < self.shingle:
+			return None
+		hashes = np.array(
+			sorted({
+				zlib.crc32(" ".join(words[i:i + self.shingle]).encode())
+				for i in range(len(words) - self.shingle + 1)
+				}),
+			dtype=np.uint64
+			)
+		permuted = (np.outer(hashes, self.a) + self.b) % np.uint64(prime)
+		return permuted.min(axis=0)
+
+
+	def _match_history(self, articles, signatures):
+		"""
+			Finds copies of articles summarised in earlier runs and gives them
+			the summary of the closest one. Their signatures are removed from
+			`signatures`, they aren't compared within the batch.
+
+			Params:
+				articles (list): list of article dicts
+				signatures (dict): dict of position: signature pairs
+			Returns:
+				reused (list): the articles that got a summary
+		"""
+		# Indexing the bands of the earlier signatures
+		history = self._load_history()
+		buckets = {}
+		for entry_position, entry in enumerate(history):
+			for key in self._band_keys(entry["signature"]):
+				buckets.setdefault(key, []).append(entry_position)
+
+		# Matching each article to its closest earlier article
+		reused = []
+		for position, signature in list(signatures.items()):
+			article = articles[position]
+			candidates = set()
+			for key in self._band_keys(signature):
+				candidates.update(buckets.get(key, ()))
+			best, best_similarity = None, self.threshold
+			for entry_position in candidates:
+				entry = history[entry_position]
+				if entry["url"] == article["url"]:
+					continue
+				similarity = np.mean(signature == entry["signature"])
+				if similarity >= best_similarity:
+					best, best_similarity = entry, similarity
+			if best:
+				article["duplicate_of"] = best["url"]
+				self._copy_summary(best, article)
+				reused.append(article)
+				del signatures[position]
+
+		return reused
+
+
+	def _load_history(self):
+		"""
+			Reads the newest 'max_history' signatures of earlier runs, lines
+			that can't be read or were made with other settings are skipped.
+
+			Returns:
+				history (list): list of dicts with "url", "signature", 
+				"summary" and "summarycount"
+		"""
+		history = []
+		for line in self.history.urls()[-self.max_history:]:
+			try:
+				entry = json.loads(line)
+				entry["signature"] = np.frombuffer(
+					bytes.fromhex(entry["signature"]), dtype=np.uint64
+					)
+			except (json.JSONDecodeError, KeyError, ValueError):
+				continue
+			if len(entry["signature"]) == self.bands * self.rows:
+				history.append(entry)
+		return history
+
+
+	def _band_keys(self, signature):
+		""" Yields the bucket key of each band of a signature. """
+		for band in range(self.bands):
+			rows = signature[band * self.rows:(band + 1) * self.rows]
+			yield (band, rows.tobytes())
+
+
+	def _copy_summary(self, source, duplicate):
+		""" Gives a duplicate the summary of its source, without the cost. """
+		duplicate["summary"] = source["summary"]
+		duplicate["tokens_sent"] = 0
+		duplicate["tokens_received"] = 0
+		duplicate["summarycount"] = source["summarycount"]
+		duplicate["relativesize"] = round(
+			duplicate["summarycount"] / duplicate["bodycount"] * 100
+			)
+
+
+	def _root(self, parents, position):
+		""" Finds the root of a position in the union-find forest. """
+		while parents[position] != position:
+			parents[position] = parents[parents[position]]
+			position = parents[position]
+		return position
+
+
+	def _union(self, parents, first, second):
+		""" Joins the trees of two positions. """
+		parents[self._root(parents, first)] = self._root(parents, second)
@@ -9,6 +9,7 @@ from sklearn.metrics import (
 
 from data_manager.manager import DataManager
 from grouping.preprocess import Preprocess
+from grouping.identity import GroupIdentity
 from config.settings import parameter_grid
 
 class Group:
@@ -27,12 +28,17 @@ class Group:
 		meaning better fit. Furthermore, we prefer  parameters that produce
 		higher number of clusters. The second condition ensures that the 
 		composite scoring doesn't produce large blobs of unrelated articles.
+		Near-duplicates found before summarising are put in the group of
+		their canonical article, read more in 'grouping/dedupe.py'. The 
+		cluster labels are mapped to group IDs that are stable across runs,
+		read more in 'grouping/identity.py'.
 
 		Attributes:
 			manager (obj): data manager object
 			current (list): list of current articles
 			archived (list): list of archived articles
 			combined (list): list of current + archived
+			identity (obj): `GroupIdentity` object
 	"""
 	def __init__(self, param_grid=parameter_grid):
 		"""
@@ -53,6 +59,7 @@ class Group:
 		self.best_svd = None
 		self.best_dbscan = None
 		self.group_labels = None
+		self.identity = GroupIdentity()
 
 
 	def group(self):
@@ -64,13 +71,45 @@ class Group:
 		if not self.best_svd:
 			self.param_search()
 
-		# Adding group labels to article dictionaries
-		for label, article in zip(self.group_labels, self.current):
-			article["group"] = int(label)
+		# Grouping near-duplicates with their canonical article
+		self.link_duplicates()
 
-		# Saving current articles with group labels
+		# Mapping cluster labels to stable group IDs
+		group_ids = self.identity.assign(self.group_labels, self.current)
+		self.identity.save()
+
+		# Adding group IDs to article dictionaries
+		for group_id, article in zip(group_ids, self.current):
+			article["group"] = group_id
+
+		# Saving current articles with group IDs
 		self.manager.save(self.current, "articles")
 
+	def link_duplicates(self):
+		"""
+			Gives near-duplicates the label of their canonical article. A
+			canonical article DBSCAN left standalone gets a new label.
+		"""
+		positions = {
+			article["url"]: position 
+			for position, article in enumerate(self.current)
+			}
+		labels = [int(label) for label in self.group_labels]
+		next_label = max(labels, default=-1) + 1
+
+		# Moving each duplicate to its canonical article's group
+		for position, article in enumerate(self.current):
+			canonical = positions.get(article.get("duplicate_of"))
+			if canonical is None:
+				continue
+			if labels[canonical] == -1:
+				labels[canonical] = next_label
+				next_label += 1
+			labels[position] = labels[canonical]
+
+		self.group_labels = labels
+
+
 	def param_search(self):
 		"""
 			Custom parameter search method. Iterates over each combination of 
@@ -0,0 +1,183 @@
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+
+from data_manager.atomic import dump_json
+from config.settings import group_identity
+
+# Persistent identities for the groups found by `Group`. DBSCAN numbers its
+# clusters from scratch on every run, so the same story gets a different label
+# each time. Here each new cluster is matched to the previous group it shares
+# the most members with (Jaccard overlap of the article URLs) and keeps that
+# group's ID, clusters without a close enough match get a new ID. Each group
+# also stores a fingerprint of its current members and the fingerprint of the
+# members its summary was merged for, so `Merge` only asks OpenAI to merge
+# groups that are new or whose members changed since. The state is kept in
+# 'data/groups.json'.
+
+logger = logging.getLogger(__name__)
+
+
+class GroupIdentity:
+	"""
+		Assigns stable group IDs and remembers the merged summary of each
+		group.
+
+		Attributes:
+			settings (dict): 'group_identity' from 'config/settings.py'
+			path (Path): location of the state
+			state (dict): {"next_id": int, "groups": {id: {"members", 
+			"fingerprint", "summary", "merged_fingerprint", "seen"}}}, 
+			'merged_fingerprint' is the fingerprint of the members 'summary' 
+			was merged for, 'seen' is seconds since the epoch
+	"""
+	def __init__(self, settings=group_identity, path=None):
+		"""
+			Initialise the settings and load the state.
+
+			Params:
+				settings (dict, optional): default is 'group_identity'
+				path (Path, optional): default is 'data/groups.json'
+		"""
+		self.settings = settings
+		base_dir = Path(__file__).resolve().parent.parent
+		self.path = path or base_dir / "data" / "groups.json"
+		self.state = self._load_state()
+
+
+	def assign(self, labels, articles):
+		"""
+			Maps the cluster labels of a run to stable group IDs. Pairs of new
+			clusters and previous groups are matched greedily, the pair with
+			the highest overlap first, so each previous group is reused once.
+			Standalone articles keep the '-1' label.
+
+			Params:
+				labels (list): DBSCAN labels, one per article
+				articles (list): list of article dicts
+			Returns:
+				ids (list): stable group IDs, one per article
+		"""
+		# Collecting the members of each new cluster
+		clusters = {}
+		for label, article in zip(labels, articles):
+			if label != -1:
+				clusters.setdefault(int(label), set()).add(article["url"])
+
+		# Indexing the previous groups by member
+		groups = self.state["groups"]
+		owners = {}
+		for group_id, group in groups.items():
+			for url in group["members"]:
+				owners.setdefault(url, set()).add(group_id)
+
+		# Scoring clusters against the previous groups sharing a member
+		pairs = []
+		for label, members in clusters.items():
+			candidates = set().union(*(owners.get(url, ()) for url in members))
+			for group_id in candidates:
+				previous = set(groups[group_id]["members"])
+				overlap = len(members & previous) / len(members | previous)
+				if overlap >= self.settings["min_overlap"]:
+					pairs.append((overlap, label, group_id))
+
+		# Matching the closest pairs first
+		mapping = {}
+		taken = set()
+		for overlap, label, group_id in sorted(pairs, reverse=True):
+			if label not in mapping and group_id not in taken:
+				mapping[label] = group_id
+				taken.add(group_id)
+
+		# Giving the unmatched clusters new IDs
+		for label in sorted(clusters):
+			if label not in mapping:
+				mapping[label] = str(self.state["next_id"])
+				self.state["next_id"] += 1
+
+		# Updating the members of the groups of this run
+		now = time.time()
+		for label, members in clusters.items():
+			group = groups.setdefault(mapping[label], {"summary": None})
+			group["members"] = sorted(members)
+			group["fingerprint"] = self.fingerprint(members)
+			group["seen"] = now
+		self._prune(now)
+
+		logger.info(f"Kept {len(taken)} of {len(clusters)} group IDs, "
+			f"{len(clusters) - len(taken)} groups are new")
+
+		return [
+			int(mapping[int(label)]) if label != -1 else -1 
+			for label in labels
+			]
+
+
+	def merged(self, group_id, members):
+		"""
+			Returns the summary merged for a group if its members didn't
+			change since, None otherwise.
+
+			Params:
+				group_id (int): stable group ID
+				members (list): URLs of the articles in the group
+		"""
+		group = self.state["groups"].get(str(group_id))
+		fingerprint = self.fingerprint(members)
+		if group and group.get("merged_fingerprint") == fingerprint:
+			return group["summary"]
+		return None
+
+
+	def store(self, group_id, members, summary):
+		"""
+			Stores the summary merged for a group and its members.
+
+			Params:
+				group_id (int): stable group ID
+				members (list): URLs of the articles in the group
+				summary (str): the merged summary
+		"""
+		group = self.state["groups"].setdefault(str(group_id), {})
+		group["members"] = sorted(members)
+		group["fingerprint"] = self.fingerprint(members)
+		group["merged_fingerprint"] = group["fingerprint"]
+		group["summary"] = summary
+		group["seen"] = time.time()
+
+
+	def save(self):
+		""" Saves the state. """
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		dump_json(self.state, self.path, indent=4)
+		logger.debug(f"Saved {len(self.state['groups'])} groups")
+
+
+	@staticmethod
+	def fingerprint(members):
+		""" Hash of the sorted member URLs of a group. """
+		joined = "\n".join(sorted(members)).encode()
+		return hashlib.sha256(joined).hexdigest()
+
+
+	def _prune(self, now):
+		""" Forgets groups that weren't seen for 'max_age' seconds. """
+		groups = self.state["groups"]
+		for group_id in list(groups):
+			if now - groups[group_id].get("seen", now) > self.settings["max_age"]:
+				del groups[group_id]
+
+
+	def _load_state(self):
+		""" Loads the state, empty if missing or corrupt. """
+		empty = {"next_id": 0, "groups": {}}
+		if not self.path.exists():
+			return empty
+		try:
+			with self.path.open("r") as file:
+				return json.load(file)
+		except json.JSONDecodeError as error:
+			logger.error(f"Decoder error while loading {self.path}: {error}")
+			return empty
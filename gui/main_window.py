@@ -23,7 +23,8 @@ from config.settings import kr_system, kr_username
 #   2) the loading screen: dynamic loading screen that informs users on the 
 #       status of the backend process. While on the loading screen the backend 
 #       thread runs the scraping, summarising and other logic to prep articles
-#       for display.
+#       for display. It's replaced by the articles as soon as the first 
+#       summary is streamed in, the others are added while they arrive.
 #   3) the main screen: displays the articles in a tabbed format. This window
 #       implements some custom widgets to display a clickable tooltip for each
 #       summary.
@@ -199,6 +200,7 @@ class MainWindow(QMainWindow):
         self.thread.status_update.connect(self.update_status)
 
         # Connecting thread to main article window
+        self.thread.article_update.connect(self.update_article)
         self.thread.finished.connect(self.init_main_article)
 
         # Starting background thread
@@ -213,7 +215,40 @@ class MainWindow(QMainWindow):
         Params:
             message (str): the new status message
         """
-        self.status_label.setText(message)
+        # The loading screen is gone once articles are streamed in
+        if self.status_label:
+            self.status_label.setText(message)
+
+
+    def update_article(self, article):
+        """
+        Handles summaries streamed in before the run is finished. Adds the
+        article to the tab of its category or updates the text of its label.
+
+        Params:
+            article (dict): the article, 'summary' holds the text so far
+        """
+        # Replacing the loading screen on the first article
+        if self.status_label:
+            self.init_tabs()
+
+        # Updating the label of an article that's already displayed
+        if article["url"] in self.streamed_labels:
+            for label in self.streamed_labels[article["url"]]:
+                label.setText(article["summary"])
+                label.article = article
+            return
+
+        # Adding the article to each of its categories
+        labels = []
+        for category in article["category"]:
+            if category not in self.tab_layouts:
+                self.add_tab(category)
+            label = self.add_article_label(
+                self.tab_layouts[category], article
+                )
+            labels.append(label)
+        self.streamed_labels[article["url"]] = labels
 
 
     def init_loading_screen(self):
@@ -249,9 +284,22 @@ class MainWindow(QMainWindow):
 
     def init_main_article(self, articles):
         """
-        Handles the main article display screen.
+        Handles the main article display screen. Replaces the articles that
+        were streamed in with the grouped ones.
         """
+        self.init_tabs()
+        for category in articles:
+            tab_layout = self.add_tab(category)
+            for article in articles[category]:
+                self.add_article_label(tab_layout, article)
+
+
+    def init_tabs(self):
+        """ Replaces the central widget with an empty tabbed view. """
         self.takeCentralWidget()
+        self.status_label = None
+        self.tab_layouts = {}
+        self.streamed_labels = {}
         self.tabs = QTabWidget()
         self.setCentralWidget(self.tabs)
         self.setStyleSheet("""
@@ -268,23 +316,41 @@ class MainWindow(QMainWindow):
             """)
         self.tabs.tabBar().setFont(self.set_font(12, 20, 110))
 
-        for category in articles:
-            tab = QWidget()
-            tab_layout = QVBoxLayout(tab)
-            tab_layout.setContentsMargins(85, 35, 85, 35)
-            tab_layout.setSpacing(20)
 
-            scroll_area = QScrollArea()
-            scroll_area.setWidgetResizable(True)
-            scroll_area.setWidget(tab)
-            self.tabs.addTab(scroll_area, f"{category}")
+    def add_tab(self, category):
+        """
+        Adds a scrollable tab for a category.
 
-            for article in articles[category]:
-                label = CustomLabel(article["summary"], article, self)
-                label.setWordWrap(True)
-                label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-                label.setFont(self.set_font(14))
-                tab_layout.addWidget(label)
+        Returns:
+            tab_layout (obj): layout the article labels are added to
+        """
+        tab = QWidget()
+        tab_layout = QVBoxLayout(tab)
+        tab_layout.setContentsMargins(85, 35, 85, 35)
+        tab_layout.setSpacing(20)
+
+        scroll_area = QScrollArea()
+        scroll_area.setWidgetResizable(True)
+        scroll_area.setWidget(tab)
+        self.tabs.addTab(scroll_area, f"{category}")
+        self.tab_layouts[category] = tab_layout
+
+        return tab_layout
+
+
+    def add_article_label(self, tab_layout, article):
+        """
+        Adds the summary of an article to a tab.
+
+        Returns:
+            label (obj): `CustomLabel` object
+        """
+        label = CustomLabel(article["summary"], article, self)
+        label.setWordWrap(True)
+        label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        label.setFont(self.set_font(14))
+        tab_layout.addWidget(label)
+        return label
 
 
     def set_font(self, size, weight=None, spacing=None, family="Avenir Next"):
@@ -0,0 +1,89 @@
+import time
+import signal
+import logging
+import argparse
+
+from pipeline.process import Pipeline
+from pipeline.lock import PipelineLock
+from pipeline.startup import setup_logging, initialise_datafiles
+from config.settings import daemon_interval
+
+# Headless entry point, runs the article processing pipeline on a schedule
+# without the GUI so the articles are ready when the window opens. Run from
+# the program folder:
+#   python newsai_daemon.py              runs every 'daemon_interval' seconds
+#   python newsai_daemon.py --once       runs once, eg.: from cron
+#   python newsai_daemon.py --batch      sends summaries as batch jobs
+# Runs are skipped while the GUI holds the lock, read more in
+# 'pipeline/lock.py'. With '--batch' a run waits for its batch jobs, hours and
+# up to a day per job, holding the lock; meanwhile the GUI shows the stored
+# articles. Logs go to 'logs/daemon.log'.
+
+logger = logging.getLogger(__name__)
+
+# Set by the signal handler to stop after the current run
+stopping = False
+
+
+def stop(signum, frame):
+    """ Signal handler, stops the loop once the current run is finished. """
+    global stopping
+    stopping = True
+    logger.info(f"Received signal {signum}, stopping")
+
+
+def run_once(pipeline):
+    """
+    Runs the pipeline if no other process is running it.
+
+    Returns:
+        _ (bool): False when the run was skipped
+    """
+    with PipelineLock() as lock:
+        if not lock.acquired:
+            logger.info("Pipeline is running in another process, skipping")
+            return False
+        start = time.monotonic()
+        pipeline.run()
+        logger.info(f"Pipeline finished in {time.monotonic() - start:.0f}s")
+        return True
+
+
+def run_forever(pipeline, interval):
+    """
+    Runs the pipeline every `interval` seconds until stopped. A failed run is
+    logged and retried on the next one.
+    """
+    while not stopping:
+        started = time.monotonic()
+        try:
+            run_once(pipeline)
+        except Exception:
+            logger.exception("Pipeline run failed")
+
+        # Sleeping in short steps so signals are handled quickly
+        while not stopping and time.monotonic() - started < interval:
+            time.sleep(1)
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser()
+    arguments.add_argument("--once", action="store_true",
+        help="run the pipeline once and exit")
+    arguments.add_argument("--interval", type=int, default=daemon_interval,
+        help="seconds between runs, default is 'daemon_interval'")
+    arguments.add_argument("--batch", action="store_true",
+        help="send summaries and merges as batch jobs, slower but cheaper")
+    args = arguments.parse_args()
+
+    setup_logging("logs/daemon.log")
+    initialise_datafiles()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    pipeline = Pipeline(batch=args.batch)
+    if args.once:
+        run_once(pipeline)
+    else:
+        logger.info(f"Daemon started, running every {args.interval}s")
+        run_forever(pipeline, args.interval)
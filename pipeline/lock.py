@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import logging
+from pathlib import Path
+
+from config.settings import lock_grace
+
+# Lock file that keeps the GUI and the daemon from running the pipeline at the
+# same time, both write the same data files. The lock is 'data/pipeline.lock'
+# holding the process ID, the start time of the process and the time it was
+# taken. It's written to a temporary file first and hard linked into place,
+# which fails if the lock exists, so the lock file is never seen empty or half
+# written. A lock is only taken over when its process is gone; however long a
+# run takes, the lock of a running process is kept. Process IDs are reused, eg.:
+# a daemon restarted as PID 1 of a container gets the ID of the one that
+# crashed, so a lock whose process ID runs with another start time, or names
+# this process while it doesn't hold it, is stale as well. Start times are read
+# from '/proc', without it only the process ID is compared. A lock file that
+# can't be read is treated as held for 'lock_grace' seconds. Read more in
+# 'pipeline/process.py'.
+
+logger = logging.getLogger(__name__)
+
+# Lock files held by this process
+held = set()
+
+
+class PipelineLock:
+    """
+    Inter-process lock around a run of the pipeline. Can be used as a context
+    manager, 'acquired' tells if the lock was taken.
+
+    Attributes:
+        path (Path): location of the lock file
+        grace (int): seconds an unreadable lock file is treated as held
+        acquired (bool): True while this object holds the lock
+    """
+    def __init__(self, path=None, grace=lock_grace):
+        """
+        Initialise the location of the lock file.
+
+        Params:
+            path (Path, optional): default is 'data/pipeline.lock'
+            grace (int, optional): default is 'lock_grace'
+        """
+        base_dir = Path(__file__).resolve().parent.parent
+        self.path = path or base_dir / "data" / "pipeline.lock"
+        self.grace = grace
+        self.acquired = False
+
+
+    def acquire(self):
+        """
+        Takes the lock without waiting, a stale lock is removed first.
+
+        Returns:
+            acquired (bool): False when another process holds the lock
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self._write_temporary()
+        try:
+            for _ in range(2):
+                try:
+                    os.link(temporary, self.path)
+                except FileExistsError:
+                    if not self._remove_stale():
+                        return False
+                    continue
+                self.acquired = True
+                held.add(self.path)
+                logger.debug(f"Acquired {self.path}")
+                return True
+            return False
+        finally:
+            temporary.unlink(missing_ok=True)
+
+
+    def release(self):
+        """
+        Releases the lock if this object holds it. The file is only removed
+        while it still names this process, so a lock that was taken over is
+        left to its new holder.
+        """
+        if not self.acquired:
+            return
+        self.acquired = False
+        held.discard(self.path)
+        holder = self.holder()
+        if holder and holder.get("pid") == os.getpid():
+            self.path.unlink(missing_ok=True)
+            logger.debug(f"Released {self.path}")
+        else:
+            logger.warning(f"Lock {self.path} was taken over, not released")
+
+
+    def holder(self):
+        """
+        Reads the lock file.
+
+        Returns:
+            _ (dict): {"pid", "started", "taken"} or None when the lock is
+                free
+        """
+        return self._read(self.path)
+
+
+    def _read(self, path):
+        """
+        Reads a lock file. A file that can't be parsed has no process ID, its
+        modification time stands in for the time it was taken.
+        """
+        try:
+            with path.open("r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            try:
+                return {"pid": None, "taken": path.stat().st_mtime}
+            except FileNotFoundError:
+                return None
+
+
+    def _write_temporary(self):
+        """ Writes the contents of the lock to a file of this process. """
+        temporary = self.path.with_name(f"{self.path.name}.{os.getpid()}")
+        with temporary.open("w") as file:
+            json.dump({
+                "pid": os.getpid(),
+                "started": self._started(os.getpid()),
+                "taken": time.time(),
+            }, file)
+            file.flush()
+            os.fsync(file.fileno())
+        return temporary
+
+
+    def _is_stale(self, holder):
+        """
+        A lock is stale when its process is gone or when it's unreadable for
+        longer than the grace period. A process ID that was reused by another
+        process, or by this one before it took the lock, is gone as well.
+        """
+        pid = holder["pid"]
+        if pid is None:
+            return time.time() - holder["taken"] > self.grace
+        if pid == os.getpid() and self.path not in held:
+            return True
+        if not self._alive(pid):
+            return True
+        started, current = holder.get("started"), self._started(pid)
+        return started is not None and current is not None and (
+            started != current
+            )
+
+
+    def _remove_stale(self):
+        """
+        Removes the lock file when it's stale. The file is renamed away 
+        before it's removed, if it turns out another process took the lock in
+        the meantime it's put back.
+
+        Returns:
+            _ (bool): True when the lock was stale and removed
+        """
+        holder = self.holder()
+        if holder is None:
+            return True
+        if not self._is_stale(holder):
+            return False
+
+        # Moving the lock out of the way atomically
+        moved = self.path.with_name(f"{self.path.name}.stale.{os.getpid()}")
+        try:
+            os.rename(self.path, moved)
+        except FileNotFoundError:
+            return True
+
+        # Putting back a lock that isn't the one found stale
+        current = self._read(moved)
+        if current is not None and current.get("pid") is not None and (
+            current != holder
+            ):
+            try:
+                os.link(moved, self.path)
+            except FileExistsError:
+                pass
+            moved.unlink(missing_ok=True)
+            return False
+
+        logger.warning(f"Removing stale lock of process {holder['pid']}")
+        moved.unlink(missing_ok=True)
+        return True
+
+
+    def _alive(self, pid):
+        """ Checks if a process with `pid` is running. """
+        if not pid:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+
+    def _started(self, pid):
+        """
+        The boot ID and the start time of a process, they tell a reused
+        process ID apart. None where '/proc' isn't available.
+        """
+        try:
+            boot = Path("/proc/sys/kernel/random/boot_id").read_text().strip()
+            stat = Path(f"/proc/{pid}/stat").read_text()
+        except OSError:
+            return None
+        # The command name can hold spaces, the start time is the 20th field
+        # after it
+        return f"{boot}:{stat.rsplit(')', 1)[1].split()[19]}"
+
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+
+    def __exit__(self, *exc):
+        self.release()
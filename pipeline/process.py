@@ -0,0 +1,367 @@
+import json
+import time
+import logging
+import multiprocessing
+from pathlib import Path
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+
+from data_manager.manager import DataManager
+from data_manager.index import URLIndex
+from data_manager.atomic import dump_json
+from scraping.scrape import FetchHTML, ScrapeLinks, ScrapeContents
+from scraping.cache import HTTPCache
+from scraping.discover import DiscoverLinks, split_requests
+from scraping.watermarks import SectionWatermarks
+from summarising.summarise import Summary, PostJSON, Merge
+from summarising.cache import SummaryCache
+from summarising.batch import PostBatch
+from grouping.preprocess import Preprocess
+from grouping.dedupe import NearDuplicates
+from grouping.group import Group
+from utils.helpers import PrepareForGUI
+from utils.http_requests import get_runtime
+from config.settings import scrape_workers, section_cache_max_age
+
+# The article processing pipeline without the GUI. It runs the stages in order;
+# scraping, summarising, preprocessing, grouping and preparing the articles for
+# display. The stages are incremental, only new links are scraped and only new
+# articles are summarised, so frequent runs are cheap. The pipeline is run by
+# the GUI thread in 'gui/backend.py' and on a schedule by the daemon in
+# 'newsai_daemon.py', a `PipelineLock` makes sure only one of them runs it at
+# a time, read more in 'pipeline/lock.py'. The time of the last finished run
+# is kept in 'data/pipeline.json'.
+
+logger = logging.getLogger(__name__)
+
+
+class Pipeline:
+    """
+    Runs the article processing stages and reports progress through a status
+    callback.
+
+    Attributes:
+        status (function): called with a short message when a stage starts
+        batch (bool): send summaries and merges as batch jobs, read more in
+            'summarising/batch.py'
+        progress (function): called with an article dict whenever its summary
+            grows, so it can be displayed before the run is finished
+        path (Path): location of the record of the last run
+    """
+    def __init__(self, status=None, batch=False, progress=None):
+        """
+        Initialise the status callback.
+
+        Params:
+            status (function, optional): default is logging the message
+            batch (bool, optional): default is sending individual requests
+            progress (function, optional): default is not streaming summaries
+        """
+        self.status = status or logger.info
+        self.batch = batch
+        self.progress = progress
+        base_dir = Path(__file__).resolve().parent.parent
+        self.path = base_dir / "data" / "pipeline.json"
+
+
+    def run(self):
+        """
+        Runs every stage and records the run. The caller holds the lock.
+
+        Returns:
+            prepared_articles (dict): articles by category, read more in 
+                'utils/helpers.py'
+        """
+        # Starting scraping and updating status
+        started = time.time()
+        self.status("Downloading articles")
+        new_articles = self.scrape()
+
+        if new_articles:
+            # Starting summarising and updating status
+            self.status("Summarising articles")
+            summarised_articles = self.summarise(new_articles)
+
+            # Preprocessing
+            self.status("Preprocessing articles")
+            self.preprocess(summarised_articles)
+
+            # Grouping text
+            self.status("Grouping articles")
+            self.group()
+
+        # Starting processing and updating status
+        self.status("Processing articles")
+        prepared_articles = self.prepare_articles()
+
+        # Recording run
+        self._record(started, len(new_articles))
+
+        return prepared_articles
+
+
+    def last_run(self):
+        """
+        Reads the record of the last finished run.
+
+        Returns:
+            _ (dict): {"started", "finished", "new_articles"} or None
+        """
+        if not self.path.exists():
+            return None
+        try:
+            with self.path.open("r") as file:
+                return json.load(file)
+        except json.JSONDecodeError as error:
+            logger.error(f"Decoder error while loading {self.path}: {error}")
+            return None
+
+
+    def is_fresh(self, max_age):
+        """ Checks if the last run finished less than `max_age` seconds ago. """
+        record = self.last_run()
+        return bool(record) and time.time() - record["finished"] < max_age
+
+
+    def scrape(self):
+        """ 
+            Abstracts the process of scraping away from `run`. Responsible for 
+            tying together the scraping process. Returns a list of newly scraped
+            articles.
+        """
+        # Initialising requests and the shared async runtime
+        runtime = get_runtime()
+        fetch = FetchHTML()
+
+        # Initialising worker processes for parsing, if configured
+        with self._executor() as executor:
+
+            # Splitting sources by discovery backend
+            html_sections, feed_sections = split_requests()
+
+            # Keeping the sections due for a refresh
+            watermarks = SectionWatermarks()
+            html_sections = watermarks.due(html_sections)
+
+            # Fetching HTMLs of sections that changed since the last run
+            cache = HTTPCache(max_age=section_cache_max_age)
+            section_htmls = runtime.run(fetch.fetch(html_sections, cache))
+            watermarks.unchanged(fetch.not_modified)
+
+            # Scraping links from section HTMLs up to their watermarks
+            scrapelinks = ScrapeLinks(watermarks)
+            if executor:
+                new_article_links = scrapelinks.scrape_parallel(
+                    section_htmls, executor
+                    )
+            else:
+                parsed_section_htmls = fetch.parse(section_htmls, "links")
+                new_article_links = scrapelinks.scrape(parsed_section_htmls)
+
+            # Discovering links from feeds
+            if feed_sections:
+                discoverlinks = DiscoverLinks()
+                new_article_links.extend(runtime.run(
+                    discoverlinks.discover(fetch, feed_sections, cache)
+                    ))
+
+            # Logging result of scraping (optional)
+            scrapelinks.count_newlinks(new_article_links)
+
+            # Fetching, parsing and scraping article HTMLs as they arrive
+            scrapecontents = ScrapeContents()
+            new_articles = runtime.run(
+                scrapecontents.scrape_stream(
+                    fetch, new_article_links, executor
+                    )
+                )
+
+            # Remembering the section links and feed entries that were scraped
+            # and the validators of the pages they came from
+            watermarks.save()
+            if feed_sections:
+                discoverlinks.save_state()
+            cache.save()
+
+        return new_articles
+
+
+    def _executor(self):
+        """
+            Returns a process pool for parsing when 'scrape_workers' is set in
+            'config/settings.py', otherwise an empty context so parsing stays
+            serial. The workers are spawned, forking a process that runs the
+            async runtime and, in the GUI, Qt threads can deadlock them.
+        """
+        if scrape_workers:
+            logger.info(f"Parsing with {scrape_workers} worker processes")
+            return ProcessPoolExecutor(
+                max_workers=scrape_workers,
+                mp_context=multiprocessing.get_context("spawn")
+                )
+        return nullcontext()
+
+
+    def summarise(self, articles):
+        """
+            Abstracts the process of summarising the articles away from 'run'.
+            Returns summarised articles. Long articles take a second round 
+            combining the summaries of their chunks. Near-duplicates are 
+            summarised once, read more in 'grouping/dedupe.py'.
+        """
+        # Linking near-duplicates of the scraped articles
+        dedupe = NearDuplicates()
+        articles = dedupe.find(articles)
+
+        # Composing submission files
+        summary = Summary(articles)
+        submissionfiles = summary.compose_submissionfile()
+
+        # Requesting summaries of articles and chunks
+        cache = SummaryCache()
+        responses = self._request(submissionfiles, cache)
+
+        # Combining the chunk summaries of long articles
+        responses, combined = summary.compose_combined(responses)
+        if combined:
+            responses.extend(self._request(combined, cache))
+        cache.save()
+
+        # Processing responses and sharing summaries with near-duplicates
+        summarised_articles = summary.process_response(responses)
+        summarised_articles = dedupe.share(summarised_articles)
+        dedupe.save()
+
+        return summarised_articles
+
+
+    def _request(self, submissionfiles, cache):
+        """
+            Requests the summaries that aren't cached, read more in 
+            'summarising/cache.py'. Returns 2-tuples (responsefile, item).
+        """
+        # Reusing summaries of identical requests
+        responses, submissionfiles = cache.lookup(submissionfiles)
+        if self.progress:
+            for responsefile, item in responses:
+                content = responsefile["choices"][0]["message"]["content"]
+                self._preview(item, content, True)
+
+        # Requesting the remaining summaries, streamed when they are displayed
+        if submissionfiles:
+            if self.batch:
+                post = PostBatch()
+            elif self.progress:
+                post = PostJSON(on_delta=self._preview)
+            else:
+                post = PostJSON()
+            posted = get_runtime().run(post.post(submissionfiles))
+            cache.store(posted)
+            responses.extend(posted)
+
+        return responses
+
+
+    def _preview(self, item, text, done):
+        """
+        Passes the summary of an article to 'progress' while it's streamed.
+        Summaries of chunks aren't shown, the combined summary is.
+
+        Params:
+            item (dict): the article dict or chunk item
+            text (str): the summary so far
+            done (bool): whether the summary is complete
+        """
+        if "chunk" in item:
+            return
+        self.progress({
+            "url": item["url"],
+            "headline": item["headline"],
+            "source": item["source"],
+            "category": item["category"],
+            "published": item["published"],
+            "summary": text,
+            "grouped": False,
+            "partial": not done,
+        })
+
+
+    def preprocess(self, summarised_articles):
+        """ 
+            Abstracts the preprocessing away from 'run'.
+        """
+        # Preprocessing article's text contents
+        preprocessor = Preprocess()
+        preprocessed_articles = preprocessor.process(summarised_articles)
+        new_urls = [article["url"] for article in preprocessed_articles]
+
+        # Merging old articles with new ones and saving merged
+        manager = DataManager()
+        old_articles = manager.load()
+        if old_articles and not isinstance(old_articles, json.JSONDecodeError):
+            logger.info(f"Combined {len(old_articles)} existing articles with "
+                f"{len(preprocessed_articles)} new articles."
+                )
+            preprocessed_articles.extend(old_articles)
+            manager.save(preprocessed_articles, "articles")
+
+        # logging corrupted file
+        elif isinstance(old_articles, json.JSONDecodeError):
+            logger.error(f"'articles.json' is corrupt. Could not save")
+
+        # Saving new articles only, likely on first run
+        else:
+            logger.warning(f"No data found when trying to merge new with old")
+            manager.save(preprocessed_articles, "articles")
+
+        # Adding saved articles to the index of processed URLs
+        if not isinstance(old_articles, json.JSONDecodeError):
+            index = URLIndex()
+            index.update(new_urls)
+            index.flush()
+
+
+    def group(self):
+        """
+            Abstracts the process of grouping away from 'run'. Handles the 
+            clustering of articles and the subsequent merging of summaries
+            via OpenAI.
+        """
+        # Grouping articles
+        grouper = Group()
+        grouper.group()
+
+        # Merging summaries of groups
+        merger = Merge(PostBatch() if self.batch else None)
+        merger.merge()
+
+
+
+    def prepare_articles(self, update=True):
+        """
+        Abstracts the process of preparing the articles for the GUI.
+
+        Params:
+            update (bool, optional): archive outdated articles first, only 
+                allowed while holding the lock
+        """
+        # Updating data
+        if update:
+            manager = DataManager()
+            manager.update_current()
+
+        # Sorting and categorising
+        prepare = PrepareForGUI()
+        prepared_articles = prepare.prepare()
+
+        return prepared_articles
+
+
+    def _record(self, started, new_articles):
+        """ Records the time and the number of new articles of a run. """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        dump_json({
+            "started": started,
+            "finished": time.time(),
+            "new_articles": new_articles,
+        }, self.path, indent=4)
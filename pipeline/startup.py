@@ -0,0 +1,55 @@
+import json
+from pathlib import Path
+import logging
+import logging.config
+
+# Start-up shared by the entry points, 'newsai.py' launching the GUI and
+# 'newsai_daemon.py' running the pipeline on a schedule. Kept free of the GUI
+# so the daemon runs where PyQT5 isn't installed.
+
+
+def setup_logging(filename="logs/logs.log"):
+    """
+    Configures the logging settings for the application.
+
+    Params:
+        filename (str, optional): the log file, default is 'logs/logs.log'
+    """
+    logging.config.dictConfig({
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {
+            'fileHandler': {
+                'class': 'logging.FileHandler',
+                'filename': filename,  
+                'mode': 'a',  
+                'formatter': 'detailed',  
+            },
+        },
+        'formatters': {
+            'detailed': {
+                'format': '%(asctime)s %(levelname)s %(name)s %(message)s'
+            },
+        },
+        'loggers': {
+            '': {  
+                'handlers': ['fileHandler'],
+                'level': 'INFO',  
+                'propagate': True, 
+            },
+        }
+    })
+
+def initialise_datafiles():
+    """ Creates the empty data files on the first launch. """
+    base_dir = Path(__file__).resolve().parent.parent
+    filenames = ["articles.json", "archived.json"]
+    for filename in filenames:
+        path = base_dir / "data" / filename
+        if not path.exists():
+            empty_file = []
+            with open(path, "w") as file:
+                json.dump(empty_file, file)
+                logging.info(f"Initialised {filename}.")
+        else:
+            pass
@@ -0,0 +1,192 @@
+import gzip
+import json
+import time
+import random
+import asyncio
+import logging
+from pathlib import Path
+from urllib.parse import quote
+
+from aiohttp import web
+
+# Record and replay of HTTP responses, so the scraping path can be rerun and
+# benchmarked without the network. In record mode `FetchHTML` writes every
+# response to an `HTTPArchive`, a gzipped JSON lines file with the URL,
+# status, headers, time to respond and body of each response. In replay mode a
+# `ReplayServer` on localhost serves the archive and `FetchHTML` rewrites each
+# URL to point at it, so everything else, scheduling, retries, parsing and
+# extraction, runs exactly like on a live run. Latency can be injected to
+# mimic the recorded response times or a fixed delay. Read more in
+# 'benchmarks/bench_pipeline.py'.
+
+logger = logging.getLogger(__name__)
+
+# Headers that describe the recorded transfer rather than the body we replay
+hop_headers = {
+    "content-encoding", "content-length", "transfer-encoding", "connection",
+    "keep-alive"
+    }
+
+
+class HTTPArchive:
+    """
+    Archive of recorded responses, one JSON object per line, gzipped.
+
+    Attributes:
+        path (Path): location of the archive
+        recorded (float): time the recording started, seconds since the epoch
+        entries (dict): dict of url: response pairs, the last one recorded wins
+    """
+    def __init__(self, path):
+        """
+        Initialise the location and load the archive if it exists.
+
+        Params:
+            path (Path): location of the archive, eg.: 'data/run.jsonl.gz'
+        """
+        self.path = Path(path)
+        self.recorded = time.time()
+        self.entries = {}
+        if self.path.exists():
+            self.load()
+
+
+    def record(self, url, status, headers, elapsed, body):
+        """
+        Records a response.
+
+        Params:
+            url (str): the url
+            status (int): the status code
+            headers (dict): headers of the response
+            elapsed (float): seconds until the response arrived
+            body (str): body of the response, None for bodyless responses
+        """
+        self.entries[url] = {
+            "url": url,
+            "status": status,
+            "headers": {
+                k: v for k, v in headers.items() if k.lower() not in hop_headers
+                },
+            "elapsed": round(elapsed, 4),
+            "body": body,
+        }
+
+
+    def get(self, url):
+        """ Returns the recorded response of a URL or None. """
+        return self.entries.get(url)
+
+
+    def save(self):
+        """ Writes the archive, the first line holds the recording time. """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(self.path, "wt", encoding="utf-8") as file:
+            file.write(json.dumps({"recorded": self.recorded}) + "\n")
+            for entry in self.entries.values():
+                file.write(json.dumps(entry) + "\n")
+        logger.info(f"Saved {len(self.entries)} responses to {self.path}")
+
+
+    def load(self):
+        """ Reads the archive. """
+        with gzip.open(self.path, "rt", encoding="utf-8") as file:
+            self.recorded = json.loads(file.readline())["recorded"]
+            for line in file:
+                entry = json.loads(line)
+                self.entries[entry["url"]] = entry
+        logger.info(f"Loaded {len(self.entries)} responses from {self.path}")
+
+
+class ReplayServer:
+    """
+    Local server replaying an `HTTPArchive`. URLs are passed in the query
+    string, `rewrite` turns an original URL into the replay URL and can be
+    given to `FetchHTML`. URLs missing from the archive are answered with
+    '404'.
+
+    Attributes:
+        archive (obj): `HTTPArchive` object
+        latency (float or str): None, a fixed delay in seconds or "recorded"
+            to wait as long as the original response took
+        jitter (float): random fraction added to or taken from the delay
+        base (str): address of the running server
+        runner (obj): `web.AppRunner` object
+        stats (dict): counters of served and missing URLs
+    """
+    def __init__(self, archive, latency=None, jitter=0.0):
+        """
+        Initialise the server, it's started with `start`.
+
+        Params:
+            archive (obj): `HTTPArchive` object
+            latency (float or str, optional): default is no delay
+            jitter (float, optional): eg.: 0.2 for +-20%
+        """
+        self.archive = archive
+        self.latency = latency
+        self.jitter = jitter
+        self.base = None
+        self.runner = None
+        self.stats = {"served": 0, "missing": 0}
+
+
+    async def start(self, host="127.0.0.1", port=0):
+        """
+        Starts the server on the running loop, on a free port by default.
+
+        Returns:
+            base (str): address of the server
+        """
+        app = web.Application()
+        app.router.add_get("/replay", self._handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.base = f"http://{host}:{port}"
+        logger.info(f"Replaying {len(self.archive.entries)} responses on "
+            f"{self.base}")
+        return self.base
+
+
+    async def stop(self):
+        """ Stops the server. """
+        if self.runner:
+            await self.runner.cleanup()
+            logger.info(f"Replay server: {self.stats}")
+
+
+    def rewrite(self, url):
+        """ Turns an original URL into its replay URL. """
+        return f"{self.base}/replay?url={quote(url, safe='')}"
+
+
+    async def _handle(self, request):
+        """ Answers a request with the recorded response. """
+        # Retrieving the recorded response
+        entry = self.archive.get(request.query.get("url", ""))
+        if not entry:
+            self.stats["missing"] += 1
+            return web.Response(status=404)
+
+        # Injecting latency
+        delay = self._delay(entry)
+        if delay:
+            await asyncio.sleep(delay)
+
+        self.stats["served"] += 1
+        return web.Response(
+            status=entry["status"],
+            headers=entry["headers"],
+            text=entry["body"] if entry["body"] is not None else None
+            )
+
+
+    def _delay(self, entry):
+        """ Seconds to wait before answering. """
+        if self.latency is None:
+            return 0
+        base = entry["elapsed"] if self.latency == "recorded" else self.latency
+        return max(0.0, base * random.uniform(1 - self.jitter, 1 + self.jitter))
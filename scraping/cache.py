@@ -0,0 +1,115 @@
+import json
+import time
+import logging
+from pathlib import Path
+
+from data_manager.atomic import dump_json
+
+# On-disc HTTP cache used for conditional 'GET' requests of section pages. For
+# each URL it keeps the 'ETag' and 'Last-Modified' validators sent by the
+# server. On the next request the validators are sent back as 'If-None-Match'
+# and 'If-Modified-Since', if the page didn't change the server answers 
+# '304 Not Modified' without a body and `FetchHTML` skips that section 
+# entirely; its links were scraped when it last changed, read more in 
+# 'scraping/watermarks.py'. Bodies aren't kept, a skipped section is never
+# parsed. Like the watermarks the cache is saved at the end of a successful
+# run, after a crash the sections are fetched in full again. Read more in
+# 'scraping/scrape.py' and 'pipeline/process.py'.
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPCache:
+    """
+    Class responsible for storing validators of responses and for composing
+    the conditional request headers. Validators older than 'max_age'
+    are ignored so every section is downloaded in full now and then, this
+    guards against losing links when the local data was reset.
+
+    Attributes:
+        directory (Path): location of the cache
+        max_age (int): seconds a validator is used for conditional requests
+        index (dict): {url: {"etag", "last_modified", "stored"}}
+    """
+    def __init__(self, directory=None, max_age=3600):
+        """
+        Initialise cache location and load the index.
+
+        Params:
+            directory (Path, optional): default is 'data/http_cache'
+            max_age (int, optional): default is an hour
+        """
+        base_dir = Path(__file__).resolve().parent.parent
+        self.directory = directory or base_dir / "data" / "http_cache"
+        self.max_age = max_age
+        self.index = self._load_index()
+
+
+    def headers(self, url):
+        """
+        Composes the conditional request headers for a URL.
+
+        Params:
+            url (str): the url
+        Returns:
+            headers (dict): empty if nothing usable is cached
+        """
+        # Initialising empty headers
+        headers = {}
+
+        # Checking for a fresh entry
+        entry = self.index.get(url)
+        if not entry or time.time() - entry["stored"] > self.max_age:
+            return headers
+
+        # Adding validators
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        return headers
+
+
+    def store(self, url, response_headers):
+        """
+        Stores the validators of a response. Responses without validators are
+        not stored.
+
+        Params:
+            url (str): the url
+            response_headers (dict): headers of the response
+        """
+        # Retrieving validators
+        etag = response_headers.get("ETag")
+        last_modified = response_headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+
+        # Updating index
+        self.index[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored": time.time(),
+        }
+        logger.debug(f"Cached {url}")
+
+
+    def save(self):
+        """ Saves the index to disc. """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        dump_json(self.index, self.directory / "index.json", indent=4)
+        logger.debug(f"Saved HTTP cache index with {len(self.index)} entries")
+
+
+    def _load_index(self):
+        """ Loads the index from disc, an empty index if missing or corrupt. """
+        path = self.directory / "index.json"
+        if not path.exists():
+            return {}
+        try:
+            with path.open("r") as file:
+                return json.load(file)
+        except json.JSONDecodeError as error:
+            logger.error(f"Decoder error while loading {path}: {error}")
+            return {}
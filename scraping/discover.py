@@ -0,0 +1,370 @@
+import json
+import logging
+from pathlib import Path
+from email.utils import parsedate_to_datetime
+import xml.etree.ElementTree as ElementTree
+
+from dateutil import parser
+from dateutil import tz
+
+from scraping.scrape import ScrapeLinks
+from data_manager.atomic import dump_json
+from config.settings import sections, feeds, discovery_backends
+
+# Link discovery from RSS/Atom feeds and news sitemaps, an alternative to
+# scraping section pages with the link selectors. Feeds are small XML documents
+# with a link and a publish date per article, so they are cheaper to download
+# and parse and don't break when a site changes its markup. Each feed is read
+# incrementally, the newest date seen is stored per feed in
+# 'data/feed_state.json' and older entries are skipped on the next run. The
+# links go through the same checks as the ones scraped from sections, read
+# more in 'scraping/scrape.py'. The backend is chosen per source with
+# 'discovery_backends' in 'config/settings.py'.
+
+logger = logging.getLogger(__name__)
+
+
+def split_requests(backends=discovery_backends):
+    """
+    Splits the configured sections and feeds by the discovery backend of their
+    source. Sources without a backend use "html".
+
+    Params:
+        backends (dict): dict of source: backend pairs
+    Returns:
+        _ (tuple): 2-tuple (sections, feeds), lists of 3-tuples (url, src, cat)
+    """
+    return (
+        [s for s in sections if backends.get(s[1], "html") == "html"],
+        [f for f in feeds if backends.get(f[1], "html") == "feed"],
+    )
+
+
+class ExtractFeed:
+    """
+    Extracts the entries of a single RSS, Atom or sitemap document. Like
+    `ExtractLinks` it has no state, so it is cheap to use anywhere.
+    """
+    def extract(self, xml, url, labels=None):
+        """
+        Extracts the entries of a feed. Sitemap indexes list other sitemaps
+        instead of articles, their entries are returned with kind "index".
+
+        Params:
+            xml (str): the raw XML
+            url (str): the feed URL, used for logging
+            labels (dict, optional): filled with link: list of the category 
+                labels of RSS and Atom entries
+        Returns:
+            _ (tuple): 2-tuple (kind, entries), kind is "feed" or "index" and
+                entries a list of 2-tuples (link, published), None if the
+                document can't be read
+        """
+        # Parsing document
+        try:
+            root = ElementTree.fromstring(xml.strip().encode())
+        except ElementTree.ParseError as error:
+            logger.error(f"Feed is not valid XML: {url} {error}")
+            return None
+
+        # Dispatching on the root element
+        name = self._localname(root.tag)
+        if name == "rss" or name == "RDF":
+            return "feed", self._rss(root, labels)
+        if name == "feed":
+            return "feed", self._atom(root, labels)
+        if name == "urlset":
+            return "feed", self._sitemap(root, "url")
+        if name == "sitemapindex":
+            return "index", self._sitemap(root, "sitemap")
+        logger.error(f"Unknown feed format '{name}': {url}")
+        return None
+
+
+    def _rss(self, root, labels=None):
+        """
+        Entries of a RSS document, from 'item/link' and 'item/pubDate'. The
+        labels are read from 'item/category'.
+        """
+        entries = []
+        for item in self._children(root, "item", recursive=True):
+            link = self._text(item, "link")
+            date = self._text(item, "pubDate") or self._text(item, "date")
+            if link:
+                entries.append((link, self._parse_date(date)))
+                if labels is not None:
+                    labels[link] = [
+                        c.text.strip() 
+                        for c in self._children(item, "category") if c.text
+                        ]
+        return entries
+
+
+    def _atom(self, root, labels=None):
+        """
+        Entries of an Atom document, from 'entry/link[@href]'. The labels are
+        read from 'entry/category[@term]'.
+        """
+        entries = []
+        for entry in self._children(root, "entry"):
+            link = None
+            for element in self._children(entry, "link"):
+                if element.get("rel", "alternate") == "alternate":
+                    link = element.get("href")
+                    break
+            date = (
+                self._text(entry, "published") 
+                or self._text(entry, "updated")
+                )
+            if link:
+                entries.append((link, self._parse_date(date)))
+                if labels is not None:
+                    labels[link] = [
+                        c.get("term").strip() 
+                        for c in self._children(entry, "category") 
+                        if c.get("term")
+                        ]
+        return entries
+
+
+    def _sitemap(self, root, tag):
+        """
+        Entries of a sitemap or sitemap index, from '<tag>/loc' and the news
+        publication date or 'lastmod'.
+        """
+        entries = []
+        for element in self._children(root, tag):
+            link = self._text(element, "loc")
+            date = (
+                self._text(element, "publication_date", recursive=True)
+                or self._text(element, "lastmod")
+                )
+            if link:
+                entries.append((link, self._parse_date(date)))
+        return entries
+
+
+    def _children(self, element, name, recursive=False):
+        """ Child elements by local name, ignoring namespaces. """
+        elements = element.iter() if recursive else element
+        return [e for e in elements if self._localname(e.tag) == name]
+
+
+    def _text(self, element, name, recursive=False):
+        """ Stripped text of the first child element by local name or None. """
+        for child in self._children(element, name, recursive):
+            if child.text and child.text.strip():
+                return child.text.strip()
+        return None
+
+
+    def _localname(self, tag):
+        """ Strips the namespace from a tag, eg.: '{http://...}loc' -> 'loc'. """
+        return tag.rsplit("}", 1)[-1]
+
+
+    def _parse_date(self, string):
+        """
+        Parses RFC 822 dates used by RSS and ISO 8601 dates used by Atom and
+        sitemaps. Standardises to UTC, dates without a timezone are taken as
+        UTC.
+
+        Params:
+            string (str): the date or None
+        Returns:
+            _ (datetime): or None
+        """
+        if not string:
+            return None
+        try:
+            date = parsedate_to_datetime(string)
+        except (TypeError, ValueError):
+            try:
+                date = parser.isoparse(string)
+            except ValueError:
+                return None
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=tz.tzutc())
+        return date.astimezone(tz.tzutc())
+
+
+class DiscoverLinks(ScrapeLinks):
+    """
+    Discovers article links from feeds. Returns the same 3-tuples
+    (url, src, [cat]) as `ScrapeLinks.scrape` and applies the same checks
+    against processed URLs and stale dates.
+
+    Attributes:
+        extractor (obj): `ExtractFeed` object
+        path (Path): location of the feed state
+        state (dict): dict of feed URL: newest date seen, in ISO format
+    """
+    def __init__(self):
+        """ Initialises the checks of `ScrapeLinks` and loads the state. """
+        super().__init__()
+        # Feed dates are exact, stale links are discarded without slack
+        self.link_dates = {}
+        self.extractor = ExtractFeed()
+        base_dir = Path(__file__).resolve().parent.parent
+        self.path = base_dir / "data" / "feed_state.json"
+        self.state = self._load_state()
+
+
+    async def discover(self, fetch, feeds, cache=None):
+        """
+        Fetches the feeds and returns the new links. Sitemap indexes are
+        followed one level down, only to the sitemaps modified since the last
+        run.
+
+        Params:
+            fetch (obj): `FetchHTML` object
+            feeds (list): list of 3-tuples (url, src, cat)
+            cache (obj, optional): `HTTPCache` object for conditional requests
+        Returns:
+            checked_links (list): list of 3-tuples like (url, src, [cat])
+        """
+        logger.debug(f"Discovering links from {len(feeds)} feeds")
+        # Initialising empty containers
+        new_links = []
+        children = []
+
+        # Fetching feeds, unchanged ones are answered with '304'
+        for url, src, cat, xml in await fetch.fetch(feeds, cache):
+            new_links.extend(self._read(url, src, cat, xml, children))
+
+        # Following sitemap indexes
+        if children:
+            for url, src, cat, xml in await fetch.fetch(children, cache):
+                new_links.extend(self._read(url, src, cat, xml, []))
+
+        # Saving stale links
+        self.index.flush()
+
+        # Check for multi-category links
+        checked_links = self._check_category(new_links)
+        logger.info(f"Discovered {len(checked_links)} new links from "
+            f"{len(feeds)} feeds")
+
+        return checked_links
+
+
+    def _read(self, url, src, cat, xml, children):
+        """
+        Extracts the entries of one feed newer than its state and packs them
+        like `ScrapeLinks._package_links`. Entries of sitemap indexes are added
+        to `children` as requests instead.
+
+        Params:
+            url (str): the feed URL
+            src (str): the source
+            cat (str or dict): the category, or a dict of entry label: 
+                category pairs for feeds covering several categories
+            xml (str): the raw XML
+            children (list): container for sitemap requests
+        Returns:
+            _ (list): list of 3-tuples like (url, src, cat)
+        """
+        # Extracting entries
+        labels = {}
+        extracted = self.extractor.extract(xml, url, labels)
+        if not extracted:
+            return []
+        kind, entries = extracted
+
+        # Skipping entries seen on previous runs
+        entries = self._check_watermark(url, entries)
+
+        # Following sitemap indexes
+        if kind == "index":
+            children.extend((link, src, cat) for link, _ in entries)
+            return []
+
+        if not isinstance(cat, dict):
+            return self._package_links(entries, url, src, cat)
+
+        # Packing entries under the categories their labels map to
+        packed = []
+        for category, selected in self._split_labels(entries, labels, cat, 
+            url).items():
+            packed.extend(self._package_links(selected, url, src, category))
+        return packed
+
+
+    def _split_labels(self, entries, labels, categories, url):
+        """
+        Sorts the entries of a feed covering several categories by the labels
+        of each entry. Entries without a mapped label are skipped, they would
+        otherwise get a tab of their own.
+
+        Params:
+            entries (list): list of 2-tuples (link, published)
+            labels (dict): dict of link: list of labels
+            categories (dict): dict of label: category pairs
+            url (str): the feed URL, used for logging
+        Returns:
+            split (dict): dict of category: list of 2-tuples (link, published)
+        """
+        split = {}
+        skipped = 0
+        for link, published in entries:
+            mapped = {
+                categories[label] for label in labels.get(link, []) 
+                if label in categories
+                }
+            if not mapped:
+                skipped += 1
+            for category in sorted(mapped):
+                split.setdefault(category, []).append((link, published))
+        logger.debug(f"Skipped {skipped} entries without a category: {url}")
+        return split
+
+
+    def _check_watermark(self, url, entries):
+        """
+        Keeps the entries newer than the newest date seen on the previous run
+        of the feed, or without a date, and moves the mark forward.
+
+        Params:
+            url (str): the feed URL
+            entries (list): list of 2-tuples (link, published)
+        Returns:
+            _ (list): list of 2-tuples (link, published)
+        """
+        # Reading the mark
+        mark = self.state.get(url)
+        mark = parser.isoparse(mark) if mark else None
+
+        # Filtering entries
+        fresh = [
+            (link, published) for link, published in entries
+            if not mark or not published or published > mark
+            ]
+
+        # Moving the mark
+        dates = [published for _, published in entries if published]
+        if dates:
+            self.state[url] = max(dates + ([mark] if mark else [])).isoformat()
+        logger.debug(f"{len(fresh)} of {len(entries)} entries are new: {url}")
+
+        return fresh
+
+
+    def _load_state(self):
+        """ Loads the feed state, empty if missing or corrupt. """
+        if not self.path.exists():
+            return {}
+        try:
+            with self.path.open("r") as file:
+                return json.load(file)
+        except json.JSONDecodeError as error:
+            logger.error(f"Decoder error while loading {self.path}: {error}")
+            return {}
+
+
+    def save_state(self):
+        """
+        Saves the feed state. Called once the discovered links were scraped,
+        so a crashed run doesn't skip them on the next one.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        dump_json(self.state, self.path, indent=4)
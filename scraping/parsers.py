@@ -0,0 +1,232 @@
+import re
+import json
+import logging
+from functools import lru_cache
+
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
+
+from config.settings import selectors, parser_backends, partial_parsing
+
+# Module that turns raw HTML into BS4 objects. It picks the fastest parser
+# backend that is installed and, when 'partial_parsing' is on, only builds the
+# parts of a page the configured selectors can match. A selector like
+# "main div.RichTextBody p" can only match inside a <main> element, so we tell
+# BS4 to keep the <main> subtrees and skip everything else on the page (menus,
+# footers, scripts, ads). The first compound of each selector, eg.: 'main' or
+# "section#stream-panel", decides which subtrees are kept. Read more about the
+# selectors in 'config/settings.py'.
+# Article headers are JSON-LD blocks that can be read straight from the raw
+# HTML with `extract_ld_json`, so pages can be screened before any parsing.
+
+logger = logging.getLogger(__name__)
+
+# Selector keys used for each kind of page
+page_selectors = {
+    "links": ["link_selector"],
+    "contents": ["header_selector", "text_selector"],
+    "body": ["text_selector"],
+}
+
+# Pattern matching the parts of a simple compound selector; the tag name, ids,
+# classes and attribute selectors like [type='application/ld+json']
+compound_pattern = re.compile(
+    r"""(?P<tag>^[a-zA-Z][\w-]*)"""
+    r"""|\#(?P<id>[\w-]+)"""
+    r"""|\.(?P<cls>[\w-]+)"""
+    r"""|\[(?P<attr>[\w-]+)(?:=(?P<quote>['"]?)(?P<value>.*?)(?P=quote))?\]"""
+)
+
+# Pattern matching the contents of <script type="application/ld+json"> blocks
+ld_json_pattern = re.compile(
+    r"""<script[^>]*?type\s*=\s*['"]?application/ld\+json['"]?[^>]*>"""
+    r"""(?P<json>.*?)</script\s*>""",
+    re.IGNORECASE | re.DOTALL
+)
+
+
+def select_backend(backends=parser_backends):
+    """
+    Picks the first installed parser backend from the list of preferred
+    backends. 'html.parser' is part of the standard library and is always
+    available, so it is used as the last resort.
+
+    Params:
+        backends (list): names of BS4 tree builders in order of preference
+    Returns:
+        backend (str): name of the backend
+    """
+    for backend in backends:
+        if builder_registry.lookup(backend):
+            return backend
+    return "html.parser"
+
+
+# Resolving the backend once per process
+backend = select_backend()
+logger.debug(f"Using '{backend}' to parse HTML")
+
+
+def parse_html(html, src=None, kind=None, backend=backend, partial=None):
+    """
+    Parses a HTML document using BS4. When the source and the kind of page
+    ("links" for section pages, "contents" for article pages) are given and
+    partial parsing is on, only the subtrees the source's selectors can match
+    are built. It's a module level function so worker processes can use it
+    without a `FetchHTML` object.
+
+    Params:
+        html (str): raw html
+        src (str, optional): the source
+        kind (str, optional): "links", "contents" or "body"
+        backend (str, optional): BS4 tree builder, default is the fastest one
+            installed
+        partial (bool, optional): overrides 'partial_parsing' from settings
+    Returns:
+        soup (BS4 obj.): parsed html
+    """
+    # Resolving partial parsing
+    if partial is None:
+        partial = partial_parsing
+
+    # Building the strainer for this source and kind of page
+    strainer = None
+    if partial and src and kind:
+        strainer = build_strainer(src, kind)
+
+    return BeautifulSoup(html, backend, parse_only=strainer)
+
+
+@lru_cache(maxsize=None)
+def build_strainer(src, kind):
+    """
+    Builds a SoupStrainer that keeps the subtrees the source specific
+    selectors of the given kind of page can match. Returns None, meaning the
+    full page is parsed, if any selector can't be reduced to a simple
+    compound, eg.: when it uses pseudo-classes like ':nth-child' that depend
+    on the rest of the page.
+
+    Params:
+        src (str): the source
+        kind (str): "links", "contents" or "body"
+    Returns:
+        strainer (obj): SoupStrainer or None
+    """
+    # Collecting the first compound of each selector
+    targets = []
+    for key in page_selectors[kind]:
+        for selector in selectors[key][src].split(","):
+            target = parse_compound(selector.split()[0])
+            if not target:
+                logger.warning(f"Can't strain {src} {key} '{selector}', "
+                    f"parsing full pages")
+                return None
+            targets.append(target)
+
+    # Tag names, used when BS4 only passes the name to the strainer
+    names = {name for name, _ in targets}
+
+    def match(name, attrs=None):
+        """ Matches a tag against any of the targets. """
+        # Newer BS4 versions only pass the name, keep every tag of that name
+        if attrs is None:
+            return name in names
+        return any(
+            name == tag and matches_attrs(attrs, required)
+            for tag, required in targets
+        )
+
+    return SoupStrainer(match)
+
+
+def parse_compound(compound):
+    """
+    Turns a simple compound selector, eg.: "article[id='story']" or
+    "div.container__inner" into the tag name and the attributes required to
+    match it. Returns None when the compound has no tag name or can't be
+    fully understood.
+
+    Params:
+        compound (str): compound selector
+    Returns:
+        _ (tuple): 2-tuple (tag, {attr: value or None}) or None
+    """
+    # Initialising tag name and required attributes
+    tag = None
+    required = {}
+    position = 0
+
+    # Consuming the compound one part at a time
+    while position < len(compound):
+        part = compound_pattern.match(compound, position)
+        if not part:
+            return None
+        if part.group("tag"):
+            tag = part.group("tag").lower()
+        elif part.group("id"):
+            required["id"] = part.group("id")
+        elif part.group("cls"):
+            required.setdefault("class", []).append(part.group("cls"))
+        else:
+            required[part.group("attr")] = part.group("value")
+        position = part.end()
+
+    # Tag name is required to keep the strainer cheap and predictable
+    if not tag:
+        return None
+
+    return tag, required
+
+
+def matches_attrs(attrs, required):
+    """
+    Checks the attributes of a tag, as passed to the strainer while parsing,
+    against the required attributes of a target. A required value of None
+    only checks that the attribute is present.
+
+    Params:
+        attrs (dict): attributes of the tag
+        required (dict): required attributes
+    Returns:
+        _ (bool)
+    """
+    for attr, value in required.items():
+        if attr not in attrs:
+            return False
+        if attr == "class":
+            classes = attrs["class"]
+            if isinstance(classes, str):
+                classes = classes.split()
+            if not all(cls in classes for cls in value):
+                return False
+        elif value is not None and attrs[attr] != value:
+            return False
+    return True
+
+
+def extract_ld_json(html):
+    """
+    Reads the first JSON-LD block of a page from the raw HTML without parsing
+    it, the same block the "script[type='application/ld+json']" header 
+    selectors match. Lists are reduced to their first item.
+
+    Params:
+        html (str): raw html
+    Returns:
+        header (dict): or None if there is no block or it isn't valid JSON
+    """
+    # Finding the first block
+    match = ld_json_pattern.search(html)
+    if not match:
+        return None
+
+    # Decoding the block
+    try:
+        header = json.loads(match.group("json"))
+    except json.JSONDecodeError:
+        return None
+
+    # Handling site-specific formatting differences
+    if isinstance(header, list):
+        header = header[0] if header else None
+    return header if isinstance(header, dict) else None
@@ -1,23 +1,31 @@
+import re
 import json
+import time
 import logging
 import random
 import asyncio
 from collections import defaultdict
 from collections import Counter
+from datetime import datetime, timedelta
 from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup
 import aiohttp
 from dateutil import parser
 from dateutil import tz
 
 from utils.helpers import isoutdated
-from data_manager.manager import DataManager
-from config.settings import selectors, user_agents
+from utils.throttle import HostScheduler, parse_retry_after
+from utils.retry import RetryPolicy
+from utils.http_requests import get_runtime
+from scraping.parsers import parse_html, extract_ld_json
+from data_manager.index import URLIndex
+from config.settings import selectors, user_agents, header_prefilter, link_dates
+from config.settings import section_refresh
 
 # Module to scrape articles. It implements 3 classes, one to handle the network
-# operations and two to handle the scraping. For more about the scraping logic
-# read 'config/settings.py'.
+# operations and two to handle the scraping, plus the extraction classes they
+# build on. Parsing lives in 'scraping/parsers.py'. For more about the scraping
+# logic read 'config/settings.py'.
 
 # ToDo:
 # 1) Merge 'ScrapeLink' and 'ScrapeContents' into 'Scraper'
@@ -35,31 +43,56 @@ class FetchHTML:
     URL and the category it belongs to. Read more in 'config/settings.py'.
     Responses are repackaged into tuples containing the same meta-information
     + the HTML content. Exceptions are re-raised up the call stack and stored 
-    separately. Note: exceptions are not retried but stored in 'exceptions'.
+    separately. Transient errors are retried by a `RetryPolicy` first, read 
+    more in 'utils/retry.py', only what still fails is stored in 'exceptions'.
+    Requests are scheduled per source by a `HostScheduler` with its own 
+    concurrency cap and requests-per-second limit, read more in 
+    'utils/throttle.py'. 'rate_limit' only caps the total. Requests go
+    through the session shared with the other stages, read more in 
+    'utils/http_requests.py'.
 
     Attributes:
         rate_limit (int): the rate-limit of requests
         user_agents (list): list of user-agents
         exceptions (list): list of exceptions raised
+        not_modified (list): URLs answered with '304 Not Modified'
+        scheduler (obj): `HostScheduler` object
+        retry (obj): `RetryPolicy` object, shared by all requests of the run
+        client (obj): `HTTPClient` object holding the shared session
+        slots (obj): `asyncio.Semaphore` enforcing 'rate_limit'
+        archive (obj): `HTTPArchive` object, responses are recorded to it
+        rewrite (function): turns a URL into the one actually requested, eg.:
+            `ReplayServer.rewrite`, read more in 'scraping/archive.py'
     """
-    def __init__(self, rate_limit=50):
+    def __init__(self, rate_limit=50, client=None, archive=None, rewrite=None):
         """
-        Initialise rate-limit (defaul is 50), list of user agents and empty
-        exceptions list.
+        Initialise rate-limit (defaul is 50), list of user agents, empty
+        exceptions list, the per source scheduler, the retry policy and the
+        HTTP client.
 
         Params:
-            rate_limit (int, optional): the rate limit
+            rate_limit (int, optional): the total rate limit
+            client (obj, optional): default is the client of the shared runtime
+            archive (obj, optional): `HTTPArchive` object to record to
+            rewrite (function, optional): URL rewrite hook, used for replays
         """
         self.rate_limit = rate_limit
         self.user_agents = user_agents
         self.exceptions = []
+        self.not_modified = []
+        self.scheduler = HostScheduler()
+        self.retry = RetryPolicy()
+        self.client = client or get_runtime().client
+        self.slots = None
+        self.archive = archive
+        self.rewrite = rewrite
 
 
-    async def fetch(self, requests):
+    async def fetch(self, requests, cache=None):
         """
         Main method to fethc HTMLs. It takes a list of requests as argument each
         request a 3-tuple; (url, source, category). 
-        Creates a session with rate-limiting then creates a list of tasks
+        Retrieves the shared session then creates a list of tasks
         by iterating over the list of requests and passing each request and the
         session object to the utility method `_process_request`. The tasks
         are executed concurrently. Any exceptions raised during the request are
@@ -67,47 +100,107 @@ class FetchHTML:
         adding an Exception object to the results. The successful results are
         separated from the exceptions and returned as a list of 4-tuples 
         (url, source, categor, html).
+        With a `cache` the requests are conditional, URLs that didn't change
+        since they were cached are left out of the results and stored in 
+        'self.not_modified'. The cache isn't saved here, the caller saves it
+        once the pages were processed. Read more in 'scraping/cache.py'.
 
         Params:
             requests (list): list of 3-tuples (url, src, cat)
+            cache (obj, optional): `HTTPCache` object
         Returns:
             results (list): list of 4-tuples (url, src, cat, html)
         """
+        # Retrieving shared session and initialising rate-limit
+        session = await self.client.get_session()
+        self.slots = asyncio.Semaphore(self.rate_limit)
 
-        # Initialising connector 
-        connector = aiohttp.TCPConnector(limit=self.rate_limit)
+        # Creating list of tasks
+        tasks = [self._process_request(request, session, cache) 
+                    for request in requests]
 
-        # Opening network session 
-        async with aiohttp.ClientSession(connector=connector) as session:
+        # Executing list of tasks 
+        results = await asyncio.gather(*tasks, return_exceptions=True)
 
-            # Creating list of tasks
-            tasks = [self._process_request(request, session) 
-                        for request in requests]
+        # Sorting successful requests from exceptions
+        results = self._sort_results(results)
 
-            # Executing list of tasks 
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+        # Logging results
+        logger.info(f"Fetched HTML of {len(results)} URLs from "
+            f"{len(tasks)} concurrent tasks with "
+            f"{len(self.exceptions)} exceptions and "
+            f"{len(self.not_modified)} not modified"
+            )
+        self.scheduler.log_stats()
+        self.retry.log_stats("FetchHTML")
+        self.client.log_stats()
 
-            # Sorting successful requests from exceptions
-            results = self._sort_results(results)
+        return results
 
-            # Logging results
-            logger.info(f"Fetched HTML of {len(results)} URLs from "
-                f"{len(tasks)} concurrent tasks with "
-                f"{len(self.exceptions)} exceptions"
-                )
 
-            return results
+    async def stream(self, requests):
+        """
+        Streaming alternative to `fetch`. It's an async generator that yields
+        each 4-tuple (url, src, cat, html) as soon as its response arrives
+        instead of waiting for every request to finish. This lets the caller
+        parse and extract each page while the slower hosts are still
+        answering, and only one page needs to be held in memory at a time.
+        Exceptions are stored in 'self.exceptions' like in `fetch`.
+
+        Params:
+            requests (list): list of 3-tuples (url, src, cat)
+        Yields:
+            _ (tuple): 4-tuple (url, src, cat, html)
+        """
+        # Retrieving shared session and initialising rate-limit
+        session = await self.client.get_session()
+        self.slots = asyncio.Semaphore(self.rate_limit)
+
+        # Scheduling tasks so they can be cancelled if the consumer stops
+        tasks = [asyncio.ensure_future(
+            self._process_request(request, session)) 
+            for request in requests]
+
+        # Initialising counter
+        counter = 0
+
+        try:
+            # Yielding responses in order of completion
+            for task in asyncio.as_completed(tasks):
+                try:
+                    result = await task
+                except Exception as error:
+                    self.exceptions.append(error)
+                    continue
+                counter += 1
+                yield result
+
+        # Cancelling unfinished tasks when the generator is closed early
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        # Logging results
+        logger.info(f"Streamed HTML of {counter} URLs from "
+            f"{len(tasks)} concurrent tasks with "
+            f"{len(self.exceptions)} exceptions"
+            )
+        self.scheduler.log_stats()
+        self.retry.log_stats("FetchHTML")
+        self.client.log_stats()
 
 
-    def parse(self, results):
+    def parse(self, results, kind=None):
         """
         Method that parses HTML content using BS4. It takes a list of 4-tuples
         as argument (usually the list generated by 'fetch') and parses each 
         HTML, returning the same list with the parsed HTML in place of the raw
-        HTML.
+        HTML. With `kind` given, only the parts of the pages the selectors
+        can match are parsed, read more in 'scraping/parsers.py'.
 
         Params: 
             results (list): list of 4-tuples (url, src, cat, html)
+            kind (str, optional): "links" or "contents"
         Returns:
             parsed (list): list of 4-tuples (url, src, cat, parsed_html)
         """
@@ -117,7 +210,7 @@ class FetchHTML:
         # Iterating over 'results' and unpacking tuples
         for url, src, cat, html in results:
             # Parsing html
-            soup = BeautifulSoup(html, "html.parser")
+            soup = self.parse_one(html, src, kind)
             # Repacking tuple with parsed html and adding to container
             parsed.append((url, src, cat, soup))
             logger.debug(f"Parsed HTML of {url}")
@@ -128,6 +221,21 @@ class FetchHTML:
         return parsed
 
 
+    def parse_one(self, html, src=None, kind=None):
+        """
+        Parses a single HTML document using BS4. Used by `parse` and by the
+        streaming pipeline where pages are parsed one at a time.
+
+        Params:
+            html (str): raw html
+            src (str, optional): the source
+            kind (str, optional): "links" or "contents"
+        Returns:
+            soup (BS4 obj.): parsed html
+        """
+        return parse_html(html, src, kind)
+
+
     def _sort_results(self, results):
         """
         Takes the list of results from `fetch` and separates the successful 
@@ -147,6 +255,9 @@ class FetchHTML:
             # Checking if Exception object and adding to 'self.exceptions'
             if isinstance(result, Exception):
                 self.exceptions.append(result)
+            # Leaving out pages that didn't change, they have no HTML
+            elif result[3] is None:
+                self.not_modified.append(result[0])
             # Adding to container otherwise
             else:
                 success.append(result)
@@ -154,7 +265,7 @@ class FetchHTML:
         return success
 
 
-    async def _process_request(self, request, session):
+    async def _process_request(self, request, session, cache=None):
         """
         Async utility function that unpacks the 3-tuple and calls for a request
         on the URL then repacks the 3-tuple and adds the HTML contents.
@@ -164,47 +275,101 @@ class FetchHTML:
         Params:
             request (tup): 3-tuple (url, src, cat)
             session (obj): session object
+            cache (obj, optional): `HTTPCache` object
         Returns:
             _ (tuple): 4-tuple like (url, src, cat, html)
             """
         # Unpacking tuple
         url, src, cat = request
 
-        # Making request
-        html = await self._request(url, session)
+        # Making request, retrying transient errors
+        html = await self.retry.call(self._request, url, session, cache, src)
 
         # Repacking and returning tuple with HTML
         return (url, src, cat, html)
 
 
-    async def _request(self, url, session):
+    async def _request(self, url, session, cache=None, src="default"):
         """
         Makes the individual requests. It raises an exception for 4xx and 5xx
-        status codes or waits for the HTML contents. 
+        status codes or waits for the HTML contents. With a `cache` the 
+        request is conditional and nothing is returned when the page didn't
+        change. The request waits for a slot of the source's limiter and its
+        response is recorded so the limiter can adapt.
 
         Params:
             url (str): the url
             session (obj): the session object
+            cache (obj, optional): `HTTPCache` object
+            src (str, optional): the source, selects the limiter
         Returns:
-            _ (str): html content or re-raised exception
+            _ (str): html content, None or re-raised exception
         """
         # Initialising header with random user-agent
         headers = {'User-Agent': self._get_random_user_agent()}
 
-        try:
-            # Attempting to connect
-            async with session.get(url, headers=headers) as response:
-                # Raising client and server errors
-                response.raise_for_status()
-                logger.debug(f"Fetched HTML of {url}.")
-                # Waiting for response contents
-                return await response.text()
+        # Adding validators of the cached response
+        if cache:
+            headers.update(cache.headers(url))
+
+        # Rewriting the URL, eg.: to a replay server
+        target = self.rewrite(url) if self.rewrite else url
+
+        # Waiting for a slot of the source's limiter
+        async with self.scheduler.slot(src) as limiter:
+            start = time.monotonic()
+            try:
+                # Attempting to connect
+                async with self.slots, session.get(
+                    target, headers=headers
+                    ) as response:
+                    # Recording response for the limiter
+                    limiter.record(
+                        response.status, time.monotonic() - start,
+                        parse_retry_after(response.headers.get("Retry-After"))
+                        )
+                    # Recording response to the archive
+                    if self.archive:
+                        await self._archive(url, response, start)
+                    # Returning nothing when the page didn't change
+                    if response.status == 304:
+                        logger.debug(f"Not modified {url}.")
+                        return None
+                    # Raising client and server errors
+                    response.raise_for_status()
+                    logger.debug(f"Fetched HTML of {url}.")
+                    # Waiting for response contents
+                    html = await response.text()
+                    # Caching validators
+                    if cache:
+                        cache.store(url, response.headers)
+                    return html
+
+            # Re-raising exception
+            except aiohttp.ClientResponseError as error:
+                # Logging exception
+                logger.error(f"{error.status} {error.message} {url}")
+                raise
+            # Recording connection errors for the limiter
+            except aiohttp.ClientError:
+                limiter.record(None, time.monotonic() - start)
+                raise
+
+
+    async def _archive(self, url, response, start):
+        """
+        Records a response to the archive, with the body of successful ones.
 
-        # Re-raising exception
-        except aiohttp.ClientResponseError as error:
-            # Logging exception
-            logger.error(f"{error.status} {error.message} {url}")
-            raise
+        Params:
+            url (str): the original url
+            response (obj): the response
+            start (float): time the request was sent
+        """
+        body = await response.text() if 200 <= response.status < 300 else None
+        self.archive.record(
+            url, response.status, response.headers, 
+            time.monotonic() - start, body
+            )
 
 
     def _get_random_user_agent(self):
@@ -218,129 +383,65 @@ class FetchHTML:
 
     
 
-class ScrapeLinks:
+class ExtractLinks:
     """
-    Creates a scraper object. The object is responsible for scraping article
-    links from section URLs - for more information about sections, what they do,
-    and how they define the scraping process, read 'config/settings.py'. The 
-    object consists of the main `scrape` method and various utility methods that
-    perform subtasks like retrieving target HTML elements or performing checks.
+    Extracts article links from a single parsed section page. It holds the
+    source specific link selectors and prefixes and nothing else, so it is 
+    cheap to create inside a worker process. `ScrapeLinks` builds on it and 
+    adds the checks against locally stored data. Each link comes with a cheap
+    estimate of its publish date, taken from the URL or from a timestamp next
+    to the link in the section listing, using the rules in 'link_dates'.
+    Given the watermark of the section, read more in 'scraping/watermarks.py',
+    extraction stops where the links of the previous run begin.
 
     Attributes:
-        manager (class obj.): 'DataManager' class object used to load and save
-        data files from disc. The data files are used for checking.
-        articles (list): list of article dictionaries
-        discarded (list): list of previously discarded URLs
         link_selector (dict): a dict. of source: selector pairs
         link_prefix (dict): a dict of source: prefix pairs
+        link_dates (dict): a dict of source: date rule pairs
+        stop_after (int): watermark links in a row that end the extraction
     """
     def __init__(self):
-        """ Initiaises class specific attributes. """
-        self.manager = DataManager()
-        self.articles = self.manager.load()
-        self.discarded = self.manager.load("discarded")
+        """ Initiaises the selectors. """
         self.link_selector = selectors["link_selector"]
         self.link_prefix = selectors["link_prefix"]
+        self.link_dates = link_dates
+        self.stop_after = section_refresh["stop_after"]
 
 
-    def scrape(self, sections):
+    def extract(self, soup, src, url, seen=None):
         """
-        Main scraping method. Takes as argument the list of 4-tuples containing
-        the section URLs and their HTMLs with associated sources and categories; 
-        (url, src, cat, html). It creates an empty list and iterates 
-        over the list of 4-tuples and for each element it:
-        1) attempts to extract the link elements using source specific, static 
-            selectors. If no elements are returned, it logs an error and skips 
-            this URL. Bad selectors can cause this.
-        2) extracts the 'href' attribute from the elements
-        3) combines the 'href' with a source specific prefix to form links
-        4) checks the resulting links against known links.
-            If all the links from this URL are known to be processed the URL
-            is skipped
-        5) we package each link with the source and category in a 3-tuple 
-            and add the 3-tuple to the container list from above.
-        Once all URLs are processed like this, all the links in the populated 
-        container are checked, for identical links, the categories are compared
-        if the categories don't match, the new category as added to the existing
-        link.
+        Extracts the links from a parsed section page. It selects the link 
+        elements, retrieves their 'href' attributes and combines them with the
+        source specific prefix. Returns None when the selector finds nothing.
 
         Params:
-            parsed (list): list of 4-tuples like (url, src, cat, html)
+            soup (BS4 obj.): parsed section HTML
+            src (str): the source
+            url (str): the section URL
+            seen (set, optional): watermark links of the section
         Returns:
-            checked_links (list): list of 3-tuples like (url, src, cat)
+            links (list): list of 2-tuples (link, published) or None, 
+                'published' is the estimated publish date or None
         """
-        # Initialising empty container
-        new_links = []
-        logger.debug(f"Scraping {len(sections)} URLs")
-
-        # Iterating over list of 4-tuples
-        for url, src, cat, soup in sections:
-
-            # scraping HTML elements
-            elements = self._getelements(soup, src, url)
-            if not elements:
-                continue
-
-            # Extracing 'href' attributes
-            hrefs = self._gethrefs(elements, src)
-
-            # Constructing links
-            links = self._construct_links(hrefs, src)
-
-            # Checking against known links
-            links = self._check_processed(links)
-            if not links:
-                logger.debug(f"No new links from {url} check ScrapeLinks")
-                continue
-
-            # Packing links in 3-tuples
-            links = [(link, src, cat) for link in links]
-
-            # Extend container list with list of 3-tuples.
-            new_links.extend(links)
-            logger.debug(f"Scraped {len(links)} new links from {url}")
-
-        # Check for multi-category links
-        checked_links = self._check_category(new_links)
-
-        return checked_links
+        # scraping HTML elements
+        elements = self._getelements(soup, src, url)
+        if not elements:
+            return None
 
+        # Stopping at the watermark
+        if seen:
+            elements = self._until_seen(elements, src, url, seen)
 
-    def _check_category(self, links):
-        """ 
-        Takes a list of 3-tuples. It iterates over the list and keeps track of 
-        each link in a dict. Each new link is compared to the dictionary,
-        if an identical link is found, the link's categories are compared, if 
-        they are different the category of the second link is added to the 
-        category of the first link and the second link is discarded.
-        A list of 3-tuples is returned in the form (url, src, [cats])
+        # Extracing 'href' attributes
+        hrefs = self._gethrefs(elements, src)
 
-        Params:
-            links (list): list of 3-tuples like (url, src, cat)
-        Returns:
-            _ (list): list of 3-tuples like (url, src, [cat])
-        """
-        # Initialising temporary dict
-        temp = {}
+        # Constructing links
+        links = self._construct_links(hrefs, src)
 
-        # Iterating over 3-tuples
-        for link, src, cat in links:
-            # Checking for identical links with different categories
-            if link in temp and cat not in temp[link]["cats"]:
-                # Extending first link's category list
-                temp[link]["cats"].append(cat)
-                logger.debug(f"Added category {link}")
-            # Checking if a link is duplicated
-            elif link in temp and cat in temp[link]["cats"]:
-                logger.debug(f"Duplicate {link}")
-                continue
-            # Addign new links to temporary dict.
-            elif link not in temp:
-                temp[link] = {"src": src, "cats": [cat]}
+        # Estimating publish dates
+        dates = self._estimate_dates(elements, src)
 
-        return [
-        (link, info['src'], info['cats']) for link, info in temp.items()
-        ]
+        return [(link, dates.get(href)) for link, href in zip(links, hrefs)]
 
 
     def _getelements(self, soup, src, url):
@@ -369,6 +470,39 @@ class ScrapeLinks:
         logger.error(f"Link Selector is broken {src} {selector} {url}")
 
 
+    def _until_seen(self, elements, src, url, seen):
+        """
+        Cuts the elements after the first 'stop_after' links in a row that
+        are in the watermark, in document order. Everything below them was
+        listed on the previous run. A single known link isn't enough, pinned
+        stories stay at the top of a section while new ones appear below.
+
+        Params:
+            elements (BS4 obj.): HTML elements
+            src (str): the source, used to index the prefix
+            url (str): the section URL, used for logging
+            seen (set): watermark links of the section
+        Returns:
+            _ (list): the elements up to the watermark
+        """
+        # Initialising prefix and counter
+        prefix = self.link_prefix[src]
+        run = 0
+
+        # Counting watermark links in a row
+        for position, element in enumerate(elements):
+            href = element.get("href")
+            if not href:
+                continue
+            run = run + 1 if urljoin(prefix, href) in seen else 0
+            if run == self.stop_after:
+                logger.debug(f"Stopped at the watermark after {position + 1} "
+                    f"of {len(elements)} elements {url}")
+                return elements[:position + 1]
+
+        return elements
+
+
     def _gethrefs(self, elements, src):
         """
         Retrieves the 'href' attributes from the list of HTML elements. 
@@ -411,6 +545,93 @@ class ScrapeLinks:
         return [urljoin(prefix, href) for href in hrefs]
 
 
+    def _estimate_dates(self, elements, src):
+        """
+        Estimates the publish date of each link element with the source's 
+        rule in 'link_dates'. The date in the URL is used first, then the 
+        timestamp in the listing. Links without an estimate are left out.
+
+        Params:
+            elements (BS4 obj.): HTML elements
+            src (str): the source
+        Returns:
+            dates (dict): dict of href: datetime pairs
+        """
+        # Initialising empty container
+        dates = {}
+
+        # Indexing rule
+        rule = self.link_dates.get(src)
+        if not rule:
+            return dates
+
+        # Iterating over elements with 'href' attributes
+        for element in elements:
+            href = element.get("href")
+            if not href:
+                continue
+            date = (
+                self._date_from_url(href, rule) 
+                or self._date_from_listing(element, rule)
+                )
+            if date:
+                dates[href] = date
+
+        return dates
+
+
+    def _date_from_url(self, href, rule):
+        """
+        Reads the date in a URL like '/2024/03/25/', the start of that day in
+        UTC is returned.
+
+        Params:
+            href (str): the href
+            rule (dict): the source's rule
+        Returns:
+            _ (datetime): or None
+        """
+        if "url_pattern" not in rule:
+            return None
+        match = re.search(rule["url_pattern"], href)
+        if not match:
+            return None
+        try:
+            return datetime(*map(int, match.groups()), tzinfo=tz.tzutc())
+        except ValueError:
+            return None
+
+
+    def _date_from_listing(self, element, rule):
+        """
+        Reads the timestamp, in milliseconds, shown next to the link in the 
+        section listing.
+
+        Params:
+            element (BS4 obj.): the link element
+            rule (dict): the source's rule
+        Returns:
+            _ (datetime): or None
+        """
+        if "container" not in rule:
+            return None
+
+        # Finding the listing item of the link and its timestamp
+        container = element.css.closest(rule["container"])
+        if not container:
+            return None
+        timestamp = container.select_one(rule["timestamp_selector"])
+        if not timestamp:
+            return None
+
+        # Converting timestamp
+        try:
+            milliseconds = int(timestamp.get(rule["timestamp_attr"]))
+            return datetime.fromtimestamp(milliseconds / 1000, tz.tzutc())
+        except (TypeError, ValueError, OverflowError, OSError):
+            return None
+
+
     def _check_nyt_notarticle(self, hrefs):
         """
         Checks `hrefs` for particular terms to filter out non-articles when
@@ -429,37 +650,268 @@ class ScrapeLinks:
         ]
 
 
+class ScrapeLinks(ExtractLinks):
+    """
+    Creates a scraper object. The object is responsible for scraping article
+    links from section URLs - for more information about sections, what they do,
+    and how they define the scraping process, read 'config/settings.py'. The 
+    object consists of the main `scrape` method and various utility methods that
+    perform subtasks like retrieving target HTML elements or performing checks.
+    The extraction itself is inherited from `ExtractLinks`.
+
+    Attributes:
+        index (obj): `URLIndex` object with the URLs processed before, read 
+        more in 'data_manager/index.py', links with a stale publish date
+        estimate are added to it without being fetched
+        watermarks (obj): `SectionWatermarks` object or None, extraction 
+        stops at each section's watermark and moves it, read more in
+        'scraping/watermarks.py'
+        link_selector (dict): a dict. of source: selector pairs
+        link_prefix (dict): a dict of source: prefix pairs
+        link_dates (dict): a dict of source: date rule pairs
+        stop_after (int): watermark links in a row that end the extraction
+    """
+    def __init__(self, watermarks=None):
+        """ 
+        Initiaises class specific attributes.
+
+        Params:
+            watermarks (obj, optional): `SectionWatermarks` object, default is
+                extracting every link of every section
+        """
+        super().__init__()
+        self.index = URLIndex()
+        self.watermarks = watermarks
+
+
+    def scrape(self, sections):
+        """
+        Main scraping method. Takes as argument the list of 4-tuples containing
+        the section URLs and their HTMLs with associated sources and categories; 
+        (url, src, cat, html). It creates an empty list and iterates 
+        over the list of 4-tuples and for each element it:
+        1) attempts to extract the link elements using source specific, static 
+            selectors. If no elements are returned, it logs an error and skips 
+            this URL. Bad selectors can cause this. With watermarks the
+            elements below the links seen on the previous run are dropped.
+        2) extracts the 'href' attribute from the elements
+        3) combines the 'href' with a source specific prefix to form links
+        4) checks the resulting links against known links.
+            If all the links from this URL are known to be processed the URL
+            is skipped
+        5) discards links whose estimated publish date is clearly older than
+            24hrs, they are never fetched
+        6) we package each link with the source and category in a 3-tuple 
+            and add the 3-tuple to the container list from above.
+        Once all URLs are processed like this, all the links in the populated 
+        container are checked, for identical links, the categories are compared
+        if the categories don't match, the new category as added to the existing
+        link.
+
+        Params:
+            parsed (list): list of 4-tuples like (url, src, cat, html)
+        Returns:
+            checked_links (list): list of 3-tuples like (url, src, cat)
+        """
+        # Initialising empty container
+        new_links = []
+        logger.debug(f"Scraping {len(sections)} URLs")
+
+        # Iterating over list of 4-tuples
+        for url, src, cat, soup in sections:
+
+            # Extracting links up to the watermark
+            links = self.extract(soup, src, url, self._seen(url))
+
+            # Checking and packing links in 3-tuples
+            packed = self._package_links(links, url, src, cat)
+            new_links.extend(packed)
+
+            # Moving the watermark
+            if self.watermarks:
+                self.watermarks.update(url, links, len(packed))
+
+        # Saving stale links
+        self.index.flush()
+
+        # Check for multi-category links
+        checked_links = self._check_category(new_links)
+
+        return checked_links
+
+
+    def scrape_parallel(self, sections, executor):
+        """
+        Same as `scrape` but takes the raw, unparsed HTML; (url, src, cat, html)
+        and hands the parsing and extraction to the worker processes of 
+        `executor`. Only the extracted links travel back from the workers, the 
+        checks against known links are done here.
+
+        Params:
+            sections (list): list of 4-tuples like (url, src, cat, html)
+            executor (obj): `concurrent.futures.ProcessPoolExecutor` object
+        Returns:
+            checked_links (list): list of 3-tuples like (url, src, [cat])
+        """
+        # Initialising empty container
+        new_links = []
+        logger.debug(f"Scraping {len(sections)} URLs in worker processes")
+
+        # Iterating over results of the workers in submission order
+        seen = [self._seen(section[0]) for section in sections]
+        for url, src, cat, links in executor.map(
+            extract_links, sections, seen
+            ):
+
+            # Checking and packing links in 3-tuples
+            packed = self._package_links(links, url, src, cat)
+            new_links.extend(packed)
+
+            # Moving the watermark
+            if self.watermarks:
+                self.watermarks.update(url, links, len(packed))
+
+        # Saving stale links
+        self.index.flush()
+
+        # Check for multi-category links
+        checked_links = self._check_category(new_links)
+
+        return checked_links
+
+
+    def _seen(self, url):
+        """ The watermark links of a section, None without watermarks. """
+        return self.watermarks.seen(url) if self.watermarks else None
+
+
+    def _package_links(self, links, url, src, cat):
+        """
+        Checks the links extracted from a section against known links, 
+        discards the stale ones and packs the rest with the source and 
+        category in 3-tuples.
+
+        Params:
+            links (list): list of 2-tuples (link, published) or None
+            url (str): the section URL, used for logging
+            src (str): the source
+            cat (str): the category
+        Returns:
+            _ (list): list of 3-tuples like (url, src, cat)
+        """
+        # Skipping sections where the selector is broken
+        if not links:
+            return []
+
+        # Checking against known links
+        links = self._check_processed(links)
+        if not links:
+            logger.debug(f"No new links from {url} check ScrapeLinks")
+            return []
+
+        # Discarding links with a stale publish date estimate
+        links = self._check_stale(links, src)
+
+        # Packing links in 3-tuples
+        links = [(link, src, cat) for link in links]
+        logger.debug(f"Scraped {len(links)} new links from {url}")
+
+        return links
+
+
+    def _check_category(self, links):
+        """ 
+        Takes a list of 3-tuples. It iterates over the list and keeps track of 
+        each link in a dict. Each new link is compared to the dictionary,
+        if an identical link is found, the link's categories are compared, if 
+        they are different the category of the second link is added to the 
+        category of the first link and the second link is discarded.
+        A list of 3-tuples is returned in the form (url, src, [cats])
+
+        Params:
+            links (list): list of 3-tuples like (url, src, cat)
+        Returns:
+            _ (list): list of 3-tuples like (url, src, [cat])
+        """
+        # Initialising temporary dict
+        temp = {}
+
+        # Iterating over 3-tuples
+        for link, src, cat in links:
+            # Checking for identical links with different categories
+            if link in temp and cat not in temp[link]["cats"]:
+                # Extending first link's category list
+                temp[link]["cats"].append(cat)
+                logger.debug(f"Added category {link}")
+            # Checking if a link is duplicated
+            elif link in temp and cat in temp[link]["cats"]:
+                logger.debug(f"Duplicate {link}")
+                continue
+            # Addign new links to temporary dict.
+            elif link not in temp:
+                temp[link] = {"src": src, "cats": [cat]}
+
+        return [
+        (link, info['src'], info['cats']) for link, info in temp.items()
+        ]
+
+
     def _check_processed(self, links):
         """
         Takes a list of links and compares them to links that are known to have
         been processed before (either scraped or discarded for various reasons).
-        Returns a list of filtered links.
+        Returns a list of filtered links. On the first run the index is empty
+        and the links are returned as they are.
 
         Params:
-            links (list): list of links
+            links (list): list of 2-tuples (link, published)
         Returns:
-            links (list): list of links
+            links (list): list of 2-tuples (link, published)
         """
-        # Validates existing data
-        if self.articles and self.discarded:
+        # Filtering links
+        filtered = [
+            (link, published) for link, published in links 
+            if link not in self.index
+            ]
+        logger.debug(f"Filtered {len(links)-len(filtered)} links from "
+            f"{len(links)}."
+        )
 
-            # scraping links from scraped articles
-            processed = [article["url"] for article in self.articles]
+        return filtered
 
-            # Filtering links
-            filtered = [link for link in links if 
-            link not in processed and link not in self.discarded
-            ]
-            logger.debug(f"Filtered {len(links)-len(filtered)} links from "
-                f"{len(links)}."
-            )
 
-            return filtered
+    def _check_stale(self, links, src):
+        """
+        Discards the links whose estimated publish date, plus the rule's 
+        'slack_hours', is older than 24hrs. Links without an estimate are kept
+        and checked after fetching like before.
 
-        # Returning links as they are when no prior data exists, usually on 
-        # first run.
-        else:
-            return links
+        Params:
+            links (list): list of 2-tuples (link, published)
+            src (str): the source
+        Returns:
+            fresh (list): list of links
+        """
+        # Initialising empty container and slack
+        fresh = []
+        slack = timedelta(hours=self.link_dates.get(src, {}).get(
+            "slack_hours", 0
+            ))
+
+        # Discarding stale links
+        for link, published in links:
+            if published and isoutdated(published + slack):
+                self.index.add(link)
+                logger.debug(f"Discarded {link} by its date estimate")
+            else:
+                fresh.append(link)
+
+        # Logging results
+        if len(fresh) < len(links):
+            logger.info(f"Discarded {len(links)-len(fresh)} stale {src} links "
+                f"without fetching")
+
+        return fresh
 
 
     def count_newlinks(self, new_links):
@@ -480,98 +932,125 @@ class ScrapeLinks:
         [logger.info(f"{v, c}") for v, c in counter.items()]
 
 
-class ScrapeContents:
+class ExtractContents:
     """
-    Class responsible for scraping article contents from article links. 
-    Similarly to `ScrapeLinks`, the main method is `scrape` which utilises a 
-    collection of utility methods to extract and validate article contents. 
-    `scrape` returns a list of dictionaries, where each dictionary is an 
-    article. 
+    Extracts the contents of a single parsed article page. It holds the source
+    specific header and text selectors and nothing else, so it is cheap to 
+    create inside a worker process. `ScrapeContents` builds on it and adds the
+    bookkeeping of discarded URLs.
 
     Attributes:
-        manager (class obj): DataManager object, used for managing discarded 
-        links
-        discarded (list): lost of links loaded form disc
         header_selector (dict): dict of source: selector pairs
         text_selector (dict): dict of source: selector pairs
     """
     def __init__(self):
-        """ Init method initialises class attributes. """
-        self.manager = DataManager()
-        self.discarded = self.manager.load("discarded")
+        """ Init method initialises the selectors. """
         self.header_selector = selectors["header_selector"]
         self.text_selector = selectors["text_selector"]
 
 
-    def scrape(self, parsed):
+    def extract(self, url, src, cat, soup, header_contents=None):
         """
-        Main scraping method. Takes as argement a list of 4-tuples like 
-        (url, src, cat, html) and returns a list of article dictionaries.
-        Creates an empty container list then it
-        iterates over the list of 4-tuples, for each elements it unpacks the
-        tuple and:
-        1) extracts and validates the header, if None; discard and skip
-        2) retrieves dates, headline and description from header, if None; 
-            discard and skip
-        3) validates date, if article older than 24hrs, discard and skip
-        4) extract body, if None, discard and skip
-        5) build article dictionary and add to container list
-        Once finished, the list of discarded URLs is saved and the container
-        list is returned.
+        Extracts and validates an article from a parsed page, the steps are 
+        described in `ScrapeContents.scrape`. It has no side effects, instead
+        of discarding the URL it returns the reason it failed.
+
+        Params:
+            url (str): the url
+            src (str): the source
+            cat (list): the categories
+            soup (BS4 obj.): parsed html
+            header_contents (tuple, optional): header contents already read
+                by `screen`, the header isn't scraped again
+        Returns:
+            _ (tuple): 2-tuple (article, None) or (None, reason)
         """
-        logger.debug(f"Scraping {len(parsed)} URLs")
-        # Initialising empty container
-        articles = []
+        # Scraping and validating header
+        if header_contents is None:
+            header = self._getheader(soup, src, url)
+            header_contents, reason = self._check_header(header, url)
+            if reason:
+                return None, reason
+
+        # Unpacking header contents
+        pub, mod, hline, desc = header_contents
+
+        # Scraping body
+        body = self._getbody(soup, src, url)
+        # Validating body
+        if not body:
+            return None, "body"
+
+        # Building article
+        article = self._buildarticle(
+            url, src, cat, pub, mod, hline, desc, body
+            )
+        logger.debug(f"Scraped article from {url}")
 
-        # Iterating over list of 4-tuples
-        for url, src, cat, soup in parsed:
+        return article, None
 
-            # Scraping header 
-            header = self._getheader(soup, src, url)
-            # Validating header
-            if not header or self._check_notarticle(header, url):
-                self._discard(url)
-                continue
 
-            # Retrieving header contents
-            header_contents = self._getheader_contents(header, url)
-            # Validating header contents
-            if not header_contents:
-                self._discard(url)
-                continue
-            # Unpacking header contents
-            pub, mod, hline, desc = header_contents
+    def extract_html(self, url, src, cat, html):
+        """
+        Extracts and validates an article from the raw HTML of a page. The 
+        header is read from the raw HTML first, pages that fail its checks 
+        (outdated, videos, not articles) are dropped without being parsed and 
+        for the rest only the body is parsed. When the header can't be read 
+        from the raw HTML the full page is parsed as before.
 
-            # Checking date
-            if isoutdated(pub):
-                self._discard(url)
-                logger.debug(f"Outdated {url}")
-                continue
+        Params:
+            url (str): the url
+            src (str): the source
+            cat (list): the categories
+            html (str): raw html
+        Returns:
+            _ (tuple): 2-tuple (article, None) or (None, reason)
+        """
+        # Screening the raw HTML
+        header_contents, reason = self.screen(url, html)
+        if reason:
+            return None, reason
 
-            # Scraping body
-            body = self._getbody(soup, src, url)
-            # Validating body
-            if not body:
-                self._discard(url)
-                continue
+        # Parsing the body, or the full page when the header is unknown
+        kind = "body" if header_contents else "contents"
+        soup = parse_html(html, src, kind)
+        article, reason = self.extract(url, src, cat, soup, header_contents)
 
-            # Building article
-            article = self._buildarticle(
-                url, src, cat, pub, mod, hline, desc, body
-                )
-            # Adding article to container
-            articles.append(article)
-            logger.debug(f"Scraped article from {url}")
+        # Releasing parsed tree
+        soup.decompose()
 
-        # Saving discarded URLs
-        self.manager.save(self.discarded, "discarded")
+        return article, reason
 
-        # Logging results
-        logger.info(f"Scraped {len(articles)} new articles from {len(parsed)} "
-            f"links")
 
-        return articles
-    
+    def screen(self, url, html):
+        """
+        Reads the JSON-LD header straight from the raw HTML and validates it
+        like `extract` does. Returns (None, None) when the header can't be 
+        read this way or 'header_prefilter' is off, the page is then fully 
+        parsed.
+
+        Params:
+            url (str): the url
+            html (str): raw html
+        Returns:
+            _ (tuple): 2-tuple (header_contents, None), (None, reason) or 
+                (None, None)
+        """
+        # Checking settings
+        if not header_prefilter:
+            return None, None
+
+        # Reading header
+        header = extract_ld_json(html)
+        if header is None:
+            return None, None
+
+        # Validating header
+        header_contents, reason = self._check_header(header, url)
+        if reason:
+            logger.debug(f"Dropped {url} before parsing: {reason}")
+        return header_contents, reason
+
 
     def _getheader(self, soup, src, url):
         """
@@ -609,7 +1088,7 @@ class ScrapeContents:
             header = json.loads(string)
 
         # Logging error, nothing is returned
-        except JSONDecodeError as error:
+        except json.JSONDecodeError as error:
             logger.error(f"Header is not in JSON format: {error}")
             return None
 
@@ -621,6 +1100,34 @@ class ScrapeContents:
         return header
 
 
+    def _check_header(self, header, url):
+        """
+        Validates the header and its contents and checks the date.
+
+        Params:
+            header (dict): the scraped header or None
+            url (str): the url
+        Returns:
+            _ (tuple): 2-tuple (header_contents, None) or (None, reason)
+        """
+        # Validating header
+        if not header or self._check_notarticle(header, url):
+            return None, "header"
+
+        # Retrieving header contents
+        header_contents = self._getheader_contents(header, url)
+        # Validating header contents
+        if not header_contents:
+            return None, "header contents"
+
+        # Checking date
+        if isoutdated(header_contents[0]):
+            logger.debug(f"Outdated {url}")
+            return None, "outdated"
+
+        return header_contents, None
+
+
     def _getheader_contents(self, header, url):
         """
         Method responsible for retrieving dates, the headline and the 
@@ -650,7 +1157,7 @@ class ScrapeContents:
                 f"Header key {error} is broken or not an article: {url}"
                 )
             return None
-    
+
 
     def _getbody(self, soup, src, url):
         """
@@ -698,7 +1205,7 @@ class ScrapeContents:
         logger.debug(f"Scraped body of {url}.")
 
         return body
-        
+
 
     def _parse_datetime(self, string):
         """
@@ -751,12 +1258,236 @@ class ScrapeContents:
         }
 
 
+class ScrapeContents(ExtractContents):
+    """
+    Class responsible for scraping article contents from article links. 
+    Similarly to `ScrapeLinks`, the main method is `scrape` which utilises a 
+    collection of utility methods to extract and validate article contents. 
+    `scrape` returns a list of dictionaries, where each dictionary is an 
+    article. The extraction itself is inherited from `ExtractContents`.
+
+    Attributes:
+        index (obj): `URLIndex` object, discarded URLs are added to it
+        header_selector (dict): dict of source: selector pairs
+        text_selector (dict): dict of source: selector pairs
+    """
+    def __init__(self):
+        """ Init method initialises class attributes. """
+        super().__init__()
+        self.index = URLIndex()
+
+
+    def scrape(self, parsed):
+        """
+        Main scraping method. Takes as argement a list of 4-tuples like 
+        (url, src, cat, html) and returns a list of article dictionaries.
+        Creates an empty container list then it
+        iterates over the list of 4-tuples, for each elements it unpacks the
+        tuple and:
+        1) extracts and validates the header, if None; discard and skip
+        2) retrieves dates, headline and description from header, if None; 
+            discard and skip
+        3) validates date, if article older than 24hrs, discard and skip
+        4) extract body, if None, discard and skip
+        5) build article dictionary and add to container list
+        Once finished, the discarded URLs are saved and the container
+        list is returned.
+        """
+        logger.debug(f"Scraping {len(parsed)} URLs")
+        # Initialising empty container
+        articles = []
+
+        # Iterating over list of 4-tuples
+        for url, src, cat, soup in parsed:
+
+            # Scraping article
+            article = self._scrape_article(url, src, cat, soup)
+            # Adding article to container
+            if article:
+                articles.append(article)
+
+        # Saving discarded URLs
+        self.index.flush()
+
+        # Logging results
+        logger.info(f"Scraped {len(articles)} new articles from {len(parsed)} "
+            f"links")
+
+        return articles
+
+
+    def scrape_parallel(self, parsed, executor):
+        """
+        Same as `scrape` but takes the raw, unparsed HTML; (url, src, cat, html)
+        and hands the parsing and extraction to the worker processes of 
+        `executor`. Only the article dictionaries or the discard reasons travel
+        back from the workers.
+
+        Params:
+            parsed (list): list of 4-tuples like (url, src, cat, html)
+            executor (obj): `concurrent.futures.ProcessPoolExecutor` object
+        Returns:
+            articles (list): list of article dictionaries
+        """
+        logger.debug(f"Scraping {len(parsed)} URLs in worker processes")
+        # Initialising empty container
+        articles = []
+
+        # Iterating over results of the workers in submission order
+        for url, article, reason in executor.map(extract_article, parsed):
+            if self._collect(url, article, reason):
+                articles.append(article)
+
+        # Saving discarded URLs
+        self.index.flush()
+
+        # Logging results
+        logger.info(f"Scraped {len(articles)} new articles from {len(parsed)} "
+            f"links")
+
+        return articles
+
+
+    async def scrape_stream(self, fetch, requests, executor=None):
+        """
+        Streaming alternative to `fetch` -> `parse` -> `scrape`. Takes the 
+        `FetchHTML` object and the list of 3-tuples (url, src, cat) to fetch.
+        Each page is screened, parsed and scraped as soon as its response 
+        arrives, then its parsed tree is released. Only the resulting article
+        dictionaries are kept, so memory no longer grows with the number of
+        pages and the run time depends on throughput rather than on the
+        slowest URL.
+        When an `executor` is given, the raw HTML is handed to its worker 
+        processes instead and parsed there while the next responses arrive.
+
+        Params:
+            fetch (obj): `FetchHTML` object
+            requests (list): list of 3-tuples (url, src, cat)
+            executor (obj, optional): `ProcessPoolExecutor` object
+        Returns:
+            articles (list): list of article dictionaries
+        """
+        logger.debug(f"Streaming {len(requests)} URLs")
+        # Initialising empty containers and counter
+        articles = []
+        pending = []
+        counter = 0
+        loop = asyncio.get_running_loop()
+
+        # Iterating over responses as they arrive
+        async for url, src, cat, html in fetch.stream(requests):
+            counter += 1
+
+            # Handing the HTML to a worker process
+            if executor:
+                pending.append(loop.run_in_executor(
+                    executor, extract_article, (url, src, cat, html)
+                    ))
+                continue
+
+            # Screening, parsing and scraping article
+            article, reason = self.extract_html(url, src, cat, html)
+
+            # Adding article to container
+            if self._collect(url, article, reason):
+                articles.append(article)
+
+        # Collecting the results of the worker processes
+        for url, article, reason in await asyncio.gather(*pending):
+            if self._collect(url, article, reason):
+                articles.append(article)
+
+        # Saving discarded URLs
+        self.index.flush()
+
+        # Logging results
+        logger.info(f"Scraped {len(articles)} new articles from {counter} "
+            f"streamed links")
+
+        return articles
+
+
+    def _scrape_article(self, url, src, cat, soup):
+        """
+        Scrapes a single parsed article page, the steps are described in 
+        `scrape`. URLs that fail any of the checks are discarded.
+
+        Params:
+            url (str): the url
+            src (str): the source
+            cat (list): the categories
+            soup (BS4 obj.): parsed html
+        Returns:
+            article (dict): or None
+        """
+        # Extracting article
+        article, reason = self.extract(url, src, cat, soup)
+
+        # Discarding failed articles
+        if self._collect(url, article, reason):
+            return article
+
+
+    def _collect(self, url, article, reason):
+        """
+        Handles the result of an extraction. Discards the URL when the 
+        extraction failed.
+
+        Params:
+            url (str): the url
+            article (dict): the article or None
+            reason (str): why the extraction failed or None
+        Returns:
+            _ (bool): True if the article is kept
+        """
+        if article is None:
+            self._discard(url)
+            logger.debug(f"Discarded {url}, failed check: {reason}")
+            return False
+        return True
+
+
     def _discard(self, url):
         """
-        Stores URL in 'discarded'.
+        Stores URL in the index of processed URLs.
 
         Params:
             url (str):
         """
-        self.discarded.append(url)
-        logger.info(f"Discarded {url}")
\ No newline at end of file
+        self.index.add(url)
+        logger.info(f"Discarded {url}")
+
+
+def extract_links(section, seen=None):
+    """
+    Worker function for `ScrapeLinks.scrape_parallel`. Parses a section page
+    and extracts its links in a worker process.
+
+    Params:
+        section (tuple): 4-tuple (url, src, cat, html)
+        seen (set, optional): watermark links of the section
+    Returns:
+        _ (tuple): 4-tuple (url, src, cat, links), links are 2-tuples 
+            (link, published)
+    """
+    url, src, cat, html = section
+    soup = parse_html(html, src, "links")
+    links = ExtractLinks().extract(soup, src, url, seen)
+    soup.decompose()
+    return (url, src, cat, links)
+
+
+def extract_article(page):
+    """
+    Worker function for `ScrapeContents.scrape_parallel` and 
+    `ScrapeContents.scrape_stream`. Screens and parses an article page and
+    extracts the article in a worker process.
+
+    Params:
+        page (tuple): 4-tuple (url, src, cat, html)
+    Returns:
+        _ (tuple): 3-tuple (url, article, reason), see `ExtractContents.extract`
+    """
+    url, src, cat, html = page
+    article, reason = ExtractContents().extract_html(url, src, cat, html)
+    return (url, article, reason)
@@ -0,0 +1,153 @@
+import json
+import time
+import logging
+from pathlib import Path
+
+from data_manager.atomic import dump_json
+from config.settings import section_refresh
+
+# Per section watermarks for incremental crawling of section pages. Sections
+# list their newest articles first, so once the links seen on the previous run
+# show up again everything below them was seen too. For each section the newest
+# links and the newest publish date estimate are stored in
+# 'data/section_state.json', `ExtractLinks` stops at the watermark instead of
+# extracting and checking the whole page. The state also keeps a refresh
+# interval per section, shortened when the section had new links and
+# lengthened when it didn't, so sections that rarely change are polled less
+# often. Read more in 'scraping/scrape.py'.
+
+logger = logging.getLogger(__name__)
+
+
+class SectionWatermarks:
+    """
+    Keeps the watermark and refresh interval of each section.
+
+    Attributes:
+        settings (dict): 'section_refresh' from 'config/settings.py'
+        path (Path): location of the state
+        state (dict): {url: {"links", "published", "checked", "changed",
+            "interval"}}, 'checked' and 'changed' are seconds since the epoch
+    """
+    def __init__(self, settings=section_refresh):
+        """
+        Initialise the settings and load the state.
+
+        Params:
+            settings (dict, optional): default is 'section_refresh'
+        """
+        self.settings = settings
+        base_dir = Path(__file__).resolve().parent.parent
+        self.path = base_dir / "data" / "section_state.json"
+        self.state = self._load_state()
+
+
+    def due(self, sections):
+        """
+        Keeps the sections whose refresh interval has passed since they were
+        last checked. Sections without a state are always due.
+
+        Params:
+            sections (list): list of 3-tuples (url, src, cat)
+        Returns:
+            due (list): list of 3-tuples (url, src, cat)
+        """
+        now = time.time()
+        due = [
+            section for section in sections
+            if section[0] not in self.state
+            or now - self.state[section[0]]["checked"]
+            >= self.state[section[0]]["interval"]
+            ]
+        logger.info(f"{len(due)} of {len(sections)} sections are due")
+        return due
+
+
+    def seen(self, url):
+        """ The watermark links of a section, empty if it has none. """
+        return set(self.state.get(url, {}).get("links", []))
+
+
+    def update(self, url, links, new):
+        """
+        Moves the watermark of a section to the top of its extracted links and
+        adapts its refresh interval.
+
+        Params:
+            url (str): the section URL
+            links (list): list of 2-tuples (link, published) in document order
+                or None when the selector is broken
+            new (int): number of links that passed the checks
+        """
+        # Leaving the state of broken sections alone
+        if not links:
+            return
+
+        # Initialising state of new sections
+        now = time.time()
+        entry = self.state.setdefault(url, {
+            "links": [], "published": None, "changed": now,
+            "interval": self.settings["min_interval"]
+            })
+
+        # Moving the watermark
+        top = [link for link, _ in links] + entry["links"]
+        entry["links"] = list(dict.fromkeys(top))[:self.settings["depth"]]
+        dates = [published for _, published in links if published]
+        if dates:
+            newest = max(dates).isoformat()
+            entry["published"] = max(newest, entry["published"] or newest)
+
+        # Adapting the interval
+        if new:
+            entry["changed"] = now
+            self._adapt(url, self.settings["decrease"])
+        else:
+            self._adapt(url, self.settings["increase"])
+        entry["checked"] = now
+
+
+    def unchanged(self, urls):
+        """
+        Records sections answered with '304 Not Modified', their interval is
+        lengthened like for sections without new links.
+
+        Params:
+            urls (list): list of section URLs
+        """
+        now = time.time()
+        for url in urls:
+            if url in self.state:
+                self._adapt(url, self.settings["increase"])
+                self.state[url]["checked"] = now
+
+
+    def save(self):
+        """
+        Saves the state. Called once the new links were scraped, so a crashed
+        run doesn't stop at a watermark above links that were never scraped.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        dump_json(self.state, self.path, indent=4)
+        logger.debug(f"Saved watermarks of {len(self.state)} sections")
+
+
+    def _adapt(self, url, factor):
+        """ Multiplies the interval of a section, within its bounds. """
+        entry = self.state[url]
+        entry["interval"] = min(
+            self.settings["max_interval"],
+            max(self.settings["min_interval"], entry["interval"] * factor)
+            )
+
+
+    def _load_state(self):
+        """ Loads the state, empty if missing or corrupt. """
+        if not self.path.exists():
+            return {}
+        try:
+            with self.path.open("r") as file:
+                return json.load(file)
+        except json.JSONDecodeError as error:
+            logger.error(f"Decoder error while loading {self.path}: {error}")
+            return {}
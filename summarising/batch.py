@@ -0,0 +1,231 @@
+import json
+import time
+import asyncio
+import logging
+from pathlib import Path
+
+import aiohttp
+
+from summarising.summarise import PostJSON
+from config.settings import openai_base_url, batch_mode
+
+# Batch mode for the OpenAI requests. Instead of one 'POST' per summary the
+# submissions are written to a JSON lines file, uploaded and submitted as one
+# batch job that OpenAI answers within the completion window at a lower price.
+# The job is polled until it's done and the results are matched back to their
+# articles or groups, so `PostBatch.post` returns the same 2-tuples as
+# `PostJSON.post` and the responses go through `Summary.process_response` and
+# `Merge.process_responses` unchanged. Meant for the daemon where nobody waits
+# for the answers, read more in 'newsai_daemon.py'. A job can take up to
+# 'timeout' seconds and a run sends several jobs one after another, so a run in
+# batch mode can last days at worst. The pipeline lock is held all along, read
+# more in 'pipeline/lock.py'. The batch files are kept in 'data/batches'.
+# 'summarising/stub.py' implements the endpoints locally.
+
+logger = logging.getLogger(__name__)
+
+
+class PostBatch(PostJSON):
+    """
+    Sends submissions as a batch job. Shares the session, auth. header and
+    retry policy with `PostJSON`, the limiter isn't used as batch jobs have
+    their own limits.
+
+    Attributes:
+        base_url (str): base URL of the API
+        poll_interval (float): seconds between polls of the job
+        timeout (float): seconds after which the job is given up
+        completion_window (str): time OpenAI has to complete the job
+        directory (Path): location of the batch files
+        exceptions (list): list of exceptions and failed requests
+        retry (obj): `RetryPolicy` object, shared by all requests of the run
+        client (obj): `HTTPClient` object holding the shared session
+        headers (dict): headers with the auth. key
+    """
+    def __init__(self, base_url=openai_base_url, settings=batch_mode,
+        client=None):
+        """
+        Initialise the API location and the polling.
+
+        Params:
+            base_url (str, optional): default is 'openai_base_url'
+            settings (dict, optional): default is 'batch_mode'
+            client (obj, optional): default is the client of the shared runtime
+        """
+        super().__init__(client=client)
+        self.base_url = base_url
+        self.poll_interval = settings["poll_interval"]
+        self.timeout = settings["timeout"]
+        self.completion_window = settings["completion_window"]
+        base_dir = Path(__file__).resolve().parent.parent
+        self.directory = base_dir / "data" / "batches"
+
+
+    async def post(self, submissions):
+        """
+        Main method, submits the batch job, waits for it and collects the
+        results. Returns nothing when the job fails or times out, the reason
+        is stored in 'exceptions'.
+
+        Params:
+            submissions (list): list of 2-tuples (submissionfile, item), item
+                is an article dict or a group
+        Returns:
+            results (list): list of 2-tuples (responsefile, item)
+        """
+        if not submissions:
+            return []
+
+        # Retrieving shared session and the auth. header
+        session = await self.client.get_session()
+        self.headers = self._headers()
+
+        try:
+            # Writing and uploading the batch file
+            lines = self._compose(submissions)
+            file_id = await self.retry.call(self._upload, lines, session)
+
+            # Submitting and waiting for the job
+            batch = await self.retry.call(self._create, file_id, session)
+            batch = await self._wait(batch, session)
+            if batch["status"] != "completed":
+                raise RuntimeError(f"Batch {batch['id']} {batch['status']}")
+
+            # Downloading the results and the failed requests
+            output = []
+            for key in ("output_file_id", "error_file_id"):
+                if batch.get(key):
+                    output.extend(await self.retry.call(
+                        self._download, batch[key], session
+                        ))
+
+        except (aiohttp.ClientError, RuntimeError, TimeoutError) as error:
+            logger.error(f"Batch job failed: {error}")
+            self.exceptions.append(error)
+            return []
+
+        # Matching results to their items
+        results = self._match(output, submissions)
+        logger.info(f"Batch {batch['id']} answered {len(results)} of "
+            f"{len(submissions)} requests with {len(self.exceptions)} "
+            f"failures")
+        self.retry.log_stats("PostBatch")
+        self.client.log_stats()
+
+        return results
+
+
+    def _compose(self, submissions):
+        """
+        Writes the batch file, the position of a submission is its custom ID.
+
+        Returns:
+            lines (bytes): contents of the batch file
+        """
+        lines = "".join(
+            json.dumps({
+                "custom_id": str(position),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": submissionfile,
+            }) + "\n"
+            for position, (submissionfile, _) in enumerate(submissions)
+            ).encode()
+
+        # Keeping a copy
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"batch-{int(time.time() * 1000)}.jsonl"
+        path.write_bytes(lines)
+        logger.info(f"Composed batch of {len(submissions)} requests {path}")
+
+        return lines
+
+
+    async def _upload(self, lines, session):
+        """ Uploads the batch file, returns its file ID. """
+        data = aiohttp.FormData()
+        data.add_field("purpose", "batch")
+        data.add_field("file", lines, filename="batch.jsonl",
+            content_type="application/jsonl")
+        async with session.post(
+            f"{self.base_url}/files", data=data, headers=self.headers
+            ) as response:
+            response.raise_for_status()
+            return (await response.json())["id"]
+
+
+    async def _create(self, file_id, session):
+        """ Creates the batch job, returns the batch object. """
+        async with session.post(
+            f"{self.base_url}/batches",
+            json={
+                "input_file_id": file_id,
+                "endpoint": "/v1/chat/completions",
+                "completion_window": self.completion_window,
+            },
+            headers=self.headers
+            ) as response:
+            response.raise_for_status()
+            batch = await response.json()
+            logger.info(f"Submitted batch {batch['id']}")
+            return batch
+
+
+    async def _wait(self, batch, session):
+        """
+        Polls the job until it's no longer running.
+
+        Returns:
+            batch (dict): the last batch object
+        """
+        deadline = time.monotonic() + self.timeout
+        while batch["status"] in ("validating", "in_progress", "finalizing"):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Batch {batch['id']} took longer than "
+                    f"{self.timeout}s")
+            await asyncio.sleep(self.poll_interval)
+            batch = await self.retry.call(self._poll, batch["id"], session)
+            logger.debug(f"Batch {batch['id']} {batch['status']} "
+                f"{batch.get('request_counts')}")
+        return batch
+
+
+    async def _poll(self, batch_id, session):
+        """ Retrieves the batch object. """
+        async with session.get(
+            f"{self.base_url}/batches/{batch_id}", headers=self.headers
+            ) as response:
+            response.raise_for_status()
+            return await response.json()
+
+
+    async def _download(self, file_id, session):
+        """ Downloads a file, returns its lines parsed. """
+        async with session.get(
+            f"{self.base_url}/files/{file_id}/content", headers=self.headers
+            ) as response:
+            response.raise_for_status()
+            text = await response.text()
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+    def _match(self, output, submissions):
+        """
+        Pairs each successful result with the item of its submission, failed
+        requests are stored in 'exceptions'.
+
+        Params:
+            output (list): parsed lines of the output file
+            submissions (list): list of 2-tuples (submissionfile, item)
+        Returns:
+            results (list): list of 2-tuples (responsefile, item)
+        """
+        results = []
+        for line in output:
+            response = line.get("response") or {}
+            if line.get("error") or response.get("status_code") != 200:
+                self.exceptions.append(line.get("error") or response)
+                continue
+            item = submissions[int(line["custom_id"])][1]
+            results.append((response["body"], item))
+        return results
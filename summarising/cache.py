@@ -0,0 +1,159 @@
+import re
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+
+from data_manager.atomic import dump_json
+from config.settings import summary_cache
+
+# Content-addressed cache of OpenAI responses, so the same article is never
+# paid for twice. Republished articles under a new URL, articles scraped again
+# after their URL expired from the index and reruns after a crash all send a
+# request identical to one sent before. The key is a hash of the request with
+# the whitespace of the article body normalised; the body, system prompt,
+# model and sampling parameters. A change to any of them is a miss. Entries
+# are kept in 'data/summary_cache.json' and the least recently used ones are
+# evicted above 'max_bytes'. Read more in 'summarising/summarise.py'.
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryCache:
+    """
+    Persistent cache of responses keyed by the request that produced them.
+
+    Attributes:
+        path (Path): location of the cache
+        max_bytes (int): size of the cache above which entries are evicted
+        entries (dict): {key: {"response", "size", "used"}}
+        pending (dict): dict of article URL: key pairs, for requests sent on a
+            miss whose responses aren't stored yet
+        stats (dict): counters of hits, misses, stored and evicted entries
+    """
+    def __init__(self, path=None, max_bytes=summary_cache["max_bytes"]):
+        """
+        Initialise the location and size and load the cache.
+
+        Params:
+            path (Path, optional): default is 'data/summary_cache.json'
+            max_bytes (int, optional): default is set in 'config/settings.py'
+        """
+        base_dir = Path(__file__).resolve().parent.parent
+        self.path = path or base_dir / "data" / "summary_cache.json"
+        self.max_bytes = max_bytes
+        self.entries = self._load()
+        self.pending = {}
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+
+    def key(self, submissionfile):
+        """
+        Hashes a request. Runs of whitespace in the messages are collapsed, so
+        the same article scraped twice gets the same key.
+
+        Params:
+            submissionfile (dict): the request sent to OpenAI
+        Returns:
+            _ (str): hex digest
+        """
+        normalised = dict(submissionfile)
+        normalised["messages"] = [
+            {**message, "content": re.sub(r"\s+", " ", message["content"])
+                .strip()}
+            for message in submissionfile["messages"]
+            ]
+        encoded = json.dumps(normalised, sort_keys=True).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+
+    def lookup(self, submissions):
+        """
+        Splits submissions into cached responses and requests still to send.
+
+        Params:
+            submissions (list): list of 2-tuples (submissionfile, article)
+        Returns:
+            _ (tuple): 2-tuple (hits, misses), hits are 2-tuples
+                (responsefile, article) like the results of `PostJSON.post`,
+                misses are the submissions to send
+        """
+        # Initialising empty containers
+        hits = []
+        misses = []
+
+        # Looking up each request
+        for submissionfile, article in submissions:
+            key = self.key(submissionfile)
+            entry = self.entries.get(key)
+            if entry:
+                entry["used"] = time.time()
+                hits.append((entry["response"], article))
+            else:
+                self.pending[article["url"]] = key
+                misses.append((submissionfile, article))
+
+        # Logging results
+        self.stats["hits"] += len(hits)
+        self.stats["misses"] += len(misses)
+        logger.info(f"Summary cache: {len(hits)} hits, {len(misses)} misses")
+
+        return hits, misses
+
+
+    def store(self, results):
+        """
+        Stores the responses of the requests sent on a miss.
+
+        Params:
+            results (list): list of 2-tuples (responsefile, article)
+        """
+        for responsefile, article in results:
+            key = self.pending.pop(article["url"], None)
+            if not key:
+                continue
+            self.entries[key] = {
+                "response": responsefile,
+                "size": len(json.dumps(responsefile)),
+                "used": time.time(),
+            }
+            self.stats["stored"] += 1
+
+
+    def save(self):
+        """ Evicts the least recently used entries above the size and saves. """
+        self._evict()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        dump_json(self.entries, self.path)
+        logger.info(f"Summary cache: {self.stats}, {len(self.entries)} "
+            f"entries, {self.size() / 1e6:.1f} MB")
+
+
+    def size(self):
+        """ Approximate size of the cached responses in bytes. """
+        return sum(entry["size"] for entry in self.entries.values())
+
+
+    def _evict(self):
+        """ Removes the least recently used entries until under 'max_bytes'. """
+        size = self.size()
+        if size <= self.max_bytes:
+            return
+        for key in sorted(self.entries, key=lambda k: self.entries[k]["used"]):
+            size -= self.entries.pop(key)["size"]
+            self.stats["evicted"] += 1
+            if size <= self.max_bytes:
+                break
+
+
+    def _load(self):
+        """ Loads the cache, empty if missing or corrupt. """
+        if not self.path.exists():
+            return {}
+        try:
+            with self.path.open("r") as file:
+                return json.load(file)
+        except json.JSONDecodeError as error:
+            logger.error(f"Decoder error while loading {self.path}: {error}")
+            return {}
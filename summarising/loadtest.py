@@ -0,0 +1,231 @@
+import json
+import time
+import random
+import logging
+import argparse
+
+from summarising.summarise import Summary, PostJSON
+from summarising.stub import StubOpenAI
+from utils.throttle import APILimiter
+from utils.http_requests import get_runtime
+from config.settings import openai_limits
+
+# Offline load test of the summarising path. Starts the stub server from
+# 'summarising/stub.py' with the given latency, error rates and account limits,
+# summarises a batch of articles through `Summary` and `PostJSON` like a run of
+# the pipeline does and reports the throughput, the latency percentiles, the
+# retries and the tokens per second. Used to tune the concurrency and the
+# limiter without paying OpenAI. Run from the program folder, eg.:
+#   python -m summarising.loadtest --articles 200 --latency 1.5 \
+#       --distribution lognormal --error 429=0.05 --error 500=0.01 --rpm 300
+# Articles are generated unless a JSON file of articles is given with --file.
+
+logger = logging.getLogger(__name__)
+
+# Words the generated article bodies are made of
+vocabulary = (
+    "the government said on monday that talks with union leaders over pay "
+    "and working conditions would resume next week after a strike closed "
+    "schools hospitals and transport across the country while markets fell "
+    "as investors weighed the impact of higher interest rates on growth"
+    ).split()
+
+
+class TimedPostJSON(PostJSON):
+    """
+    `PostJSON` recording the latency of each request, retries and limiter
+    waits included. Sends a placeholder key instead of reading the keyring.
+
+    Attributes:
+        latencies (list): seconds per finished request
+    """
+    def __init__(self, **kwargs):
+        """ Initialise `PostJSON` and the latencies. """
+        super().__init__(**kwargs)
+        self.latencies = []
+
+
+    async def _process_request(self, submissionfile, article, session):
+        """ Times `PostJSON._process_request`. """
+        start = time.monotonic()
+        result = await super()._process_request(submissionfile, article,
+            session)
+        self.latencies.append(time.monotonic() - start)
+        return result
+
+
+    def _headers(self):
+        """ The stub doesn't check the key. """
+        return {"Authorization": "Bearer loadtest"}
+
+
+def generate_articles(count, words, seed=None):
+    """
+    Generates articles of random words with roughly `words` words each.
+
+    Params:
+        count (int): number of articles
+        words (int): mean number of words of a body
+        seed (int, optional): default is a random seed
+    Returns:
+        articles (list): list of article dicts with 'url', 'body' and
+            'bodycount'
+    """
+    generator = random.Random(seed)
+    articles = []
+    for position in range(count):
+        length = max(50, int(generator.gauss(words, words / 4)))
+        body = " ".join(generator.choices(vocabulary, k=length))
+        articles.append({
+            "url": f"https://example.com/article/{position}",
+            "body": body,
+            "bodycount": length,
+        })
+    return articles
+
+
+def load_articles(path, count=None):
+    """ Loads articles with a body from a JSON file, eg.: 'data/articles.json'. """
+    with open(path, "r") as file:
+        articles = [article for article in json.load(file) if article.get("body")]
+    return articles[:count] if count else articles
+
+
+def percentile(values, share):
+    """
+    Nearest rank percentile.
+
+    Params:
+        values (list): list of numbers
+        share (float): eg.: 0.95
+    Returns:
+        _ (float): the percentile, 0 for no values
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(share * len(ordered)) - 1))
+    return ordered[rank]
+
+
+async def run_loadtest(articles, stub, concurrency=None, stream=False):
+    """
+    Summarises the articles through the stub server and measures the run.
+
+    Params:
+        articles (list): list of article dicts
+        stub (obj): `StubOpenAI` object, not started
+        concurrency (int, optional): default is 'openai_limits'
+        stream (bool, optional): default is not streaming the completions
+    Returns:
+        report (dict): the measurements
+    """
+    # Starting the server and composing the requests
+    base = await stub.start()
+    submissions = Summary(articles).compose_submissionfile()
+    post = TimedPostJSON(
+        endpoint=f"{base}/chat/completions",
+        limiter=APILimiter(concurrency=concurrency),
+        on_delta=(lambda item, text, done: None) if stream else None,
+        )
+
+    # Sending the requests
+    start = time.monotonic()
+    try:
+        results = await post.post(submissions)
+    finally:
+        elapsed = time.monotonic() - start
+        await stub.stop()
+
+    # Adding up the tokens of the answered requests
+    prompt = sum(response["usage"]["prompt_tokens"] for response, _ in results)
+    completion = sum(
+        response["usage"]["completion_tokens"] for response, _ in results
+        )
+
+    return {
+        "requests": len(submissions),
+        "succeeded": len(results),
+        "failed": len(post.exceptions),
+        "elapsed": elapsed,
+        "requests_per_second": len(results) / elapsed if elapsed else 0.0,
+        "p50": percentile(post.latencies, 0.50),
+        "p95": percentile(post.latencies, 0.95),
+        "p99": percentile(post.latencies, 0.99),
+        "retries": dict(post.retry.stats),
+        "limiter": dict(post.limiter.stats),
+        "concurrency": post.limiter.concurrency,
+        "server": dict(stub.stats),
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "tokens_per_second": (prompt + completion) / elapsed if elapsed else 0.0,
+    }
+
+
+def print_report(report):
+    """ Prints the measurements of a load test. """
+    print(f"Requests     {report['succeeded']} of {report['requests']} "
+        f"answered, {report['failed']} failed in {report['elapsed']:.2f}s")
+    print(f"Throughput   {report['requests_per_second']:.1f} requests/s, "
+        f"{report['tokens_per_second']:.0f} tokens/s ({report['prompt_tokens']} "
+        f"prompt, {report['completion_tokens']} completion)")
+    print(f"Latency      p50 {report['p50']:.3f}s  p95 {report['p95']:.3f}s  "
+        f"p99 {report['p99']:.3f}s")
+    print(f"Retries      {report['retries']}")
+    print(f"Limiter      {report['limiter']}, concurrency "
+        f"{report['concurrency']}")
+    print(f"Server       {report['server']}")
+
+
+def parse_error(value):
+    """ Parses an '--error STATUS=PROBABILITY' argument. """
+    status, probability = value.split("=")
+    return int(status), float(probability)
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser()
+    arguments.add_argument("--articles", type=int, default=100,
+        help="number of articles to summarise, default is 100")
+    arguments.add_argument("--words", type=int, default=600,
+        help="mean words of a generated article, default is 600")
+    arguments.add_argument("--file",
+        help="JSON file of articles to summarise instead of generated ones")
+    arguments.add_argument("--latency", type=float, default=1.0,
+        help="mean seconds before a completion starts, default is 1.0")
+    arguments.add_argument("--distribution", default="lognormal",
+        choices=["constant", "uniform", "lognormal"],
+        help="distribution of the latency, default is lognormal")
+    arguments.add_argument("--sigma", type=float, default=0.5,
+        help="shape of the lognormal latency, default is 0.5")
+    arguments.add_argument("--token-latency", type=float, default=0.0,
+        help="seconds per completion token, default is 0")
+    arguments.add_argument("--error", type=parse_error, action="append",
+        default=[], metavar="STATUS=PROBABILITY",
+        help="injected error rate, eg.: 429=0.05, repeatable")
+    arguments.add_argument("--rpm", type=int, default=openai_limits["rpm"],
+        help="server requests per minute, default is 'openai_limits'")
+    arguments.add_argument("--tpm", type=int, default=openai_limits["tpm"],
+        help="server tokens per minute, default is 'openai_limits'")
+    arguments.add_argument("--concurrency", type=int,
+        help="initial concurrency of the client, default is 'openai_limits'")
+    arguments.add_argument("--stream", action="store_true",
+        help="stream the completions")
+    arguments.add_argument("--seed", type=int,
+        help="seed of the generated articles and the server")
+    args = arguments.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.file:
+        articles = load_articles(args.file, args.articles)
+    else:
+        articles = generate_articles(args.articles, args.words, args.seed)
+    stub = StubOpenAI(
+        latency=args.latency, distribution=args.distribution,
+        sigma=args.sigma, token_latency=args.token_latency,
+        errors=dict(args.error), rpm=args.rpm, tpm=args.tpm, seed=args.seed
+        )
+    report = get_runtime().run(
+        run_loadtest(articles, stub, args.concurrency, args.stream)
+        )
+    print_report(report)
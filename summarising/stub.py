@@ -0,0 +1,377 @@
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import logging
+import itertools
+from collections import deque
+
+from aiohttp import web
+
+from utils.tokens import count_tokens
+
+# Local stand-in for the parts of the OpenAI API the program uses, so the
+# summarising path can be run and tested without a key or costs. Point
+# 'openai_base_url' in 'config/settings.py' at the address `StubOpenAI.start`
+# returns. Chat completions are answered with the first words of the user
+# message, streamed as server-sent events when asked for. Batch jobs are
+# completed 'batch_delay' seconds after they were created by answering each of
+# their requests the same way. Files and batches are kept in memory.
+# For load tests the completions can be slowed down by a latency distribution
+# and a time per completion token, fail at random with 429 or 5xx statuses and
+# be limited to requests and tokens per minute like an account, with the
+# 'x-ratelimit-*' headers OpenAI sends. Usage is counted with the model's
+# tokenizer. Read more in 'summarising/loadtest.py'.
+
+logger = logging.getLogger(__name__)
+
+
+class StubOpenAI:
+    """
+    Local server implementing chat completions, files and batches.
+
+    Attributes:
+        latency (float): mean seconds before a chat completion is answered
+        batch_delay (float): seconds before a batch job is completed
+        distribution (str): distribution of the latency, 'constant', 
+            'uniform' between 0 and twice the mean or 'lognormal'
+        sigma (float): shape of the lognormal distribution, larger gives a
+            longer tail
+        token_latency (float): seconds per completion token, added to the
+            latency or between the deltas of a stream
+        errors (dict): dict of status: probability pairs, eg.: {429: 0.05,
+            500: 0.01}
+        rpm (int): requests per minute, None is unlimited
+        tpm (int): tokens per minute, prompt plus 'max_tokens', None is 
+            unlimited
+        window (deque): 2-tuples (time, tokens) of the last minute's requests
+        random (obj): `random.Random` object, seeded for repeatable runs
+        files (dict): dict of file ID: contents pairs
+        batches (dict): dict of batch ID: batch object pairs
+        base (str): base URL of the running server, eg.:
+            'http://127.0.0.1:8000/v1'
+        runner (obj): `web.AppRunner` object
+        stats (dict): counters of completions, batches, limited requests and
+            injected errors
+    """
+    def __init__(self, latency=0.0, batch_delay=0.0, distribution="constant",
+        sigma=0.5, token_latency=0.0, errors=None, rpm=None, tpm=None, 
+        seed=None):
+        """
+        Initialise the server, it's started with `start`.
+
+        Params:
+            latency (float, optional): default is no delay
+            batch_delay (float, optional): default is completing at once
+            distribution (str, optional): default is a constant latency
+            sigma (float, optional): default is 0.5
+            token_latency (float, optional): default is no delay
+            errors (dict, optional): default is no injected errors
+            rpm (int, optional): default is unlimited
+            tpm (int, optional): default is unlimited
+            seed (int, optional): default is a random seed
+        """
+        self.latency = latency
+        self.batch_delay = batch_delay
+        self.distribution = distribution
+        self.sigma = sigma
+        self.token_latency = token_latency
+        self.errors = errors or {}
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = deque()
+        self.random = random.Random(seed)
+        self.files = {}
+        self.batches = {}
+        self.ids = itertools.count(1)
+        self.base = None
+        self.runner = None
+        self.stats = {"completions": 0, "batches": 0, "limited": 0, 
+            "injected": 0}
+
+
+    async def start(self, host="127.0.0.1", port=0):
+        """
+        Starts the server on the running loop, on a free port by default.
+
+        Returns:
+            base (str): base URL of the API
+        """
+        app = web.Application(client_max_size=200 * 1024 ** 2)
+        app.router.add_post("/v1/chat/completions", self._completions)
+        app.router.add_post("/v1/files", self._upload)
+        app.router.add_get("/v1/files/{id}/content", self._content)
+        app.router.add_post("/v1/batches", self._create)
+        app.router.add_get("/v1/batches/{id}", self._retrieve)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.base = f"http://{host}:{port}/v1"
+        logger.info(f"Stub OpenAI API on {self.base}")
+        return self.base
+
+
+    async def stop(self):
+        """ Stops the server. """
+        if self.runner:
+            await self.runner.cleanup()
+            logger.info(f"Stub OpenAI API: {self.stats}")
+
+
+    def complete(self, body):
+        """
+        Answers a chat completion request with the first words of the last
+        message, as many as asked for in the system prompt or 60.
+
+        Params:
+            body (dict): the request
+        Returns:
+            _ (dict): the chat completion object
+        """
+        messages = body["messages"]
+        asked = re.search(r"(\d+) words", messages[0]["content"])
+        words = messages[-1]["content"].split()[:int(asked[1]) if asked else 60]
+        content = " ".join(words)
+        prompt = self._prompt_tokens(body)
+        completion = count_tokens(content, body["model"])
+        self.stats["completions"] += 1
+        return {
+            "id": f"chatcmpl-{next(self.ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt,
+                "completion_tokens": completion,
+                "total_tokens": prompt + completion,
+            },
+        }
+
+
+    async def _completions(self, request):
+        """ POST /v1/chat/completions """
+        body = await request.json()
+
+        # Injecting errors
+        status = self._injected()
+        if status:
+            self.stats["injected"] += 1
+            headers = {"Retry-After": "1"} if status == 429 else {}
+            return web.json_response(
+                {"error": {"message": "Injected error", "code": status}},
+                status=status, headers=headers
+                )
+
+        # Limiting requests and tokens per minute
+        tokens = self._prompt_tokens(body) + body.get("max_tokens", 0)
+        allowed, headers = self._limit(tokens)
+        if not allowed:
+            self.stats["limited"] += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit reached", 
+                    "type": "requests", "code": "rate_limit_exceeded"}},
+                status=429, headers=headers
+                )
+
+        # Answering after the latency
+        completion = self.complete(body)
+        await asyncio.sleep(self._delay())
+        if body.get("stream"):
+            return await self._stream(request, body, completion, headers)
+        await asyncio.sleep(
+            completion["usage"]["completion_tokens"] * self.token_latency
+            )
+        return web.json_response(completion, headers=headers)
+
+
+    def _delay(self):
+        """ Samples the latency before a completion starts. """
+        if not self.latency:
+            return 0.0
+        if self.distribution == "uniform":
+            return self.random.uniform(0, 2 * self.latency)
+        if self.distribution == "lognormal":
+            # Parameters giving a mean of 'latency'
+            mu = math.log(self.latency) - self.sigma ** 2 / 2
+            return self.random.lognormvariate(mu, self.sigma)
+        return self.latency
+
+
+    def _injected(self):
+        """ Draws the status of an injected error, None for no error. """
+        draw = self.random.random()
+        for status, probability in self.errors.items():
+            if draw < probability:
+                return int(status)
+            draw -= probability
+        return None
+
+
+    def _limit(self, tokens):
+        """
+        Counts a request against the limits of the last minute.
+
+        Params:
+            tokens (int): tokens of the request
+        Returns:
+            _ (tuple): 2-tuple (allowed, headers), headers are the 
+                'x-ratelimit-*' headers and 'Retry-After' when not allowed
+        """
+        # Forgetting requests older than a minute
+        now = time.monotonic()
+        while self.window and now - self.window[0][0] >= 60:
+            self.window.popleft()
+        used = sum(count for _, count in self.window)
+        reset = 60 - (now - self.window[0][0]) if self.window else 0.0
+
+        # Checking the limits
+        allowed = (
+            (not self.rpm or len(self.window) < self.rpm)
+            and (not self.tpm or used + tokens <= self.tpm)
+            )
+        if allowed:
+            self.window.append((now, tokens))
+            used += tokens
+
+        # Composing the headers
+        headers = {}
+        for kind, limit, count in (
+            ("requests", self.rpm, len(self.window)), 
+            ("tokens", self.tpm, used)
+            ):
+            if limit:
+                headers[f"x-ratelimit-limit-{kind}"] = str(limit)
+                headers[f"x-ratelimit-remaining-{kind}"] = str(
+                    max(0, limit - count)
+                    )
+                headers[f"x-ratelimit-reset-{kind}"] = f"{reset:.3f}s"
+        if not allowed:
+            headers["Retry-After"] = f"{max(reset, 0.001):.3f}"
+
+        return allowed, headers
+
+
+    def _prompt_tokens(self, body):
+        """ Counts the prompt tokens of a request like OpenAI does. """
+        return sum(
+            count_tokens(message["content"], body["model"]) + 4
+            for message in body["messages"]
+            ) + 3
+
+
+    async def _stream(self, request, body, completion, headers=None):
+        """
+        Streams a completion as server-sent events, a word per delta, and the
+        usage last when asked for.
+        """
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream", **(headers or {})}
+            )
+        await response.prepare(request)
+
+        # Sending deltas
+        words = completion["choices"][0]["message"]["content"].split(" ")
+        for position, word in enumerate(words):
+            delta = word if position == 0 else " " + word
+            event = {
+                "id": completion["id"], "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {"content": delta}}],
+            }
+            await response.write(f"data: {json.dumps(event)}\n\n".encode())
+            await asyncio.sleep(self.token_latency)
+
+        # Sending usage and closing the stream
+        if body.get("stream_options", {}).get("include_usage"):
+            event = {"id": completion["id"], "choices": [],
+                "usage": completion["usage"]}
+            await response.write(f"data: {json.dumps(event)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+
+    async def _upload(self, request):
+        """ POST /v1/files, multipart with 'purpose' and 'file' """
+        form = await request.post()
+        file_id = f"file-{next(self.ids)}"
+        self.files[file_id] = form["file"].file.read().decode()
+        return web.json_response({
+            "id": file_id, "object": "file", "purpose": form.get("purpose")
+            })
+
+
+    async def _content(self, request):
+        """ GET /v1/files/{id}/content """
+        contents = self.files.get(request.match_info["id"])
+        if contents is None:
+            return web.json_response({"error": "No such file"}, status=404)
+        return web.Response(text=contents)
+
+
+    async def _create(self, request):
+        """ POST /v1/batches """
+        body = await request.json()
+        if body.get("input_file_id") not in self.files:
+            return web.json_response({"error": "No such file"}, status=400)
+        batch_id = f"batch-{next(self.ids)}"
+        self.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": body["endpoint"],
+            "input_file_id": body["input_file_id"],
+            "completion_window": body["completion_window"],
+            "status": "in_progress",
+            "created_at": time.time(),
+            "output_file_id": None,
+            "error_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        self.stats["batches"] += 1
+        return web.json_response(self.batches[batch_id])
+
+
+    async def _retrieve(self, request):
+        """ GET /v1/batches/{id}, completes the job once it's due """
+        batch = self.batches.get(request.match_info["id"])
+        if not batch:
+            return web.json_response({"error": "No such batch"}, status=404)
+        if (batch["status"] == "in_progress"
+            and time.time() - batch["created_at"] >= self.batch_delay):
+            self._run_batch(batch)
+        return web.json_response(batch)
+
+
+    def _run_batch(self, batch):
+        """ Answers every request of a batch and writes the output file. """
+        output = []
+        for line in self.files[batch["input_file_id"]].splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            output.append(json.dumps({
+                "id": f"batch_req_{next(self.ids)}",
+                "custom_id": entry["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": self.complete(entry["body"]),
+                },
+                "error": None,
+            }))
+        file_id = f"file-{next(self.ids)}"
+        self.files[file_id] = "\n".join(output) + "\n"
+        batch.update({
+            "status": "completed",
+            "output_file_id": file_id,
+            "request_counts": {
+                "total": len(output), "completed": len(output), "failed": 0
+                },
+        })
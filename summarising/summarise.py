@@ -1,12 +1,21 @@
+import json
+import time
 import asyncio
 import math
 import logging
+from collections import defaultdict
 
 import aiohttp
 import keyring
 
 from config.settings import *
 from data_manager.manager import DataManager
+from grouping.identity import GroupIdentity
+from summarising.cache import SummaryCache
+from utils.retry import RetryPolicy
+from utils.throttle import APILimiter, estimate_tokens, parse_retry_after
+from utils.tokens import count_tokens, split_tokens
+from utils.http_requests import get_runtime
 
 
 # Modules to summarise articles. It implements 2 classes, one to handle the 
@@ -19,7 +28,7 @@ from data_manager.manager import DataManager
 logger = logging.getLogger(__name__)
 
 # OpenAI endpoing and model 
-openai_endpoint = "https://api.openai.com/v1/chat/completions"
+openai_endpoint = f"{openai_base_url}/chat/completions"
 gpt_model = "gpt-3.5-turbo-0125"
 
 
@@ -29,22 +38,51 @@ class PostJSON:
     a list of tasks from submissionfile composed by `Summary` and executes them 
     concurrently. The response of each request is packaged with it's 
     corresponding article. Exceptions are re-raised up the call stack and stored
-    separately. 
+    separately. Transient errors, like '429' or '502', are retried by a 
+    `RetryPolicy` first, read more in 'utils/retry.py'. Requests go through
+    the session shared with the other stages, read more in 
+    'utils/http_requests.py'. Requests are sent at the account's requests 
+    and tokens per minute limits by an `APILimiter`, read more in 
+    'utils/throttle.py'. With `on_delta` the completions are streamed and the
+    text received so far is passed to it while the response arrives, the 
+    results are the same as without streaming.
 
     Attributes:
-        rate_limit (int): the rate limit
+        rate_limit (int): the initial cap on concurrent requests
         exceptions (list): list of exceptions raised.
+        retry (obj): `RetryPolicy` object, shared by all requests of the run
+        client (obj): `HTTPClient` object holding the shared session
+        limiter (obj): `APILimiter` object
+        headers (dict): headers with the auth. key
+        on_delta (function): called with (article, text, done) as a streamed
+            completion arrives, at most every 'delta_interval' seconds
+        delta_interval (float): seconds between calls of `on_delta`
+        endpoint (str): URL of the chat completions endpoint
      """
-    def __init__(self, rate_limit=5):
+    def __init__(self, rate_limit=5, client=None, limiter=None, 
+        on_delta=None, delta_interval=0.25, endpoint=None):
         """ 
-        Initialise rate-limit the required submissionfile and an empty 
-        exceptions list.
+        Initialise rate-limit the required submissionfile, an empty 
+        exceptions list, the retry policy, the limiter and the HTTP client.
         
         Params:
-            rate_limit (int): default is 5, with 10 the rate-limit is exceded.
+            rate_limit (int): default is 5, the cap adapts from there
+            client (obj, optional): default is the client of the shared runtime
+            limiter (obj, optional): default is a new `APILimiter`
+            on_delta (function, optional): streams the completions when given
+            delta_interval (float, optional): default is a quarter second
+            endpoint (str, optional): default is 'openai_endpoint', eg.: the 
+                stub server of 'summarising/stub.py'
         """
         self.rate_limit = rate_limit
         self.exceptions = []
+        self.retry = RetryPolicy()
+        self.client = client or get_runtime().client
+        self.limiter = limiter or APILimiter(concurrency=rate_limit)
+        self.headers = None
+        self.on_delta = on_delta
+        self.delta_interval = delta_interval
+        self.endpoint = endpoint or openai_endpoint
 
 
     async def post(self, submissions):
@@ -57,33 +95,32 @@ class PostJSON:
         Returns:
             results (list): list of 2-tuples (responsefile, article_dict)
         """
-        # Initialising TCP connector for rate limiting.
-        connector = aiohttp.TCPConnector(limit=self.rate_limit)
+        # Retrieving shared session
+        session = await self.client.get_session()
 
-        # Openin network session
-        async with aiohttp.ClientSession(
-                # Creating persisent header with auth. key
-                headers=self._headers(), 
-                connector=connector
-                ) as session:
+        # Creating persisent header with auth. key
+        self.headers = self._headers()
 
-            # Creating a list of tasks
-            tasks = [self._process_request(submissionfile, article, session) 
-                     for submissionfile, article in submissions]
+        # Creating a list of tasks
+        tasks = [self._process_request(submissionfile, article, session) 
+                 for submissionfile, article in submissions]
 
-            # Executing list of tasks concurrently
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+        # Executing list of tasks concurrently
+        results = await asyncio.gather(*tasks, return_exceptions=True)
 
-            # Sorting good responses from bad
-            results = self._sort_results(results)
+        # Sorting good responses from bad
+        results = self._sort_results(results)
 
-            # Logging results
-            logger.info(f"Posted JSON of {len(results)} articles from "
-                f"{len(tasks)} concurrent tasks with "
-                f"{len(self.exceptions)} exceptions"
-                )
+        # Logging results
+        logger.info(f"Posted JSON of {len(results)} articles from "
+            f"{len(tasks)} concurrent tasks with "
+            f"{len(self.exceptions)} exceptions"
+            )
+        self.retry.log_stats("PostJSON")
+        self.limiter.log_stats()
+        self.client.log_stats()
 
-            return results
+        return results
 
 
     def _sort_results(self, results):
@@ -122,41 +159,132 @@ class PostJSON:
         Returns:
             2-tuple (tuple): response dict and corresponding article dict
         """
-        # Making request
-        responsefile = await self._poster(submissionfile, session)
+        # Making request, retrying transient errors
+        responsefile = await self.retry.call(
+            self._poster, submissionfile, session, article
+            )
 
         # Returning response package
         return (responsefile, article)
 
 
-    async def _poster(self, submissionfile, session):
+    async def _poster(self, submissionfile, session, article=None):
         """ 
         Async HTTP request function, here we make the request to OpenAI. It
-        re-raises exceptions up the chain.
+        waits for the limiter, records the response to it and re-raises 
+        exceptions up the chain.
 
         Params:
             submissionfile (dict): submissionfile
             session (obj): the session object.
+            article (dict, optional): passed to `on_delta` when streaming
         """
+        # Estimating the tokens counted against the limit
+        estimate = estimate_tokens(submissionfile)
+
+        # Asking for a stream of deltas, the usage comes with the last one
+        payload = submissionfile
+        if self.on_delta:
+            payload = {
+                **submissionfile, "stream": True, 
+                "stream_options": {"include_usage": True}
+                }
 
         # Attempting request
-        try:
-            async with session.post(
-                openai_endpoint, 
-                json=submissionfile
-                ) as response:
-                response.raise_for_status()
-                logger.debug(f"Requested summary {response.status}")
-                # Returning response dict
-                return await response.json()
-
-        # Re-raising exceptions
-        except aiohttp.ClientResponseError as error:
-            logger.error(f"{error.status} {error.message}")
-            raise
-        except aiohttp.ClientError as error:
-            logger.error(f"Client error: {error} {self.url}")
-            raise
+        async with self.limiter.slot(estimate) as limiter:
+            start = time.monotonic()
+            try:
+                async with session.post(
+                    self.endpoint, 
+                    json=payload,
+                    headers=self.headers
+                    ) as response:
+                    # Calibrating the limiter
+                    limiter.record(
+                        response.status, time.monotonic() - start,
+                        response.headers,
+                        parse_retry_after(response.headers.get("Retry-After"))
+                        )
+                    response.raise_for_status()
+                    logger.debug(f"Requested summary {response.status}")
+                    if self.on_delta:
+                        responsefile = await self._read_stream(
+                            response, submissionfile, article
+                            )
+                    else:
+                        responsefile = await response.json()
+
+            # Re-raising exceptions
+            except aiohttp.ClientResponseError as error:
+                logger.error(f"{error.status} {error.message}")
+                raise
+            except aiohttp.ClientError as error:
+                limiter.record(None, time.monotonic() - start, None)
+                logger.error(f"Client error: {error} {self.endpoint}")
+                raise
+
+            # Settling the estimate against the tokens counted
+            usage = responsefile.get("usage", {})
+            limiter.settle(estimate, usage.get("prompt_tokens", 0) 
+                + submissionfile.get("max_tokens", 0))
+
+            # Returning response dict
+            return responsefile
+
+
+    async def _read_stream(self, response, submissionfile, article):
+        """
+        Reads a streamed completion, server-sent events with a 'data:' line
+        per delta and 'data: [DONE]' at the end. Passes the text so far to 
+        `on_delta` and assembles a response like a regular completion. The
+        usage is counted locally if the server doesn't send it.
+
+        Params:
+            response (obj): the streaming response
+            submissionfile (dict): the request, used to count the usage
+            article (dict): passed to `on_delta`
+        Returns:
+            _ (dict): response dict with 'choices' and 'usage'
+        """
+        # Initialising containers and timer
+        content = []
+        usage = None
+        passed = 0
+
+        # Reading the events
+        async for line in response.content:
+            line = line.decode().strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            event = json.loads(data)
+            usage = event.get("usage") or usage
+            for choice in event.get("choices", []):
+                delta = choice.get("delta", {}).get("content")
+                if delta:
+                    content.append(delta)
+
+            # Passing on the text so far
+            if content and time.monotonic() - passed > self.delta_interval:
+                passed = time.monotonic()
+                self.on_delta(article, "".join(content), False)
+
+        # Counting the usage locally when missing
+        text = "".join(content)
+        if not usage:
+            usage = {
+                "prompt_tokens": estimate_tokens(submissionfile) 
+                    - submissionfile.get("max_tokens", 0),
+                "completion_tokens": count_tokens(text, gpt_model),
+            }
+        self.on_delta(article, text, True)
+
+        return {
+            "choices": [{"message": {"role": "assistant", "content": text}}],
+            "usage": usage,
+        }
 
 
     def _headers(self):
@@ -177,21 +305,36 @@ class Summary:
     """
     Class responsible for  the composition and packagin of the required 
     submissionfile to communicate with the OpenAI API and the processing of the 
-    responses.
+    responses. Bodies are counted in tokens before they are sent, the ones
+    over the prompt budget are summarised in two rounds; each chunk of the 
+    body is summarised on its own, then the chunk summaries are combined into
+    the article's summary with `compose_combined`.
+
+    Attributes:
+        articles (list): list of article dicts
+        budget (dict): 'prompt_budget' from 'config/settings.py'
+        chunk_usage (dict): dict of URL: [tokens sent, tokens received] pairs,
+            the cost of the chunk summaries of each long article
     """
-    def __init__(self, articles):
+    def __init__(self, articles, budget=prompt_budget):
         """
         Initialise list of articles to summarise.
 
         Params:
             articles (list): list of article dicts
+            budget (dict, optional): default is 'prompt_budget'
         """
         self.articles = articles
+        self.budget = budget
+        self.chunk_usage = defaultdict(lambda: [0, 0])
 
 
     def compose_submissionfile(self):
         """
-        Handles the composition of the submissionfile sent to OpenAI
+        Handles the composition of the submissionfile sent to OpenAI. Long 
+        bodies are split into chunks, each chunk is sent with a dict in place
+        of the article; {"url": "<url>#chunk-<i>", "article", "chunk", 
+        "chunks"}.
 
         Returns:
             submissions (tuple): 2-tuple containing the submissionfile and article 
@@ -205,29 +348,23 @@ class Summary:
         for article in self.articles:
             # Calculating desired summary length
             summary_count = self._calculatesummarylength(article["bodycount"])
+            # Extracting body of article
+            body = article["body"]
+            # Splitting bodies over the budget
+            if count_tokens(body, gpt_model) > self.budget["max_prompt_tokens"]:
+                submissions.extend(
+                    self._compose_chunks(article, body, summary_count)
+                    )
+                continue
             # Composing system prompt
             system_prompt = (
                 f"You will be given an article. I want you to summarise it in "
                 f"'{summary_count} words'."
             )
-            # Extracting body of article
-            body = article["body"]
             # Composing submissionfile
-            submissionfile = {
-                    "model": gpt_model,
-                    "messages": [{
-                        "role": "system",
-                        "content": system_prompt
-                    },{
-                        "role": "user",
-                        "content": body
-                }],
-                "temperature": 0.5,
-                "max_tokens": 1000,
-                "top_p": 1.0,
-                "frequency_penalty": 0.0,
-                "presence_penalty": 0.0
-            }
+            submissionfile = self._submissionfile(
+                system_prompt, body, summary_count
+                )
             # Adding completed submissionfile along with the article to the list 
             # of submissions
             submissions.append((submissionfile, article))
@@ -240,6 +377,134 @@ class Summary:
         return submissions
 
 
+    def compose_combined(self, results):
+        """
+        Separates the responses to chunks from the rest and composes, for each
+        long article, the request that combines its chunk summaries. Articles
+        with failed chunks are combined from the chunks that succeeded.
+
+        Params:
+            results (list): list of 2-tuples [(responsefile, item),...]
+        Returns:
+            _ (tuple): 2-tuple (results, submissions), the results without the
+                chunks and the submissions combining them
+        """
+        # Initialising empty containers
+        finished = []
+        parts = defaultdict(dict)
+        submissions = []
+
+        # Collecting the chunk summaries of each article
+        for responsefile, item in results:
+            if "chunk" in item:
+                parts[item["article"]["url"]][item["chunk"]] = (
+                    responsefile, item
+                    )
+            else:
+                finished.append((responsefile, item))
+
+        # Composing the combining requests
+        for url, chunks in parts.items():
+            item = next(iter(chunks.values()))[1]
+            article = item["article"]
+            if len(chunks) < item["chunks"]:
+                logger.warning(f"Combining {len(chunks)} of {item['chunks']} "
+                    f"chunks {url}")
+            summaries = []
+            for position in sorted(chunks):
+                responsefile = chunks[position][0]
+                summaries.append(responsefile["choices"][0]["message"]["content"])
+                self.chunk_usage[url][0] += responsefile["usage"]["prompt_tokens"]
+                self.chunk_usage[url][1] += (
+                    responsefile["usage"]["completion_tokens"]
+                    )
+            summary_count = self._calculatesummarylength(article["bodycount"])
+            system_prompt = (
+                f"You will be given {len(summaries)} summaries of consecutive "
+                f"parts of one article separated by `---`. Combine them into a "
+                f"single summary of the article in '{summary_count} words'."
+            )
+            submissions.append((
+                self._submissionfile(
+                    system_prompt, "---".join(summaries), summary_count
+                    ),
+                article
+                ))
+
+        # Logging results
+        if submissions:
+            logger.info(f"Composed {len(submissions)} submissionfile combining "
+                f"chunk summaries")
+
+        return finished, submissions
+
+
+    def _compose_chunks(self, article, body, summary_count):
+        """
+        Splits a long body into chunks within the budget and composes a
+        request for each. Chunks beyond 'max_chunks' are left out.
+
+        Returns:
+            submissions (list): list of 2-tuples (submissionfile, chunk dict)
+        """
+        # Splitting body
+        chunks = split_tokens(body, self.budget["chunk_tokens"], gpt_model)
+        if len(chunks) > self.budget["max_chunks"]:
+            logger.warning(f"Truncated {article['url']} to "
+                f"{self.budget['max_chunks']} of {len(chunks)} chunks")
+            chunks = chunks[:self.budget["max_chunks"]]
+
+        # Composing a submissionfile per chunk
+        submissions = []
+        for position, chunk in enumerate(chunks):
+            system_prompt = (
+                f"You will be given part {position + 1} of {len(chunks)} of an "
+                f"article. I want you to summarise it in '{summary_count} "
+                f"words'."
+            )
+            submissions.append((
+                self._submissionfile(system_prompt, chunk, summary_count),
+                {"url": f"{article['url']}#chunk-{position}", 
+                    "article": article, "chunk": position, 
+                    "chunks": len(chunks)}
+                ))
+        logger.debug(f"Split {article['url']} into {len(chunks)} chunks")
+
+        return submissions
+
+
+    def _submissionfile(self, system_prompt, content, summary_count):
+        """
+        Composes a submissionfile. Completions are capped at twice the tokens
+        of the summary's words, so the limiter doesn't reserve tokens that are
+        never used.
+
+        Params:
+            system_prompt (str): the instructions
+            content (str): the text to summarise
+            summary_count (int): desired number of words
+        Returns:
+            submissionfile (dict): the request
+        """
+        return {
+                "model": gpt_model,
+                "messages": [{
+                    "role": "system",
+                    "content": system_prompt
+                },{
+                    "role": "user",
+                    "content": content
+            }],
+            "temperature": 0.5,
+            "max_tokens": max(
+                self.budget["min_completion_tokens"], 2 * summary_count
+                ),
+            "top_p": 1.0,
+            "frequency_penalty": 0.0,
+            "presence_penalty": 0.0
+        }
+
+
     def process_response(self, results):
         """
         Handles the processing of the response file received from OpenAI
@@ -260,6 +525,10 @@ class Summary:
             summary = responsefile["choices"][0]["message"]["content"]
             tokens_sent = responsefile["usage"]["prompt_tokens"]
             tokens_received = responsefile["usage"]["completion_tokens"]
+            # Adding the cost of the chunk summaries of long articles
+            if article["url"] in self.chunk_usage:
+                tokens_sent += self.chunk_usage[article["url"]][0]
+                tokens_received += self.chunk_usage[article["url"]][1]
             # Adding summary and tokens fields to article dict
             article["summary"] = summary
             article["tokens_sent"] = tokens_sent
@@ -306,7 +575,14 @@ class Summary:
 
 class Merge:
     """
-        Class responsible for merging the summaries of grouped articles.
+        Class responsible for merging the summaries of grouped articles. 
+        Large groups are merged as a tree; their summaries are split into 
+        batches that are merged concurrently, then the merges of the batches 
+        are merged, until a single summary is left. Every merge goes through
+        the `SummaryCache`, so when an article joins a group only the batches
+        it changes and the merges above them are requested again. Members are
+        ordered by publish date, so new articles usually land in the last
+        batch. In batch mode each level of the tree is one batch job.
 
         Attributes:
             manager (obj): data manager object
@@ -314,13 +590,28 @@ class Merge:
             groups (dict): dictionary of grouped articles, where each key is a 
             group with a corresponding list of articles belonging to that group
             {'group': [articles...]...}
+            requests (obj): `PostJSON` object or `PostBatch` for batch mode
+            identity (obj): `GroupIdentity` object, remembers the merged 
+            summary of each group, read more in 'grouping/identity.py'
+            cache (obj): `SummaryCache` object, holds the intermediate merges
+            fan_in (int): most summaries merged by one request
+            max_prompt_tokens (int): most tokens of summaries merged by one
+            request, a request merges 2 summaries at least
+            expected (dict): dict of group: number of batches pairs of the 
+            current level
     """
-    def __init__(self):
+    def __init__(self, requests=None, identity=None, settings=merge_tree, 
+        cache=None):
         self.manager = DataManager()
-        self.requests = PostJSON()
+        self.requests = requests or PostJSON()
+        self.identity = identity or GroupIdentity()
+        self.cache = cache or SummaryCache()
+        self.fan_in = max(2, settings["fan_in"])
+        self.max_prompt_tokens = settings["max_prompt_tokens"]
         self.articles = self.manager.load()
         self.groups = {}
         self.submissions = []
+        self.expected = {}
         self.responses = []
 
 
@@ -330,10 +621,72 @@ class Merge:
         """
         self.grouper()
         self.check_groups()
-        self.compose_submissions()
-        self.responses = asyncio.run(self.requests.post(self.submissions))
+        self.reduce()
         self.process_responses()
         self.manager.save(self.articles, "articles")
+        self.identity.save()
+        self.cache.save()
+
+
+    def reduce(self):
+        """
+            Merges the groups level by level. Each level sends the merges of
+            all groups at once, the results are the summaries of the next 
+            level. A group is finished when its summaries fit into a single 
+            merge, its 2-tuple (response, group) is added to 'responses'. A
+            group with a failed merge is dropped for this run, merging the
+            remaining branches would give a summary missing articles.
+        """
+        # Ordering summaries of each group by publish date
+        nodes = {}
+        for group, articles in self.groups.items():
+            ordered = sorted(articles, key=lambda article: (
+                article["published"].isoformat() 
+                if article["published"] else "", article["url"]
+                ))
+            nodes[group] = [article["summary"] for article in ordered]
+
+        level = 0
+        while nodes:
+            # Composing the merges of this level
+            carried = self.compose_submissions(nodes, level)
+
+            # Requesting the merges that aren't cached
+            results, submissions = self.cache.lookup(self.submissions)
+            if submissions:
+                posted = get_runtime().run(self.requests.post(submissions))
+                self.cache.store(posted)
+                results.extend(posted)
+
+            # Collecting finished groups and the summaries of the next level
+            branches = defaultdict(dict, carried)
+            finished = set()
+            for response, item in results:
+                summary = response["choices"][0]["message"]["content"]
+                if item["final"]:
+                    self.responses.append((response, item["group"]))
+                    finished.add(item["group"])
+                else:
+                    branches[item["group"]][item["index"]] = summary
+
+            # Dropping groups with failed merges
+            for group, expected in self.expected.items():
+                if expected == 1 and group not in finished:
+                    logger.warning(f"Final merge of group {group} failed")
+                elif expected > 1 and len(branches[group]) < expected:
+                    logger.warning(f"Dropped group {group}, "
+                        f"{expected - len(branches[group])} of {expected} "
+                        f"merges failed at level {level}")
+                    del branches[group]
+
+            nodes = {
+                group: [branch[index] for index in sorted(branch)]
+                for group, branch in branches.items()
+                }
+            level += 1
+
+        logger.info(f"Merged {len(self.responses)} of {len(self.groups)} "
+            f"groups in {level} levels")
 
 
     def process_responses(self):
@@ -347,82 +700,149 @@ class Merge:
             for article in self.articles:
                 if article["group"] == group:
                     article["group_summary"] = group_summary
+            # Remembering the summary for the group's members
+            members = [article["url"] for article in self.groups[group]]
+            self.identity.store(group, members, group_summary)
 
 
-    def compose_submissions(self):
+    def compose_submissions(self, nodes, level):
         """
-        Handles the composition of the submissionfile sent to OpenAI
+        Handles the composition of the submissionfiles of one level of the 
+        merge tree, stored in 'submissions' as 2-tuples (submissionfile, 
+        item). The item holds the group, the position of the batch and 
+        whether it's the final merge of the group. A batch of one summary 
+        isn't sent, it's carried to the next level.
 
+        Params:
+            nodes (dict): dict of group: list of summaries pairs
+            level (int): depth of the level, 0 are the article summaries
         Returns:
-            submissions (tuple): 2-tuple containing the submissionfile and 
-            article dict
+            carried (dict): dict of group: {position: summary} pairs
         """
-        # Initialising empty submissions container
+        # Initialising empty containers
         submissions = []
+        carried = {}
+        self.expected = {}
 
-        # Iterating over articles 
-        for group in self.groups:
-
-            # Composing system prompt
-            n_summaries = len(self.groups[group])
-            system_prompt = (
-                f"You will be given {n_summaries} article summaries separated "
-                f"by `---`. "
-                f"Your task is to combine the summaries into a single cohesive "
-                f"summary."
-                f"Ensure that your answer is formatted in a single paragraph."
-            )
-
-            # Combining summaries with '---' separator
-            combined_summaries = "---".join(
-                [article["summary"] for article in self.groups[group]]
-                )
+        # Iterating over groups
+        for group, summaries in nodes.items():
+            batches = self._batches(summaries)
+            self.expected[group] = len(batches)
+
+            # Merging small groups in one request
+            if len(batches) == 1:
+                item = {"url": f"group-{group}", "group": group, 
+                    "final": True}
+                submissions.append((self._submissionfile(summaries), item))
+                continue
 
-            # Composing submissionfile
-            submissionfile = {
-                    "model": gpt_model,
-                    "messages": [{
-                        "role": "system",
-                        "content": system_prompt
-                    },{
-                        "role": "user",
-                        "content": combined_summaries
-                }],
-                "temperature": 0.5,
-                "max_tokens": 1000,
-                "top_p": 1.0,
-                "frequency_penalty": 0.0,
-                "presence_penalty": 0.0
-            }
-
-            # Adding completed submissionfile along with the group to the list 
-            # of submissions
-            submissions.append((submissionfile, group))
+            # Merging the batches of large groups
+            for index, batch in enumerate(batches):
+                if len(batch) == 1:
+                    carried.setdefault(group, {})[index] = batch[0]
+                    continue
+                item = {"url": f"group-{group}/{level}/{index}", 
+                    "group": group, "index": index, "final": False}
+                submissions.append((self._submissionfile(batch), item))
 
         # Logging results
         logger.info(f"Composed {len(submissions)} submissionfile for "
-            f"{len(self.groups)} groups")
+            f"{len(nodes)} groups at level {level}")
 
         self.submissions = submissions
+        return carried
+
+
+    def _batches(self, summaries):
+        """
+        Splits the summaries of a group into batches of at most 'fan_in' 
+        summaries and 'max_prompt_tokens' tokens.
+
+        Params:
+            summaries (list): list of strings
+        Returns:
+            batches (list): list of lists of strings
+        """
+        batches = [[]]
+        tokens = 0
+        for summary in summaries:
+            count = count_tokens(summary, gpt_model)
+            batch = batches[-1]
+            if len(batch) >= self.fan_in or (
+                len(batch) >= 2 and tokens + count > self.max_prompt_tokens
+                ):
+                batches.append([])
+                tokens = 0
+            batches[-1].append(summary)
+            tokens += count
+        return batches
+
+
+    def _submissionfile(self, summaries):
+        """
+        Composes the request merging a list of summaries.
+
+        Params:
+            summaries (list): list of strings
+        Returns:
+            submissionfile (dict): the request sent to OpenAI
+        """
+        # Composing system prompt
+        n_summaries = len(summaries)
+        system_prompt = (
+            f"You will be given {n_summaries} article summaries separated "
+            f"by `---`. "
+            f"Your task is to combine the summaries into a single cohesive "
+            f"summary."
+            f"Ensure that your answer is formatted in a single paragraph."
+        )
+
+        # Combining summaries with '---' separator
+        combined_summaries = "---".join(summaries)
+
+        # Composing submissionfile
+        submissionfile = {
+                "model": gpt_model,
+                "messages": [{
+                    "role": "system",
+                    "content": system_prompt
+                },{
+                    "role": "user",
+                    "content": combined_summaries
+            }],
+            "temperature": 0.5,
+            "max_tokens": 1000,
+            "top_p": 1.0,
+            "frequency_penalty": 0.0,
+            "presence_penalty": 0.0
+        }
+
+        return submissionfile
 
 
     def check_groups(self):
         """
-            Methods that checks if groups were already merged.
+            Methods that checks if groups were already merged. A group is
+            merged when a summary was stored for exactly its members, the
+            summary is reused for its articles. Groups of near-duplicates 
+            sharing one summary need no merge, it's their group summary.
         """
         # Iterating over groups
         for group in list(self.groups.keys()):
             articles = self.groups[group]
-            # Checking if group is summarised uniformly
-            try:
-                gsums = [article["group_summary"] for article in articles]
-                if all(gsum == gsums[0] for gsum in gsums):
-                    # Removing group
-                    logger.info(f"Removed group {group}, it's already merged")
-                    del self.groups[group]
-            # Detecting article without 'group_summary' key
-            except KeyError as error:
-                continue
+            members = [article["url"] for article in articles]
+            # Checking for a summary of the same members
+            group_summary = self.identity.merged(group, members)
+            summaries = {article["summary"] for article in articles}
+            if group_summary is None and len(summaries) == 1:
+                group_summary = summaries.pop()
+                self.identity.store(group, members, group_summary)
+            if group_summary is not None:
+                for article in articles:
+                    article["group_summary"] = group_summary
+                # Removing group
+                logger.info(f"Removed group {group}, it's already merged")
+                del self.groups[group]
 
 
     def grouper(self):
@@ -0,0 +1,26 @@
+import json
+
+import pytest
+
+from data_manager.atomic import dump_json
+
+
+class Unserialisable:
+    pass
+
+
+def test_file_is_replaced(tmp_path):
+    path = tmp_path / "articles.json"
+    dump_json([1], path)
+    dump_json([1, 2], path, indent=4)
+    assert json.loads(path.read_text()) == [1, 2]
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_failed_write_keeps_the_old_file(tmp_path):
+    path = tmp_path / "articles.json"
+    dump_json([1], path)
+    with pytest.raises(TypeError):
+        dump_json([Unserialisable()], path)
+    assert json.loads(path.read_text()) == [1]
+    assert list(tmp_path.iterdir()) == [path]
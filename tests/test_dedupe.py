@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from grouping.dedupe import NearDuplicates
+from data_manager.discarded import DayPartitionedLog
+
+
+def body(seed, words=400):
+    generator = random.Random(seed)
+    return " ".join(f"w{generator.randrange(5000)}" for _ in range(words))
+
+
+def article(url, text):
+    return {"url": url, "body": text, "bodycount": len(text.split())}
+
+
+def summarise(articles):
+    for item in articles:
+        item.update(summary=f"summary of {item['url']}", summarycount=3)
+    return articles
+
+
+@pytest.fixture
+def history(tmp_path):
+    return DayPartitionedLog("signatures", directory=tmp_path / "signatures")
+
+
+def test_copies_in_a_batch_share_one_summary(history):
+    wire = body(1)
+    articles = [article("ap", wire), article("cnn", wire + " extra words"),
+        article("other", body(2))]
+    dedupe = NearDuplicates(history=history)
+    originals = dedupe.find(articles)
+    assert sorted(item["url"] for item in originals) == ["cnn", "other"]
+
+    shared = dedupe.share(summarise(originals))
+    copy = next(item for item in shared if item["url"] == "ap")
+    assert copy["duplicate_of"] == "cnn"
+    assert copy["summary"] == "summary of cnn"
+    assert copy["tokens_sent"] == 0
+
+
+def test_copy_of_an_earlier_article_reuses_its_summary(history):
+    wire = body(3)
+    dedupe = NearDuplicates(history=history)
+    dedupe.share(summarise(dedupe.find([article("ap", wire)])))
+    dedupe.save()
+
+    dedupe = NearDuplicates(history=history)
+    originals = dedupe.find([article("bbc", wire), article("new", body(4))])
+    assert [item["url"] for item in originals] == ["new"]
+
+    shared = dedupe.share(summarise(originals))
+    copy = next(item for item in shared if item["url"] == "bbc")
+    assert copy["duplicate_of"] == "ap"
+    assert copy["summary"] == "summary of ap"
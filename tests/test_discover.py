@@ -0,0 +1,37 @@
+import data_manager.discarded
+from scraping.discover import DiscoverLinks, ExtractFeed
+
+
+categories = {"Europe": "Europe", "Middle East": "Middle-East"}
+
+rss = """<rss><channel>
+<item><link>https://example.com/a</link><category>Europe</category></item>
+<item><link>https://example.com/b</link><category>News</category>
+<category>Middle East</category></item>
+<item><link>https://example.com/c</link><category>Sport</category></item>
+</channel></rss>"""
+
+
+def test_labels_of_feed_entries_are_extracted():
+    labels = {}
+    kind, entries = ExtractFeed().extract(rss, "feed", labels)
+    assert kind == "feed"
+    assert [link for link, _ in entries] == [
+        "https://example.com/a", "https://example.com/b",
+        "https://example.com/c",
+        ]
+    assert labels["https://example.com/b"] == ["News", "Middle East"]
+
+
+def test_feed_entries_go_to_the_categories_of_their_labels(tmp_path,
+    monkeypatch):
+    monkeypatch.setattr(data_manager.discarded, "data_dir", tmp_path)
+    discover = DiscoverLinks()
+    discover.index = set()
+    discover.path = tmp_path / "feed_state.json"
+    discover.state = {}
+    links = discover._read("feed", "AlJazeera", categories, rss, [])
+    assert sorted(links) == [
+        ("https://example.com/a", "AlJazeera", "Europe"),
+        ("https://example.com/b", "AlJazeera", "Middle-East"),
+        ]
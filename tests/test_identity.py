@@ -0,0 +1,38 @@
+from grouping.identity import GroupIdentity
+
+
+def articles(urls):
+    return [{"url": url} for url in urls]
+
+
+def test_relabelled_clusters_keep_their_ids(tmp_path):
+    identity = GroupIdentity(path=tmp_path / "groups.json")
+    first = identity.assign([0, 0, 1, 1, -1], articles("abcde"))
+    second = identity.assign([1, 1, 0, 0, -1], articles("abcde"))
+    assert first == second
+    assert first[-1] == -1
+
+
+def test_unchanged_group_reuses_its_summary(tmp_path):
+    identity = GroupIdentity(path=tmp_path / "groups.json")
+    group_id = identity.assign([0, 0], articles("ab"))[0]
+    identity.store(group_id, ["a", "b"], "merged")
+    identity.save()
+
+    identity = GroupIdentity(path=tmp_path / "groups.json")
+    assert identity.assign([3, 3], articles("ab"))[0] == group_id
+    assert identity.merged(group_id, ["b", "a"]) == "merged"
+
+
+def test_group_gaining_a_member_is_merged_again(tmp_path):
+    identity = GroupIdentity(path=tmp_path / "groups.json")
+    group_id = identity.assign([0, 0, -1], articles("abc"))[0]
+    identity.store(group_id, ["a", "b"], "merged")
+
+    # The new article joins the group, which keeps its ID
+    ids = identity.assign([0, 0, 0], articles("abc"))
+    assert ids == [group_id] * 3
+    assert identity.merged(group_id, ["a", "b", "c"]) is None
+
+    identity.store(group_id, ["a", "b", "c"], "merged again")
+    assert identity.merged(group_id, ["a", "b", "c"]) == "merged again"
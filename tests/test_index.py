@@ -0,0 +1,54 @@
+import pytest
+
+import data_manager.discarded
+from data_manager.index import URLIndex
+from data_manager.manager import DataManager
+
+
+settings = {"bloom_threshold": 3, "error_rate": 0.01}
+
+
+class Everything:
+    """ Bloom filter with nothing but false positives. """
+    def __contains__(self, item):
+        return True
+
+    def add(self, item):
+        pass
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_manager.discarded, "data_dir", tmp_path)
+    monkeypatch.setattr(DataManager, "load", lambda self, filename=None: [])
+    index = URLIndex(settings=settings)
+    index.update(f"https://example.com/{i}" for i in range(5))
+    index.flush()
+    return URLIndex(settings=settings)
+
+
+def test_large_index_uses_a_bloom_filter(index):
+    assert index.bloom is not None
+    assert "https://example.com/4" in index
+    assert "https://example.com/new" not in index
+
+
+def test_bloom_false_positive_is_not_known(index):
+    index.bloom = Everything()
+    assert "https://example.com/0" in index
+    assert "https://example.com/new" not in index
+    index.add("https://example.com/new")
+    assert "https://example.com/new" in index
+
+
+def test_discarded_store_is_moved_into_the_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_manager.discarded, "data_dir", tmp_path)
+    monkeypatch.setattr(DataManager, "load", lambda self, filename=None: [])
+    (tmp_path / "discarded").mkdir()
+    (tmp_path / "discarded" / "2999-01-01.txt").write_text("https://a\n")
+    (tmp_path / "discarded.json").write_text('["https://b"]')
+    index = URLIndex(settings=settings)
+    assert "https://a" in index and "https://b" in index
+    assert not (tmp_path / "discarded").exists()
+    assert not (tmp_path / "discarded.json").exists()
+    assert "https://a" in URLIndex(settings=settings)
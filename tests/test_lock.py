@@ -0,0 +1,87 @@
+import os
+import json
+import time
+import subprocess
+import sys
+
+import pytest
+
+from pipeline.lock import PipelineLock
+
+
+def write_lock(path, pid, taken):
+    path.write_text(json.dumps({"pid": pid, "taken": taken}))
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_second_lock_is_refused(tmp_path):
+    first = PipelineLock(tmp_path / "pipeline.lock")
+    second = PipelineLock(tmp_path / "pipeline.lock")
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_old_lock_of_running_process_is_kept(tmp_path):
+    path = tmp_path / "pipeline.lock"
+    write_lock(path, os.getppid(), 0)
+    assert not PipelineLock(path).acquire()
+    assert json.loads(path.read_text())["pid"] == os.getppid()
+
+
+def test_lock_of_dead_process_is_taken_over(tmp_path):
+    path = tmp_path / "pipeline.lock"
+    write_lock(path, dead_pid(), time.time())
+    lock = PipelineLock(path)
+    assert lock.acquire()
+    assert lock.holder()["pid"] == os.getpid()
+
+
+def test_unreadable_lock_is_held_for_the_grace_period(tmp_path):
+    path = tmp_path / "pipeline.lock"
+    path.write_text("")
+    assert not PipelineLock(path, grace=10).acquire()
+
+    old = time.time() - 60
+    os.utime(path, (old, old))
+    assert PipelineLock(path, grace=10).acquire()
+
+
+def test_release_leaves_a_lock_taken_over(tmp_path):
+    path = tmp_path / "pipeline.lock"
+    lock = PipelineLock(path)
+    assert lock.acquire()
+
+    # Another process took the lock over
+    write_lock(path, os.getppid(), time.time())
+    lock.release()
+    assert json.loads(path.read_text())["pid"] == os.getppid()
+
+
+def test_lock_of_earlier_process_with_this_pid_is_taken_over(tmp_path):
+    path = tmp_path / "pipeline.lock"
+    write_lock(path, os.getpid(), time.time())
+    lock = PipelineLock(path)
+    assert lock.acquire()
+    lock.release()
+    assert not path.exists()
+
+
+def test_lock_of_reused_pid_is_taken_over(tmp_path):
+    path = tmp_path / "pipeline.lock"
+    lock = PipelineLock(path)
+    if lock._started(os.getppid()) is None:
+        pytest.skip("start times need '/proc'")
+    path.write_text(json.dumps({
+        "pid": os.getppid(), "started": "other", "taken": time.time()
+        }))
+    assert lock.acquire()
+    assert lock.holder()["started"] == lock._started(os.getpid())
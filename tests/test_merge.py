@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import summarising.summarise as summarise
+from grouping.identity import GroupIdentity
+from summarising.cache import SummaryCache
+
+
+class FakeRequests:
+    """ Answers merges with their prompt, failing the ones `fail` matches. """
+    def __init__(self, fail=lambda item: False):
+        self.fail = fail
+        self.sent = []
+
+    async def post(self, submissions):
+        results = []
+        for submissionfile, item in submissions:
+            self.sent.append(item)
+            if self.fail(item):
+                continue
+            content = submissionfile["messages"][-1]["content"]
+            results.append(({"choices": [{"message": {"content": content}}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1}}, item))
+        return results
+
+
+def group_articles(count, group=7):
+    start = datetime(2024, 1, 1)
+    return [
+        {"url": f"a{i}", "group": group, "summary": f"s{i}",
+            "published": start + timedelta(hours=i)}
+        for i in range(count)
+        ]
+
+
+@pytest.fixture
+def make_merge(tmp_path, monkeypatch):
+    def make(articles, requests):
+        monkeypatch.setattr(summarise.DataManager, "load", 
+            lambda self, filename="articles": articles)
+        merge = summarise.Merge(
+            requests=requests,
+            identity=GroupIdentity(path=tmp_path / "groups.json"),
+            settings={"fan_in": 3, "max_prompt_tokens": 3000},
+            cache=SummaryCache(path=tmp_path / "cache.json"),
+            )
+        merge.grouper()
+        merge.check_groups()
+        merge.reduce()
+        merge.process_responses()
+        merge.cache.save()
+        return merge
+    return make
+
+
+def test_large_group_is_merged_as_a_tree(make_merge):
+    requests = FakeRequests()
+    merge = make_merge(group_articles(7), requests)
+    # 3 batches of 3, 3 and 1 summaries, then the final merge
+    assert len(requests.sent) == 3
+    assert [group for _, group in merge.responses] == [7]
+    assert all(s in merge.articles[0]["group_summary"] 
+        for s in ("s0", "s3", "s6"))
+
+
+def test_failed_branch_drops_the_group(make_merge):
+    requests = FakeRequests(fail=lambda item: item.get("index") == 1)
+    merge = make_merge(group_articles(7), requests)
+    assert merge.responses == []
+    assert "group_summary" not in merge.articles[0]
+    assert merge.identity.merged(7, [f"a{i}" for i in range(7)]) is None
+
+
+def test_failed_final_merge_stores_nothing(make_merge):
+    requests = FakeRequests(fail=lambda item: item["final"])
+    merge = make_merge(group_articles(2), requests)
+    assert merge.responses == []
+    assert merge.identity.merged(7, ["a0", "a1"]) is None
+
+
+def test_new_article_only_re_merges_its_branch(make_merge):
+    make_merge(group_articles(6), FakeRequests())
+    requests = FakeRequests()
+    merge = make_merge(group_articles(7), requests)
+    # The first two batches are cached, the new article is carried to the
+    # final merge, which is the only one sent
+    assert [item["final"] for item in requests.sent] == [True]
+    assert [group for _, group in merge.responses] == [7]
@@ -0,0 +1,84 @@
+import pytest
+
+from summarising.summarise import Summary, PostJSON
+from summarising.batch import PostBatch
+from summarising.stub import StubOpenAI
+from utils.throttle import APILimiter
+from utils.http_requests import get_runtime
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(PostJSON, "_headers", 
+        lambda self: {"Authorization": "Bearer test"})
+    server = StubOpenAI()
+    get_runtime().run(server.start())
+    yield server
+    get_runtime().run(server.stop())
+
+
+def submissions(count=3):
+    articles = [
+        {"url": f"https://example.com/{i}", "bodycount": 300,
+            "body": " ".join(f"word{i}-{j}" for j in range(300))}
+        for i in range(count)
+        ]
+    return Summary(articles).compose_submissionfile()
+
+
+def contents(results):
+    return {
+        item["url"]: response["choices"][0]["message"]["content"]
+        for response, item in results
+        }
+
+
+def test_post_json(stub):
+    post = PostJSON(endpoint=f"{stub.base}/chat/completions", 
+        limiter=APILimiter())
+    results = get_runtime().run(post.post(submissions()))
+    assert len(results) == 3
+    assert post.exceptions == []
+    response, item = results[0]
+    assert response["choices"][0]["message"]["content"].startswith(
+        item["body"].split()[0]
+        )
+    assert response["usage"]["prompt_tokens"] > 0
+
+
+def test_streamed_post_json_matches_plain(stub):
+    deltas = []
+    streamed = PostJSON(endpoint=f"{stub.base}/chat/completions",
+        on_delta=lambda item, text, done: deltas.append(done),
+        delta_interval=0)
+    plain = PostJSON(endpoint=f"{stub.base}/chat/completions")
+    streamed_results = get_runtime().run(streamed.post(submissions()))
+    plain_results = get_runtime().run(plain.post(submissions()))
+    assert contents(streamed_results) == contents(plain_results)
+    assert deltas.count(True) == 3 and deltas.count(False) > 0
+    assert all(response["usage"]["completion_tokens"] > 0
+        for response, _ in streamed_results)
+
+
+def test_post_batch(stub, tmp_path):
+    post = PostBatch(base_url=stub.base, 
+        settings={"poll_interval": 0.01, "timeout": 5, 
+            "completion_window": "24h"})
+    post.directory = tmp_path
+    results = get_runtime().run(post.post(submissions()))
+    plain = PostJSON(endpoint=f"{stub.base}/chat/completions")
+    assert contents(results) == contents(get_runtime().run(
+        plain.post(submissions())
+        ))
+    assert stub.stats["batches"] == 1
+    assert list(tmp_path.glob("batch-*.jsonl"))
+
+
+def test_injected_errors_are_retried(stub):
+    stub.errors = {500: 0.3}
+    stub.random.seed(1)
+    post = PostJSON(endpoint=f"{stub.base}/chat/completions")
+    results = get_runtime().run(post.post(submissions(10)))
+    assert len(results) == 10
+    assert stub.stats["injected"] > 0
+    assert post.retry.stats["recovered"] > 0
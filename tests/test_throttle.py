@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+from utils.throttle import HostScheduler, APILimiter
+from config.settings import host_limits
+
+
+def test_cancelled_wait_frees_the_host_slot():
+    async def main():
+        scheduler = HostScheduler(host_limits)
+
+        async def request():
+            async with scheduler.slot("Test"):
+                await asyncio.sleep(0)
+
+        await request()
+        limiter = scheduler.limiters["Test"]
+        limiter.paused_until = time.monotonic() + 60
+
+        # Cancelling a request waiting for the pause to end
+        task = asyncio.create_task(request())
+        await asyncio.sleep(0.01)
+        assert limiter.active == 1
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return limiter.active
+
+    assert asyncio.run(main()) == 0
+
+
+def test_cancelled_wait_frees_the_api_slot():
+    async def main():
+        limiter = APILimiter()
+        limiter.paused_until = time.monotonic() + 60
+
+        async def request():
+            async with limiter.slot(100):
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(request())
+        await asyncio.sleep(0.01)
+        assert limiter.active == 1
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return limiter.active
+
+    assert asyncio.run(main()) == 0
@@ -19,7 +19,26 @@ from summarising.summarise import Merge
 logger = logging.getLogger(__name__)
 
 
+# Current time used instead of the clock when set, so recorded runs can be 
+# replayed as if it was the time of the recording. Read more in 
+# 'scraping/archive.py'
+frozen_time = None
+
+
+def freeze_time(moment):
+	"""
+	Makes `get_current_time` return `moment`, None unfreezes the clock.
+
+	Params:
+		moment (datetime): timezone-aware datetime or None
+	"""
+	global frozen_time
+	frozen_time = moment
+
+
 def get_current_time():
+	if frozen_time:
+		return frozen_time
 	current = datetime.now()
 	standardised_time = current.astimezone(tz.tzutc())
 	return standardised_time
@@ -46,7 +65,8 @@ class PrepareForGUI:
             articles (list): a list of articles where each article is a dict
         """
         self.manager = DataManager()
-        self.articles = self.manager.load()
+        # A file that can't be read has no articles to display
+        self.articles = self.manager.load() or []
         self.groups = {}
         self.grouped_articles = []
 
@@ -0,0 +1,187 @@
+import ssl
+import atexit
+import asyncio
+import logging
+import threading
+
+import aiohttp
+
+from config.settings import http_client
+
+# Shared async runtime and HTTP client layer for the network classes,
+# `FetchHTML` in 'scraping/scrape.py' and `PostJSON` in
+# 'summarising/summarise.py'. Instead of every stage calling `asyncio.run` and
+# opening its own `ClientSession`, one event loop runs in a background thread
+# for the lifetime of the app and every stage submits its coroutines to it with
+# `AsyncRuntime.run`. The stages share one session, so connections to a host
+# are kept alive between the section fetch and the article fetch, DNS lookups
+# are cached and one SSL context, with its certificates, is loaded once. A
+# trace config counts new and reused connections and DNS cache hits.
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPClient:
+    """
+    Holds the shared `ClientSession` and its connection statistics. The
+    session is created on first use so it binds to the running loop, it's
+    recreated if it's used from a different loop, eg.: by a script calling
+    `asyncio.run`.
+
+    Attributes:
+        settings (dict): connector settings, read more in 'config/settings.py'
+        ssl_context (obj): `ssl.SSLContext` shared by all connections
+        session (obj): `aiohttp.ClientSession` or None
+        loop (obj): the loop the session is bound to
+        stats (dict): counters of requests, connections and DNS lookups
+    """
+    def __init__(self, settings=http_client):
+        """
+        Initialise settings, the SSL context and empty counters.
+
+        Params:
+            settings (dict): default is loaded from 'config/settings.py'
+        """
+        self.settings = settings
+        self.ssl_context = ssl.create_default_context()
+        self.session = None
+        self.loop = None
+        self.stats = {
+            "requests": 0, "connections": 0, "reused": 0, "dns_lookups": 0,
+            "dns_hits": 0
+            }
+
+
+    async def get_session(self):
+        """
+        Returns the shared session, creating it on the running loop.
+
+        Returns:
+            session (obj): `aiohttp.ClientSession` object
+        """
+        loop = asyncio.get_running_loop()
+        if (self.session is None or self.session.closed
+            or self.loop is not loop):
+            # Closing the session of another loop that is still running
+            if self.session and self.loop.is_running():
+                asyncio.run_coroutine_threadsafe(
+                    self.session.close(), self.loop
+                    )
+            self.loop = loop
+            self.session = aiohttp.ClientSession(
+                connector=self._connector(),
+                trace_configs=[self._trace_config()]
+                )
+            logger.debug("Opened shared HTTP session")
+        return self.session
+
+
+    async def close(self):
+        """ Closes the session and its connections. """
+        if (self.session and not self.session.closed
+            and self.loop is asyncio.get_running_loop()):
+            await self.session.close()
+            logger.debug("Closed shared HTTP session")
+        self.session = None
+
+
+    def log_stats(self):
+        """ Logs the connection counters. """
+        logger.info(f"HTTP connections: {self.stats}")
+
+
+    def _connector(self):
+        """ Creates the connector with keep-alive and DNS caching. """
+        return aiohttp.TCPConnector(
+            limit=self.settings["limit"],
+            ttl_dns_cache=self.settings["dns_ttl"],
+            keepalive_timeout=self.settings["keepalive_timeout"],
+            ssl=self.ssl_context
+            )
+
+
+    def _trace_config(self):
+        """ Creates the trace config that fills 'stats'. """
+        trace_config = aiohttp.TraceConfig()
+
+        # Counting events
+        def count(key):
+            async def callback(session, context, params):
+                self.stats[key] += 1
+            return callback
+
+        trace_config.on_request_start.append(count("requests"))
+        trace_config.on_connection_create_end.append(count("connections"))
+        trace_config.on_connection_reuseconn.append(count("reused"))
+        trace_config.on_dns_resolvehost_end.append(count("dns_lookups"))
+        trace_config.on_dns_cache_hit.append(count("dns_hits"))
+
+        return trace_config
+
+
+class AsyncRuntime:
+    """
+    Long-lived event loop running in a daemon thread. Coroutines are submitted
+    from any thread with `run`, which blocks until they finish, like
+    `asyncio.run` but the loop, and the `HTTPClient` bound to it, outlive the
+    call.
+
+    Attributes:
+        loop (obj): the event loop
+        thread (obj): the thread running the loop
+        client (obj): `HTTPClient` object
+    """
+    def __init__(self):
+        """ Starts the loop in its thread and initialises the client. """
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="AsyncRuntime", daemon=True
+            )
+        self.thread.start()
+        self.client = HTTPClient()
+
+
+    def run(self, coroutine):
+        """
+        Runs a coroutine on the loop and waits for its result. Exceptions are
+        re-raised in the calling thread.
+
+        Params:
+            coroutine (coroutine): the coroutine
+        Returns:
+            _ : the result of the coroutine
+        """
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        return future.result()
+
+
+    def close(self):
+        """ Closes the client and stops the loop. """
+        if self.loop.is_closed():
+            return
+        self.run(self.client.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+# Runtime shared by the whole app, started on first use
+_runtime = None
+_lock = threading.Lock()
+
+
+def get_runtime():
+    """
+    Returns the shared runtime, starting it on first use. It is closed when
+    the interpreter exits.
+
+    Returns:
+        runtime (obj): `AsyncRuntime` object
+    """
+    global _runtime
+    with _lock:
+        if _runtime is None:
+            _runtime = AsyncRuntime()
+            atexit.register(_runtime.close)
+            logger.debug("Started shared async runtime")
+    return _runtime
@@ -0,0 +1,148 @@
+import random
+import asyncio
+import logging
+
+import aiohttp
+
+from utils.throttle import parse_retry_after
+from config.settings import retry_policy
+
+# Retry engine shared by the network classes, `FetchHTML` in
+# 'scraping/scrape.py' and `PostJSON` in 'summarising/summarise.py'. Failed
+# requests are classified as retryable (timeouts, dropped connections, '429'
+# and '5xx' responses) or terminal (eg.: '404', '401'). Retryable ones are
+# tried again after an exponential backoff with full jitter, or after the
+# 'Retry-After' the server asked for. A budget caps the number of retries per
+# run so an outage doesn't turn a run into hours of waiting.
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying
+retryable_statuses = (408, 425, 429, 500, 502, 503, 504)
+
+
+class RetryPolicy:
+    """
+    Class responsible for retrying failed requests. One object is meant to be
+    used for one run, the retry budget is shared by all requests of the run.
+
+    Attributes:
+        attempts (int): maximum number of attempts per request
+        base (float): backoff of the first retry in seconds
+        cap (float): maximum backoff in seconds
+        budget (int): retries left for this run
+        stats (dict): counters, 'recovered' is the number of requests that
+            succeeded after at least one retry
+    """
+    def __init__(self, policy=retry_policy):
+        """
+        Initialise the policy and empty counters.
+
+        Params:
+            policy (dict): default is loaded from 'config/settings.py'
+        """
+        self.attempts = policy["attempts"]
+        self.base = policy["base"]
+        self.cap = policy["cap"]
+        self.budget = policy["budget"]
+        self.stats = {
+            "retried": 0, "recovered": 0, "exhausted": 0, "terminal": 0,
+            "over_budget": 0
+            }
+
+
+    async def call(self, function, *args):
+        """
+        Awaits `function(*args)` and retries it while the error is retryable,
+        attempts are left and the budget allows it. The last error is re-raised
+        when giving up.
+
+        Params:
+            function (coroutine function): the request
+            *args: arguments of the request
+        Returns:
+            _ : the result of the request
+        """
+        attempt = 0
+        while True:
+            try:
+                result = await function(*args)
+
+            # Deciding whether to retry
+            except Exception as error:
+                if not self.is_retryable(error):
+                    self.stats["terminal"] += 1
+                    raise
+                if attempt + 1 >= self.attempts:
+                    self.stats["exhausted"] += 1
+                    raise
+                if self.budget <= 0:
+                    self.stats["over_budget"] += 1
+                    raise
+
+                # Waiting before the next attempt
+                self.budget -= 1
+                self.stats["retried"] += 1
+                delay = self.delay(attempt, error)
+                logger.warning(f"Retrying in {delay:.1f}s after "
+                    f"{type(error).__name__}: {error}")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            # Counting requests saved by retries
+            if attempt:
+                self.stats["recovered"] += 1
+            return result
+
+
+    def is_retryable(self, error):
+        """
+        Classifies an error as retryable or terminal.
+
+        Params:
+            error (Exception): the error
+        Returns:
+            _ (bool): True if retryable
+        """
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in retryable_statuses
+        return isinstance(error, (
+            aiohttp.ClientConnectionError,
+            aiohttp.ClientPayloadError,
+            asyncio.TimeoutError
+            ))
+
+
+    def delay(self, attempt, error):
+        """
+        Returns the seconds to wait before the next attempt, the server's
+        'Retry-After' when given, otherwise an exponential backoff with full
+        jitter.
+
+        Params:
+            attempt (int): number of the failed attempt, starting at 0
+            error (Exception): the error
+        Returns:
+            _ (float): seconds
+        """
+        # Honouring 'Retry-After'
+        headers = getattr(error, "headers", None)
+        if headers:
+            retry_after = parse_retry_after(headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(self.cap, retry_after)
+
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+    def log_stats(self, name):
+        """
+        Logs the counters.
+
+        Params:
+            name (str): name of the caller, eg.: "FetchHTML"
+        """
+        logger.info(f"{name} retries: {self.stats}, {self.budget} left in "
+            f"budget")
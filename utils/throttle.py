@@ -0,0 +1,547 @@
+import re
+import time
+import asyncio
+import logging
+from datetime import datetime
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+
+from utils.tokens import count_tokens
+from config.settings import host_limits, aimd, openai_limits
+
+# Rate-limiting utilities for the network classes. A `TokenBucket` limits how
+# many requests per second are sent, a `HostLimiter` combines a bucket with a
+# cap on concurrent requests for one host and adapts both to the responses
+# (AIMD: additive increase on fast successful responses, multiplicative
+# decrease when the host answers '429 Too Many Requests' or '503 Service
+# Unavailable'). `HostScheduler` keeps one limiter per source so a slow or
+# throttling host can't hold up the others. Limits are configured per source in
+# 'config/settings.py'. `APILimiter` does the same for the OpenAI API, whose
+# limits are requests and tokens per minute rather than requests per second.
+
+logger = logging.getLogger(__name__)
+
+# Status codes that mean the host wants us to slow down
+throttle_statuses = (429, 503)
+
+
+def parse_retry_after(value):
+    """
+    Parses the value of a 'Retry-After' header, either a number of seconds or
+    a HTTP date.
+
+    Params:
+        value (str): header value or None
+    Returns:
+        _ (float): seconds to wait or None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+        return max(0.0, (date - datetime.now(date.tzinfo)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket, tokens are refilled at 'rate' per second up to 'capacity'
+    and each request takes one or more tokens. The capacity allows short
+    bursts while the rate caps the long-term average.
+
+    Attributes:
+        rate (float): tokens added per second
+        capacity (float): maximum number of tokens
+        tokens (float): tokens currently available
+        updated (float): time of the last refill
+    """
+    def __init__(self, rate, capacity):
+        """
+        Initialise a full bucket.
+
+        Params:
+            rate (float): tokens added per second
+            capacity (float): maximum number of tokens
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+
+    async def acquire(self, amount=1):
+        """
+        Waits until `amount` tokens are available and takes them.
+
+        Params:
+            amount (float): number of tokens
+        """
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            # Sleeping until enough tokens are refilled
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+    def _refill(self):
+        """ Adds the tokens earned since the last refill. """
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+        self.updated = now
+
+
+class HostLimiter:
+    """
+    Limits the requests to a single host with a cap on concurrent requests and
+    a token bucket. Both adapt to the responses of the host.
+
+    Attributes:
+        name (str): the source, used for logging
+        concurrency (float): current cap on concurrent requests
+        max_concurrency (int): upper bound of 'concurrency'
+        max_rate (float): upper bound of the bucket rate
+        min_rate (float): lower bound of the bucket rate
+        bucket (obj): `TokenBucket` object
+        active (int): requests in flight
+        paused_until (float): no requests are sent before this time
+        decreased (float): time of the last back-off
+        stats (dict): counters of requests, throttled responses and errors
+    """
+    def __init__(self, name, limits):
+        """
+        Initialise the limiter.
+
+        Params:
+            name (str): the source
+            limits (dict): limits of the source, read more in
+                'config/settings.py'
+        """
+        self.name = name
+        self.concurrency = limits["concurrency"]
+        self.max_concurrency = limits["max_concurrency"]
+        self.max_rate = limits["max_rate"]
+        self.min_rate = limits["min_rate"]
+        self.bucket = TokenBucket(limits["rate"], limits["burst"])
+        self.active = 0
+        self.paused_until = 0
+        self.decreased = 0
+        self.loop = None
+        self.condition = None
+        self.stats = {"requests": 0, "throttled": 0, "errors": 0}
+
+
+    async def acquire(self):
+        """
+        Waits for a free slot, for the end of a pause and for a token.
+        """
+        # Binding to the running event loop, the learned limits are kept when
+        # a new loop is used
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.condition = asyncio.Condition()
+            self.active = 0
+
+        # Waiting for a free slot
+        async with self.condition:
+            await self.condition.wait_for(
+                lambda: self.active < int(self.concurrency)
+                )
+            self.active += 1
+
+        # Freeing the slot when cancelled while waiting
+        try:
+            # Waiting for the host to lift the pause
+            delay = self.paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            # Waiting for a token
+            await self.bucket.acquire()
+        except BaseException:
+            await self.release()
+            raise
+        self.stats["requests"] += 1
+
+
+    async def release(self):
+        """ Frees the slot and wakes up waiting requests. """
+        async with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+
+    def record(self, status, elapsed, retry_after=None):
+        """
+        Adapts the limits to a response. Throttling responses halve the
+        concurrency and rate and pause the host for 'Retry-After' seconds
+        when given. Requests sent before the last back-off don't back off 
+        again, so a burst of throttled responses only halves the limits once.
+        Fast successful responses increase them a little.
+
+        Params:
+            status (int): status code of the response, None for errors
+            elapsed (float): seconds until the response arrived
+            retry_after (float, optional): seconds the host asked us to wait
+        """
+        # Initialising timestamps
+        now = time.monotonic()
+        sent = now - elapsed
+
+        # Pausing when the host asks for it
+        if status in throttle_statuses and retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+
+        # Counting throttled responses sent before the last back-off
+        if status in throttle_statuses and sent < self.decreased:
+            self.stats["throttled"] += 1
+
+        # Backing off
+        elif status in throttle_statuses:
+            self.stats["throttled"] += 1
+            self.decreased = now
+            self.concurrency = max(1, self.concurrency * aimd["decrease"])
+            self.bucket.rate = max(
+                self.min_rate, self.bucket.rate * aimd["decrease"]
+                )
+            logger.warning(f"{self.name} throttled ({status}), concurrency "
+                f"{int(self.concurrency)} rate {self.bucket.rate:.2f}/s")
+
+        # Ramping up
+        elif status and status < 400 and elapsed < aimd["fast"]:
+            self.concurrency = min(
+                self.max_concurrency,
+                self.concurrency + aimd["increase"] / self.concurrency
+                )
+            self.bucket.rate = min(
+                self.max_rate,
+                self.bucket.rate + aimd["increase"] / self.bucket.rate
+                )
+
+        # Counting other errors
+        elif status is None or status >= 400:
+            self.stats["errors"] += 1
+
+
+class HostScheduler:
+    """
+    Keeps a `HostLimiter` per source and hands out request slots. Sources
+    without their own limits in 'host_limits' share the "default" limits,
+    but not the limiter.
+
+    Attributes:
+        limits (dict): dict of source: limits pairs
+        limiters (dict): dict of source: `HostLimiter` pairs
+    """
+    def __init__(self, limits=host_limits):
+        """
+        Initialise limits and empty limiters, limiters are created on first
+        use so they bind to the running event loop.
+
+        Params:
+            limits (dict): default is loaded from 'config/settings.py'
+        """
+        self.limits = limits
+        self.limiters = {}
+
+
+    @asynccontextmanager
+    async def slot(self, src):
+        """
+        Async context manager that holds a request slot of the source's
+        limiter. Yields the limiter so the response can be recorded.
+
+        Params:
+            src (str): the source
+        Yields:
+            limiter (obj): `HostLimiter` object
+        """
+        # Retrieving or creating the limiter
+        limiter = self.limiters.get(src)
+        if not limiter:
+            limits = self.limits.get(src, self.limits["default"])
+            limiter = self.limiters[src] = HostLimiter(src, limits)
+
+        # Holding the slot
+        await limiter.acquire()
+        try:
+            yield limiter
+        finally:
+            await limiter.release()
+
+
+    def log_stats(self):
+        """ Logs the counters and final limits of each source. """
+        for src, limiter in self.limiters.items():
+            logger.info(f"{src}: {limiter.stats}, concurrency "
+                f"{int(limiter.concurrency)}, rate {limiter.bucket.rate:.2f}/s")
+
+
+def parse_reset(value):
+    """
+    Parses the duration format of the 'x-ratelimit-reset-*' headers, eg.:
+    '1s', '6m0s', '20ms' or '1h2m3.5s'.
+
+    Params:
+        value (str): header value or None
+    Returns:
+        _ (float): seconds or None
+    """
+    if not value:
+        return None
+    seconds = 0.0
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    for number, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        try:
+            seconds += float(number) * units[unit]
+        except ValueError:
+            return None
+    return seconds
+
+
+def estimate_tokens(submissionfile):
+    """
+    Estimates the tokens a chat completion request counts against the tokens
+    per minute limit, the prompt plus 'max_tokens' of completion. Prompt 
+    tokens are counted locally, read more in 'utils/tokens.py'.
+
+    Params:
+        submissionfile (dict): the request
+    Returns:
+        _ (int): estimated tokens
+    """
+    model = submissionfile["model"]
+    prompt = sum(
+        count_tokens(message["content"], model) 
+        for message in submissionfile["messages"]
+        )
+    # Each message carries a few tokens of formatting
+    prompt += 4 * len(submissionfile["messages"])
+    return int(prompt + submissionfile.get("max_tokens", 0))
+
+
+class APILimiter:
+    """
+    Limits the requests to the OpenAI API with a requests per minute bucket,
+    a tokens per minute bucket and a cap on concurrent requests. Each request
+    takes one request and its estimated tokens. The buckets are calibrated to
+    the account's real limits from the 'x-ratelimit-*' response headers and
+    the estimate is settled against the tokens actually used. The cap adapts
+    like in `HostLimiter`, throttling responses also pause until the limit
+    resets.
+
+    Attributes:
+        concurrency (float): current cap on concurrent requests
+        max_concurrency (int): upper bound of 'concurrency'
+        burst (float): seconds of the per minute limits a bucket holds
+        requests (obj): `TokenBucket` object for requests
+        tokens (obj): `TokenBucket` object for tokens
+        calibrated (bool): True once the limits were read from headers
+        active (int): requests in flight
+        paused_until (float): no requests are sent before this time
+        decreased (float): time of the last back-off
+        stats (dict): counters of requests, throttled responses, errors and 
+            estimated and used tokens
+    """
+    def __init__(self, limits=openai_limits, concurrency=None):
+        """
+        Initialise the buckets and the cap.
+
+        Params:
+            limits (dict): default is loaded from 'config/settings.py'
+            concurrency (int, optional): initial cap, default is in 'limits'
+        """
+        self.concurrency = concurrency or limits["concurrency"]
+        self.max_concurrency = limits["max_concurrency"]
+        self.burst = limits["burst_seconds"]
+        self.requests = TokenBucket(
+            limits["rpm"] / 60, limits["rpm"] / 60 * self.burst
+            )
+        self.tokens = TokenBucket(
+            limits["tpm"] / 60, limits["tpm"] / 60 * self.burst
+            )
+        self.calibrated = False
+        self.active = 0
+        self.paused_until = 0
+        self.decreased = 0
+        self.loop = None
+        self.condition = None
+        self.stats = {
+            "requests": 0, "throttled": 0, "errors": 0, "estimated": 0,
+            "used": 0
+            }
+
+
+    @asynccontextmanager
+    async def slot(self, estimate):
+        """
+        Async context manager that holds a request slot. Yields the limiter so
+        the response can be recorded.
+
+        Params:
+            estimate (int): estimated tokens of the request
+        """
+        await self.acquire(estimate)
+        try:
+            yield self
+        finally:
+            await self.release()
+
+
+    async def acquire(self, estimate):
+        """
+        Waits for a free slot, for the end of a pause, for a request and for
+        the estimated tokens.
+
+        Params:
+            estimate (int): estimated tokens of the request
+        """
+        # Binding to the running event loop, the learned limits are kept
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.condition = asyncio.Condition()
+            self.active = 0
+
+        # Waiting for a free slot
+        async with self.condition:
+            await self.condition.wait_for(
+                lambda: self.active < int(self.concurrency)
+                )
+            self.active += 1
+
+        # Freeing the slot when cancelled while waiting
+        try:
+            # Waiting for the API to lift the pause
+            delay = self.paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            # Waiting for a request and the tokens, a request larger than the
+            # bucket waits for a full bucket
+            await self.requests.acquire()
+            await self.tokens.acquire(min(estimate, self.tokens.capacity))
+        except BaseException:
+            await self.release()
+            raise
+        self.stats["requests"] += 1
+        self.stats["estimated"] += estimate
+
+
+    async def release(self):
+        """ Frees the slot and wakes up waiting requests. """
+        async with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+
+    def record(self, status, elapsed, headers, retry_after=None):
+        """
+        Calibrates the buckets to the response headers and adapts the cap.
+        Throttling responses halve the cap and pause until the limit resets,
+        requests sent before the last back-off don't back off again like in
+        `HostLimiter.record`. Successful responses increase the cap a little.
+
+        Params:
+            status (int): status code of the response, None for errors
+            elapsed (float): seconds until the response arrived
+            headers (dict): headers of the response, None for errors
+            retry_after (float, optional): seconds the API asked us to wait
+        """
+        # Initialising timestamps and calibrating
+        now = time.monotonic()
+        sent = now - elapsed
+        if headers:
+            self.calibrate(headers)
+
+        # Pausing until the limit resets
+        if status in throttle_statuses:
+            self.stats["throttled"] += 1
+            wait = retry_after
+            if not wait and headers:
+                wait = max(
+                    parse_reset(headers.get("x-ratelimit-reset-requests")) or 0,
+                    parse_reset(headers.get("x-ratelimit-reset-tokens")) or 0
+                    )
+            if wait:
+                self.paused_until = max(self.paused_until, now + wait)
+
+        # Backing off once per burst of throttled responses
+        if status in throttle_statuses and sent >= self.decreased:
+            self.decreased = now
+            self.concurrency = max(1, self.concurrency * aimd["decrease"])
+            logger.warning(f"OpenAI throttled ({status}), concurrency "
+                f"{int(self.concurrency)}")
+
+        # Ramping up
+        elif status and status < 400:
+            self.concurrency = min(
+                self.max_concurrency,
+                self.concurrency + aimd["increase"] / self.concurrency
+                )
+
+        # Counting other errors
+        elif status is None or status not in throttle_statuses:
+            self.stats["errors"] += 1
+
+
+    def calibrate(self, headers):
+        """
+        Sets the bucket rates to the limits in the headers and lowers the
+        available requests and tokens to what the API says remains.
+
+        Params:
+            headers (dict): headers of the response
+        """
+        for kind, bucket in (("requests", self.requests), 
+            ("tokens", self.tokens)):
+            # Reading the limit and what remains of it
+            try:
+                limit = int(headers.get(f"x-ratelimit-limit-{kind}", 0))
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                remaining = int(remaining) if remaining is not None else None
+            except ValueError:
+                continue
+
+            # Matching the rate to the limit
+            if limit and bucket.rate != limit / 60:
+                bucket.rate = limit / 60
+                bucket.capacity = bucket.rate * self.burst
+                logger.info(f"OpenAI {kind} limit is {limit}/min")
+                self.calibrated = True
+
+            # Never assuming more is left than the API says
+            if remaining is not None:
+                bucket._refill()
+                bucket.tokens = min(bucket.tokens, remaining)
+
+
+    def settle(self, estimate, used):
+        """
+        Corrects the tokens bucket by the difference between the estimated
+        and the used tokens of a request.
+
+        Params:
+            estimate (int): estimated tokens of the request
+            used (int): 'prompt_tokens' plus 'max_tokens' of the request
+        """
+        self.tokens.tokens = min(
+            self.tokens.capacity, self.tokens.tokens + estimate - used
+            )
+        self.stats["used"] += used
+
+
+    def log_stats(self):
+        """ Logs the counters and the final limits. """
+        logger.info(f"OpenAI: {self.stats}, concurrency "
+            f"{int(self.concurrency)}, {self.requests.rate * 60:.0f} rpm, "
+            f"{self.tokens.rate * 60:.0f} tpm")
@@ -0,0 +1,101 @@
+import re
+import logging
+from functools import lru_cache
+
+from config.settings import openai_limits
+
+# Local token counting for the OpenAI requests, so their cost is known before
+# they are sent. Uses the model's tokenizer from 'tiktoken' when it's
+# installed, otherwise estimates from the number of characters, which is close
+# enough for English text. Long texts are split into chunks of a token budget
+# on sentence boundaries, read more in 'summarising/summarise.py'.
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Pattern matching the whitespace after the end of a sentence
+sentence_pattern = re.compile(r"(?<=[.!?])\s+")
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model):
+    """
+    Returns the tokenizer of a model, None without 'tiktoken'.
+
+    Params:
+        model (str): eg.: 'gpt-3.5-turbo-0125'
+    Returns:
+        _ (obj): `tiktoken.Encoding` object or None
+    """
+    if not tiktoken:
+        logger.info("tiktoken not installed, estimating tokens from length")
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    """
+    Counts the tokens of a text.
+
+    Params:
+        text (str): the text
+        model (str, optional): the model whose tokenizer is used
+    Returns:
+        _ (int): number of tokens
+    """
+    encoding = get_encoding(model)
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return round(len(text) / openai_limits["chars_per_token"])
+
+
+def split_tokens(text, budget, model="gpt-3.5-turbo"):
+    """
+    Splits a text into chunks of at most `budget` tokens. Chunks end on
+    sentence boundaries, sentences longer than the budget are split between
+    words.
+
+    Params:
+        text (str): the text
+        budget (int): tokens per chunk
+        model (str, optional): the model whose tokenizer is used
+    Returns:
+        chunks (list): list of strings
+    """
+    # Initialising empty containers
+    chunks = []
+    current = []
+    size = 0
+
+    # Splitting sentences that don't fit into a chunk between words
+    pieces = []
+    for sentence in sentence_pattern.split(text.strip()):
+        if count_tokens(sentence, model) <= budget:
+            pieces.append(sentence)
+            continue
+        words = sentence.split()
+        step = max(1, len(words) * budget // count_tokens(sentence, model))
+        pieces.extend(
+            " ".join(words[i:i + step]) for i in range(0, len(words), step)
+            )
+
+    # Filling chunks up to the budget
+    for piece in pieces:
+        tokens = count_tokens(piece, model) + 1
+        if current and size + tokens > budget:
+            chunks.append(" ".join(current))
+            current = []
+            size = 0
+        current.append(piece)
+        size += tokens
+    if current:
+        chunks.append(" ".join(current))
+
+    return chunks